@@ -1,80 +1,165 @@
 import os
-import pandas as pd
+import sys
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import URL
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
 
-# Database configuration
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = int(os.getenv("DB_PORT", "5440"))
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASS = os.getenv("DB_PASS")
-DB_NAME = os.getenv("DB_NAME", "motorcycle_sales_db")
+sys.path.append(os.path.join(PROJECT_DIR, ".."))
+from pgtools.cli import loader_parser
+from pgtools.cube import CubeBuilder, build_cube, cube_path
+from pgtools.db import ensure_database, project_config
+from pgtools.dtypes import compact_frame
+from pgtools.manifest import fingerprint, is_unchanged, record_load
+from pgtools.metrics import instrumented, stage
+from pgtools.partitions import Partitioning, shadow_partitions, write_shadow
+from pgtools.rollups import Rollup, refresh_rollups
+from pgtools.snapshot import snapshots
+from pgtools.staging import read_staged
+from pgtools.streaming import DateCoercer, norm_cols, stream_chunksize, stream_csv_to_sql
+from pgtools.swap import shadow_name, swap_in
 
-def make_url(dbname: str) -> URL:
-    """Build a SQLAlchemy URL that properly escapes special chars in password."""
-    return URL.create(
-        "postgresql+psycopg2",
-        username=DB_USER,
-        password=DB_PASS,
-        host=DB_HOST,
-        port=DB_PORT,
-        database=dbname,
-    )
+# Database configuration (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5440, default_db="motorcycle_sales_db")
 
-def ensure_database():
-    """Create database if it doesn't exist."""
-    admin_engine = create_engine(make_url("postgres"), isolation_level="AUTOCOMMIT")
-    with admin_engine.connect() as conn:
-        exists = conn.execute(
-            text("SELECT 1 FROM pg_database WHERE datname = :d"),
-            {"d": DB_NAME},
-        ).scalar()
-        if not exists:
-            conn.execute(text(f'CREATE DATABASE "{DB_NAME}";'))
-            print(f'Created database "{DB_NAME}".')
+# Dimensions of the sales cube (pgtools.cube): every group-by of these is precomputed
+CUBE_DIMS = ['product_line', 'month', 'warehouse', 'client_type', 'payment']
 
-def main():
-    ensure_database()
-    engine = create_engine(make_url(DB_NAME))
+# Monthly partitions with LOAD_PARTITIONS=1, so June-August queries scan only those months
+PARTITIONS = {'sales': Partitioning('date', 'month')}
+
+# Version of main()'s transform for the Parquet stage (pgtools.staging):
+# bump it when the transform changes, so the stage is rebuilt
+STAGE_KEY = '1'
+
+# The notebook's wholesale aggregates, kept as materialized views and refreshed after each load
+ROLLUPS = [
+    Rollup("wholesale_net_revenue", """
+        SELECT
+            product_line,
+            EXTRACT(MONTH FROM date)::int AS month_num,
+            CASE EXTRACT(MONTH FROM date)
+                WHEN 6 THEN 'June'
+                WHEN 7 THEN 'July'
+                WHEN 8 THEN 'August'
+            END AS month,
+            warehouse,
+            ROUND(CAST(SUM(total) - SUM(total * payment_fee) AS NUMERIC), 2) AS net_revenue
+        FROM sales
+        WHERE client_type = 'Wholesale'
+        GROUP BY product_line, EXTRACT(MONTH FROM date), warehouse
+    """, unique=["product_line", "month_num", "warehouse"]),
+    Rollup("wholesale_revenue_by_product_line", """
+        SELECT
+            product_line,
+            COUNT(*) AS order_count,
+            ROUND(CAST(SUM(total) - SUM(total * payment_fee) AS NUMERIC), 2) AS total_net_revenue
+        FROM sales
+        WHERE client_type = 'Wholesale'
+        GROUP BY product_line
+    """, unique="product_line"),
+]
+
+def cube_inputs(df):
+    """The cube's dimensions and sums for a frame or chunk of sales; None without the columns."""
+    if not (set(CUBE_DIMS) - {'month'} <= set(df.columns) and {'date', 'total', 'payment_fee'} <= set(df.columns)):
+        return None
+    return df.assign(month=df['date'].dt.month), {'total': df['total'], 'fees': df['total'] * df['payment_fee']}
+
+def save_cube(cube, csv_path, source):
+    """Save the cube (or remove a stale one when none was built) and print the summary from it."""
+    path = cube_path(csv_path)
+    if cube is None:
+        if os.path.exists(path):
+            os.remove(path)
+        print(f"⚠️  No cube built (sales lacks {', '.join(CUBE_DIMS)}, date, total or payment_fee)")
+        return
+    cube.save(path, source.content_hash)
+    
+    # Summary statistics, read from the cube
+    print(f"\nTotal sales: ${cube.value('total'):,.2f}")
+    print(f"Wholesale orders: {cube.value('rows', client_type='Wholesale')}")
+    print(f"Retail orders: {cube.value('rows', client_type='Retail')}")
+    print(f"🧊 Cube of {' x '.join(f'{len(cube.labels[d])} {d}' for d in CUBE_DIMS)} "
+          f"saved to {os.path.relpath(path, PROJECT_DIR)}")
+
+def main(force=False):
+    engine = ensure_database(CONFIG)
     
     # Load sales data
-    csv_path = os.path.join("data", "sales.csv")
+    csv_path = os.path.join(DATA_DIR, "sales.csv")
+    source = fingerprint(csv_path)
+    if not force and is_unchanged(engine, 'sales', source):
+        print(f"= {csv_path} unchanged since last load, skipping (use --force to reload)")
+        refresh_rollups(engine, ROLLUPS, changed=[])
+        return
     print(f"→ Loading {csv_path} -> sales table")
     
-    df = pd.read_csv(csv_path)
+    # Normalize column names to lowercase with underscores and convert date columns
+    to_dates = DateCoercer(['date'])
+    transform = lambda chunk: to_dates(norm_cols(chunk))
     
-    # Normalize column names to lowercase with underscores
-    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    chunksize = stream_chunksize()
+    if chunksize:
+        # Streaming mode: constant memory, so skip the in-memory summary below;
+        # the cube is added up chunk by chunk as they are written
+        builder = CubeBuilder(CUBE_DIMS, ['total', 'fees'])
+        built = True
+        
+        def transform_and_count(chunk):
+            nonlocal built
+            chunk = transform(chunk)
+            inputs = cube_inputs(chunk)
+            if inputs is None:
+                built = False
+            else:
+                builder.add(*inputs)
+            return chunk
+        
+        partitions = shadow_partitions(PARTITIONS, 'sales')
+        rows = stream_csv_to_sql(csv_path, shadow_name('sales'), engine, chunksize, transform_and_count,
+                                 prepare=partitions)
+        partitions.report()
+        swap_in(engine, 'sales')
+        print(f"   {rows:,} rows streamed to sales table in chunks of {chunksize:,}")
+        record_load(engine, 'sales', csv_path, source, rows)
+        refresh_rollups(engine, ROLLUPS, changed=['sales'])
+        save_cube(builder.cube() if built else None, csv_path, source)
+        print("\nDone.")
+        return
     
-    # Convert date columns
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df = read_staged(csv_path, transform, source, key=STAGE_KEY)
     
-    # Load to PostgreSQL
-    df.to_sql('sales', engine, if_exists='replace', index=False)
+    # Load to PostgreSQL under a shadow name; readers keep the old table until the swap
+    with stage('write', 'sales') as m:
+        write_shadow(engine, df, 'sales', PARTITIONS)
+        m.rows = len(df)
+    swap_in(engine, 'sales')
     print(f"   {len(df):,} rows written to sales table")
+    record_load(engine, 'sales', csv_path, source, len(df))
+    refresh_rollups(engine, ROLLUPS, changed=['sales'])
+    
+    # Categorical labels and narrower numbers for the summaries below
+    df = compact_frame(df, label='sales')
     
     # Display sample data and statistics
     print("\nSample data:")
     print(df.head())
     print(f"\nColumns: {list(df.columns)}")
-    print(f"\nClient types: {df['client_type'].unique() if 'client_type' in df.columns else 'N/A'}")
-    print(f"Product lines: {df['product_line'].unique() if 'product_line' in df.columns else 'N/A'}")
-    print(f"Warehouses: {df['warehouse'].unique() if 'warehouse' in df.columns else 'N/A'}")
-    print(f"Payment methods: {df['payment'].unique() if 'payment' in df.columns else 'N/A'}")
+    print(f"\nClient types: {df['client_type'].unique().tolist() if 'client_type' in df.columns else 'N/A'}")
+    print(f"Product lines: {df['product_line'].unique().tolist() if 'product_line' in df.columns else 'N/A'}")
+    print(f"Warehouses: {df['warehouse'].unique().tolist() if 'warehouse' in df.columns else 'N/A'}")
+    print(f"Payment methods: {df['payment'].unique().tolist() if 'payment' in df.columns else 'N/A'}")
     
-    # Summary statistics
-    if 'total' in df.columns:
-        print(f"\nTotal sales: ${df['total'].sum():,.2f}")
-    if 'client_type' in df.columns:
-        print(f"Wholesale orders: {len(df[df['client_type'] == 'Wholesale'])}")
-        print(f"Retail orders: {len(df[df['client_type'] == 'Retail'])}")
+    # Rollup cube: counts, totals and fees for every combination of the dimensions,
+    # built in one pass and saved to data/.cube/sales.npz for slice-and-dice questions
+    inputs = cube_inputs(df)
+    save_cube(build_cube(inputs[0], CUBE_DIMS, inputs[1]) if inputs else None, csv_path, source)
     
     print("\nDone.")
 
 if __name__ == "__main__":
-    main()
+    load_dotenv(os.path.join(PROJECT_DIR, ".env"))
+    args = loader_parser("Load the motorcycle part sales CSV into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        main(force=args.force)
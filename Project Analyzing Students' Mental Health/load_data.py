@@ -1,59 +1,35 @@
-import pandas as pd
-import psycopg2
-from sqlalchemy import create_engine, text
 import os
+import sys
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
-import time
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
 
-# Database connection parameters
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_NAME = os.getenv('DB_NAME', 'students_mental_health_db')
-DB_USER = os.getenv('DB_USER', 'postgres')
-DB_PASSWORD = os.getenv('DB_PASSWORD', 'your_password')
-DB_PORT = os.getenv('DB_PORT', '5432')
+sys.path.append(os.path.join(PROJECT_DIR, '..'))
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config
+from pgtools.loading import load_csv_table
+from pgtools.metrics import instrumented
+from pgtools.snapshot import snapshots
 
-def create_connection():
-    """Create database connection with retry logic"""
-    # URL encode the password to handle special characters
-    encoded_password = quote_plus(DB_PASSWORD)
-    connection_string = f"postgresql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    
-    # Retry connection up to 5 times with 2 second delays
-    for attempt in range(5):
-        try:
-            engine = create_engine(connection_string)
-            # Test the connection
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            print("✅ Successfully connected to PostgreSQL database!")
-            return engine
-        except Exception as e:
-            if attempt < 4:
-                print(f"⏳ Waiting for database to be ready... (attempt {attempt + 1}/5)")
-                time.sleep(2)
-            else:
-                print(f"❌ Failed to connect to database after 5 attempts: {e}")
-                raise
+# Database connection parameters (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5433, default_db='students_mental_health_db')
 
-def load_csv_to_db():
+def load_csv_to_db(force=False):
     """Load students CSV file to PostgreSQL database"""
-    engine = create_connection()
-    
-    print(f"Loading data/students.csv to table 'students'...")
-    
-    # Read CSV
-    df = pd.read_csv('data/students.csv')
-    
-    # Load to PostgreSQL
-    df.to_sql('students', engine, if_exists='replace', index=False)
-    
-    print(f"✅ Successfully loaded {len(df)} rows to 'students' table")
-    print(f"\nColumns: {', '.join(df.columns.tolist())}")
+    # Waits for the server with exponential backoff, then reuses the pooled engine
+    engine = ensure_database(CONFIG)
+    print("✅ Successfully connected to PostgreSQL database!")
+
+    result = load_csv_table(engine, os.path.join(DATA_DIR, 'students.csv'), 'students', force=force)
+
+    if not result.skipped:
+        print(f"✅ Successfully loaded {result.rows} rows to 'students' table")
+    print(f"\nColumns: {', '.join(result.columns)}")
     print(f"\n🎉 Data loading complete!")
 
 if __name__ == "__main__":
-    load_csv_to_db()
+    load_dotenv(os.path.join(PROJECT_DIR, '.env'))
+    args = loader_parser("Load the students CSV into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        load_csv_to_db(force=args.force)
@@ -1,52 +1,67 @@
-import pandas as pd
-import psycopg2
-from sqlalchemy import create_engine
 import os
+import sys
+import time
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
-
-# Load environment variables
-load_dotenv()
-
-# Database connection parameters
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_NAME = os.getenv('DB_NAME', 'unicorns_db')
-DB_USER = os.getenv('DB_USER', 'postgres')
-DB_PASSWORD = os.getenv('DB_PASSWORD', 'your_password')
-DB_PORT = os.getenv('DB_PORT', '5432')
-
-def create_connection():
-    """Create database connection"""
-    # URL encode the password to handle special characters
-    encoded_password = quote_plus(DB_PASSWORD)
-    connection_string = f"postgresql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    engine = create_engine(connection_string)
-    return engine
-
-def load_csv_to_db():
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
+
+sys.path.append(os.path.join(PROJECT_DIR, '..'))
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config
+from pgtools.keys import ForeignKey, KeySpec, apply_keys
+from pgtools.loading import load_csv_table
+from pgtools.metrics import instrumented
+from pgtools.parallel import default_workers, print_timings, run_parallel
+from pgtools.partitions import Partitioning
+from pgtools.snapshot import snapshots
+
+# Database connection parameters (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5432, default_db='unicorns_db')
+
+# company_id joins all four tables; one row per company in each
+KEYS = KeySpec(
+    primary_keys={t: 'company_id' for t in ['companies', 'dates', 'funding', 'industries']},
+    foreign_keys=[ForeignKey(t, 'company_id', 'companies', 'company_id') for t in ['dates', 'funding', 'industries']],
+)
+
+# Companies by the year they became unicorns, partitioned with LOAD_PARTITIONS=1
+PARTITIONS = {'dates': Partitioning('date_joined', 'year')}
+
+def load_table(engine, table_name, csv_path, force=False):
+    """Load one CSV file into its table (skipped when the CSV is unchanged)"""
+    # Typed columns, e.g. dates.date_joined as DATE, so queries need no per-row casts
+    return load_csv_table(engine, csv_path, table_name, force=force, typed=True,
+                          partition=PARTITIONS.get(table_name)).rows
+
+def load_csv_to_db(force=False):
     """Load all CSV files to PostgreSQL database"""
-    engine = create_connection()
-    
+    engine = ensure_database(CONFIG)
+
     # Define CSV files and corresponding table names
     csv_files = {
-        'companies': 'data/companies.csv',
-        'dates': 'data/dates.csv',
-        'funding': 'data/funding.csv',
-        'industries': 'data/industries.csv'
+        'companies': os.path.join(DATA_DIR, 'companies.csv'),
+        'dates': os.path.join(DATA_DIR, 'dates.csv'),
+        'funding': os.path.join(DATA_DIR, 'funding.csv'),
+        'industries': os.path.join(DATA_DIR, 'industries.csv')
     }
-    
-    for table_name, csv_path in csv_files.items():
-        print(f"Loading {csv_path} to table '{table_name}'...")
-        
-        # Read CSV
-        df = pd.read_csv(csv_path)
-        
-        # Load to PostgreSQL
-        df.to_sql(table_name, engine, if_exists='replace', index=False)
-        
-        print(f"✅ Successfully loaded {len(df)} rows to '{table_name}' table")
-    
+
+    # The foreign keys into companies are only added by apply_keys below, so
+    # the tables load independently, each on its own worker
+    workers = default_workers(len(csv_files))
+    start = time.perf_counter()
+    results = run_parallel(
+        {t: (lambda t=t, p=p: load_table(engine, t, p, force)) for t, p in csv_files.items()},
+        max_workers=workers,
+    )
+    # Keys and indexes go on after the bulk load, then the reloaded tables are analyzed
+    apply_keys(engine, KEYS, analyze=[t for t, r in results.items() if r.value])
+    print_timings(results, time.perf_counter() - start)
+
     print("\n🎉 All CSV files loaded successfully!")
 
 if __name__ == "__main__":
-    load_csv_to_db()
+    load_dotenv(os.path.join(PROJECT_DIR, '.env'))
+    args = loader_parser("Load the unicorn company CSVs into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        load_csv_to_db(force=args.force)
@@ -1,45 +1,43 @@
 import os
+import sys
+import time
 import pandas as pd
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import URL
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
 
-# Database configuration
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = int(os.getenv("DB_PORT", "5441"))
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASS = os.getenv("DB_PASS")
-DB_NAME = os.getenv("DB_NAME", "superstore_db")
+sys.path.append(os.path.join(PROJECT_DIR, ".."))
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config
+from pgtools.keys import ForeignKey, KeySpec, apply_keys
+from pgtools.loading import load_csv_table
+from pgtools.metrics import instrumented
+from pgtools.parallel import default_workers, print_timings, run_parallel
+from pgtools.snapshot import snapshots
+from pgtools.streaming import norm_cols
 
-def make_url(dbname: str) -> URL:
-    """Build a SQLAlchemy URL that properly escapes special chars in password."""
-    return URL.create(
-        "postgresql+psycopg2",
-        username=DB_USER,
-        password=DB_PASS,
-        host=DB_HOST,
-        port=DB_PORT,
-        database=dbname,
-    )
+# Database configuration (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5441, default_db="superstore_db")
+
+# Join keys used by the notebook, built after the load
+KEYS = KeySpec(
+    primary_keys={'orders': 'row_id', 'products': 'product_id', 'people': 'region'},
+    foreign_keys=[ForeignKey('orders', 'product_id', 'products', 'product_id')],
+    indexes={'orders': ['order_id'], 'returned_orders': ['order_id']},
+)
 
-def ensure_database():
-    """Create database if it doesn't exist."""
-    admin_engine = create_engine(make_url("postgres"), isolation_level="AUTOCOMMIT")
-    with admin_engine.connect() as conn:
-        exists = conn.execute(
-            text("SELECT 1 FROM pg_database WHERE datname = :d"),
-            {"d": DB_NAME},
-        ).scalar()
-        if not exists:
-            conn.execute(text(f'CREATE DATABASE "{DB_NAME}";'))
-            print(f'Created database "{DB_NAME}".')
+def load_table(engine, table_name: str, csv_file: str, force: bool = False) -> int:
+    csv_path = os.path.join(DATA_DIR, csv_file)
+    
+    # Normalize column names to lowercase with underscores
+    result = load_csv_table(engine, csv_path, table_name, norm_cols, force)
+    if not result.skipped:
+        print(f"   Columns: {result.columns}")
+    return result.rows
 
-def main():
-    ensure_database()
-    engine = create_engine(make_url(DB_NAME))
+def main(force: bool = False):
+    engine = ensure_database(CONFIG)
     
     # Load all CSV files
     csv_files = {
@@ -49,23 +47,21 @@ def main():
         'returned_orders': 'returned_orders.csv'
     }
     
-    for table_name, csv_file in csv_files.items():
-        csv_path = os.path.join("data", csv_file)
-        print(f"→ Loading {csv_path} -> {table_name} table")
-        
-        df = pd.read_csv(csv_path)
-        
-        # Normalize column names to lowercase with underscores
-        df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
-        
-        # Load to PostgreSQL
-        df.to_sql(table_name, engine, if_exists='replace', index=False)
-        print(f"   {len(df):,} rows written to {table_name} table")
-        print(f"   Columns: {list(df.columns)}")
+    # The four tables are independent, so load them concurrently
+    workers = default_workers(len(csv_files))
+    start = time.perf_counter()
+    results = run_parallel(
+        {t: (lambda t=t, f=f: load_table(engine, t, f, force)) for t, f in csv_files.items()},
+        max_workers=workers,
+    )
+    
+    # Keys and indexes go on after the bulk load, then the reloaded tables are analyzed
+    apply_keys(engine, KEYS, analyze=[t for t, r in results.items() if r.value])
     
     # Display summary
     print("\n=== Database Summary ===")
-    print(f"Total tables loaded: {len(csv_files)}")
+    print(f"Total tables loaded: {len(results)} ({workers} workers)")
+    print_timings(results, time.perf_counter() - start)
     
     # Show sample data from orders
     print("\nSample from orders table:")
@@ -75,4 +71,7 @@ def main():
     print("\nDone.")
 
 if __name__ == "__main__":
-    main()
+    load_dotenv(os.path.join(PROJECT_DIR, ".env"))
+    args = loader_parser("Load the SuperStore CSVs into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        main(force=args.force)
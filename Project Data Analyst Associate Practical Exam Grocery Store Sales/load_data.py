@@ -1,102 +1,107 @@
-import pandas as pd
-import psycopg2
-from psycopg2 import sql
 import os
+import sys
 from dotenv import load_dotenv
-import time
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
 
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST'),
-    'port': os.getenv('DB_PORT'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_NAME')
+sys.path.append(os.path.join(PROJECT_DIR, '..'))
+from pgtools.bulk import copy_dataframe, format_stats
+from pgtools.cleaning import Choice, Fill, Number, Text, write_clean_tables
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config, raw_connection
+from pgtools.manifest import fingerprint, is_unchanged, record_load
+from pgtools.metrics import instrumented, stage
+from pgtools.schema import TEXT, create_table_sql, describe_schema, typed_frame
+from pgtools.snapshot import snapshots
+from pgtools.staging import read_staged
+from pgtools.swap import shadow_name, swap_in
+from pgtools.validation import Between, Parses, Required, Unique, validate_frames
+
+# Database connection parameters (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5437, default_db='grocery_sales_db')
+
+# Checked before the load; failing rows go to products_rejects and the rest load
+VALIDATION = {
+    'products': {
+        'product_id': [Required(), Parses('integer'), Unique()],
+        'price': [Parses('number'), Between(low=0)],
+        'average_units_sold': [Parses('number'), Between(low=0)],
+        'year_added': Parses('integer'),
+    },
 }
 
-def connect_with_retry(max_retries=5, delay=2):
-    """Attempt to connect to PostgreSQL with retries."""
-    for attempt in range(max_retries):
-        try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            print(f"✅ Successfully connected to database on attempt {attempt + 1}")
-            return conn
-        except psycopg2.OperationalError as e:
-            if attempt < max_retries - 1:
-                print(f"⏳ Connection attempt {attempt + 1} failed. Retrying in {delay} seconds...")
-                time.sleep(delay)
-            else:
-                print(f"❌ Failed to connect after {max_retries} attempts")
-                raise e
+# Task 2's cleaning rules, applied once after the load into products_clean
+CLEANING = {
+    'products': {
+        'product_type': Choice(['Produce', 'Meat', 'Dairy', 'Bakery', 'Snacks']),
+        'brand': Text(missing=['', '-', 'missing']),
+        'weight': Number(extract=True, fill='median', decimals=2),
+        'price': Number(fill='median', decimals=2),
+        'average_units_sold': Fill(0),
+        'year_added': Fill(2022),
+        'stock_location': Choice({'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'}),
+    },
+}
 
-def load_grocery_sales_data():
+def load_grocery_sales_data(force=False):
     """Load grocery store sales data into PostgreSQL."""
     
-    # Connect to database
-    conn = connect_with_retry()
+    # Wait for the server (exponential backoff) and check out a pooled connection
+    engine = ensure_database(CONFIG)
+    conn = raw_connection(CONFIG)
+    print("✅ Successfully connected to database")
     cur = conn.cursor()
     
     try:
-        # Read CSV
-        df = pd.read_csv('data/products.csv')
+        source = fingerprint(os.path.join(DATA_DIR, 'products.csv'))
+        if not force and is_unchanged(conn, 'products', source):
+            print("= CSV unchanged since last load, skipping (use --force to reload)")
+            write_clean_tables(engine, CLEANING, changed=[])
+            return
+        
+        # Read CSV (from the Parquet stage when it is current)
+        df = read_staged(os.path.join(DATA_DIR, 'products.csv'), source=source)
         
         print(f"\n📊 Loaded {len(df)} rows from products.csv")
         print(f"📋 Columns: {', '.join(df.columns)}")
         
-        # Drop table if exists
-        cur.execute("DROP TABLE IF EXISTS products CASCADE;")
+        # Rows failing VALIDATION (e.g. a repeated product_id, which would fail
+        # the primary key) are quarantined instead of failing the load
+        df = validate_frames(engine, VALIDATION, {'products': df})['products']
         
-        # Create table - keep year_added as TEXT since it has NULL values to handle
-        create_table_query = """
-        CREATE TABLE products (
-            product_id INTEGER PRIMARY KEY,
-            product_type TEXT,
-            brand TEXT,
-            weight TEXT,
-            price NUMERIC,
-            average_units_sold INTEGER,
-            year_added TEXT,
-            stock_location TEXT
-        );
-        """
+        # Infer native column types (year_added as INTEGER, price as NUMERIC);
+        # weight stays TEXT because the notebook strips its unit suffixes in SQL
+        df, schema = typed_frame(df, os.path.join(DATA_DIR, 'products.csv'), 'products',
+                                 overrides={'weight': TEXT})
+        # Build the new table under a shadow name; readers keep products until the swap
+        shadow = shadow_name('products')
+        create_table_query = create_table_sql(shadow, schema, primary_key=['product_id'])
         
+        cur.execute(f'DROP TABLE IF EXISTS "{shadow}";')
         cur.execute(create_table_query)
-        print("✅ Created products table")
+        print(f"✅ Created products table: {describe_schema(schema)}")
         
-        # Insert data
-        for _, row in df.iterrows():
-            insert_query = """
-            INSERT INTO products (
-                product_id, product_type, brand, weight, price,
-                average_units_sold, year_added, stock_location
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            # Handle empty strings as NULL
-            year_val = row['year_added'] if pd.notna(row['year_added']) and row['year_added'] != '' else None
-            
-            cur.execute(insert_query, (
-                int(row['product_id']),
-                row['product_type'] if pd.notna(row['product_type']) else None,
-                row['brand'] if pd.notna(row['brand']) else None,
-                row['weight'] if pd.notna(row['weight']) else None,
-                float(row['price']) if pd.notna(row['price']) else None,
-                int(row['average_units_sold']) if pd.notna(row['average_units_sold']) else None,
-                year_val,
-                row['stock_location'] if pd.notna(row['stock_location']) else None
-            ))
+        # Bulk load with COPY; NaN and empty strings (e.g. year_added) go in as NULL
+        stats = copy_dataframe(cur, df, shadow)
+        print(f"⚡ Copied products: {format_stats(stats)}")
         
         conn.commit()
+        swap_in(engine, 'products')
+        record_load(conn, 'products', os.path.join(DATA_DIR, 'products.csv'), source, stats.rows)
+        
+        # Clean the frame already in memory instead of re-reading the table
+        write_clean_tables(engine, CLEANING, frames={'products': df})
         
         # Verify data
-        cur.execute("SELECT COUNT(*) FROM products;")
-        count = cur.fetchone()[0]
+        with stage('verify', 'products'):
+            cur.execute("SELECT COUNT(*) FROM products;")
+            count = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM products WHERE year_added IS NULL;")
+            null_years = cur.fetchone()[0]
         print(f"✅ Loaded {count} rows into products table")
         
         # Show NULL counts
-        cur.execute("SELECT COUNT(*) FROM products WHERE year_added IS NULL;")
-        null_years = cur.fetchone()[0]
         print(f"ℹ️  Products with NULL year_added: {null_years}")
         
         # Show sample data
@@ -114,4 +119,7 @@ def load_grocery_sales_data():
         conn.close()
 
 if __name__ == "__main__":
-    load_grocery_sales_data()
+    load_dotenv(os.path.join(PROJECT_DIR, '.env'))
+    args = loader_parser("Load the grocery products CSV into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        load_grocery_sales_data(force=args.force)
@@ -1,49 +1,133 @@
-import pandas as pd
-import psycopg2
-from psycopg2 import sql
 import os
+import sys
 from dotenv import load_dotenv
 import time
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
 
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST'),
-    'port': os.getenv('DB_PORT'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_NAME')
+sys.path.append(os.path.join(PROJECT_DIR, '..'))
+from pgtools.bulk import CopyStats, copy_dataframe, format_stats
+from pgtools.cleaning import Impute, Prefixes, write_clean_tables
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, get_engine, project_config, raw_connection
+from pgtools.dtypes import compact_frame
+from pgtools.keys import ForeignKey, KeySpec, apply_keys
+from pgtools.manifest import fingerprint, is_unchanged, record_load
+from pgtools.metrics import instrumented, stage
+from pgtools.parallel import print_timings, run_parallel
+from pgtools.partitions import Partitioning, partition_shadows
+from pgtools.rangecopy import copy_frame_ranges, copy_parts
+from pgtools.schema import create_table_sql, describe_schema, typed_frame
+from pgtools.snapshot import snapshots
+from pgtools.staging import read_staged
+from pgtools.swap import discard_shadows, shadow_name, swap_in
+from pgtools.validation import Between, Parses, validate_frames
+
+TABLES = ['client', 'contract', 'loan', 'repayment']
+
+# Keys are built once the data is in: client/contract -> loan -> repayment
+KEYS = KeySpec(
+    primary_keys={'client': 'client_id', 'contract': 'contract_id', 'loan': 'loan_id', 'repayment': 'repayment_id'},
+    foreign_keys=[
+        ForeignKey('loan', 'client_id', 'client', 'client_id'),
+        ForeignKey('loan', 'contract_id', 'contract', 'contract_id'),
+        ForeignKey('repayment', 'loan_id', 'loan', 'loan_id'),
+    ],
+)
+
+# Yearly partitions with LOAD_PARTITIONS=1 (e.g. "contracts from 2022-01-01 onwards");
+# a partitioned contract can't be referenced, so loan.contract_id is then only indexed
+PARTITIONS = {
+    'contract': Partitioning('contract_date', 'year'),
+    'repayment': Partitioning('repayment_date', 'year'),
+}
+
+# Checked before the load; failing rows go to <table>_rejects and the rest load.
+# KEYS adds the key checks: ids present and unique, loan.client_id, loan.contract_id
+# and repayment.loan_id found among the valid rows they reference
+VALIDATION = {
+    'client': {'client_id': Parses('integer')},
+    'contract': {'contract_id': Parses('integer'), 'contract_date': Parses('date')},
+    'loan': {
+        'loan_id': Parses('integer'),
+        'principal_amount': [Parses('number'), Between(low=0)],
+        'interest_rate': [Parses('number'), Between(low=0)],
+    },
+    'repayment': {
+        'repayment_id': Parses('integer'),
+        'repayment_date': Parses('date'),
+        'repayment_amount': [Parses('number'), Between(low=0)],
+    },
+}
+
+# Task 1 and Task 2 cleaning, applied once after the load into client_clean and repayment_clean
+CLEANING = {
+    'client': {
+        # Matched like ILIKE 'un%' / 'e%' / 'f%' / 'p%'; anything else is unknown (NULL)
+        'employment_status': Prefixes([('un', 'unemployed'), ('e', 'employed'),
+                                       ('f', 'employed'), ('p', 'employed')]),
+    },
+    'repayment': {
+        'repayment_channel': Impute(missing=['-'], rules=[
+            (lambda df: df['repayment_amount'] > 4000, 'bank account'),
+            (lambda df: df['repayment_amount'] < 1000, 'mail'),
+        ]),
+    },
 }
 
-def connect_with_retry(max_retries=5, delay=2):
-    """Attempt to connect to PostgreSQL with retries."""
-    for attempt in range(max_retries):
-        try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            print(f"✅ Successfully connected to database on attempt {attempt + 1}")
-            return conn
-        except psycopg2.OperationalError as e:
-            if attempt < max_retries - 1:
-                print(f"⏳ Connection attempt {attempt + 1} failed. Retrying in {delay} seconds...")
-                time.sleep(delay)
-            else:
-                print(f"❌ Failed to connect after {max_retries} attempts")
-                raise e
+# Database connection parameters (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5436, default_db='lending')
 
-def load_lending_data():
+def copy_table(table, df):
+    """COPY one table into its shadow on its own connection and commit it.
+
+    A large table (e.g. repayment) is copied as several row ranges side by
+    side, each on its own connection, straight into the shadow.
+    """
+    parts = copy_parts(os.path.join(DATA_DIR, f'{table}.csv'))
+    if parts > 1:
+        start = time.perf_counter()
+        rows = copy_frame_ranges(get_engine(CONFIG), df, shadow_name(table), parts)
+        stats = CopyStats(table, rows, time.perf_counter() - start)
+        print(f"⚡ Copied {table} in {parts} parallel ranges: {format_stats(stats)}")
+        return stats
+    conn = raw_connection(CONFIG)
+    try:
+        cur = conn.cursor()
+        stats = copy_dataframe(cur, df, shadow_name(table))
+        conn.commit()
+        print(f"⚡ Copied {table}: {format_stats(stats)}")
+        return stats
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def load_lending_data(force=False):
     """Load loan insights data into PostgreSQL."""
     
-    # Connect to database
-    conn = connect_with_retry()
+    # Wait for the server (exponential backoff) and check out a pooled connection
+    engine = ensure_database(CONFIG)
+    conn = raw_connection(CONFIG)
+    print("✅ Successfully connected to database")
     cur = conn.cursor()
     
     try:
-        # Read CSV files
-        df_client = pd.read_csv('data/client.csv')
-        df_contract = pd.read_csv('data/contract.csv')
-        df_loan = pd.read_csv('data/loan.csv')
-        df_repayment = pd.read_csv('data/repayment.csv')
+        # The tables are linked by foreign keys and rebuilt together, so the
+        # load is skipped only when none of the four CSVs has changed
+        sources = {t: fingerprint(os.path.join(DATA_DIR, f'{t}.csv')) for t in TABLES}
+        if not force and all(is_unchanged(conn, t, sources[t]) for t in TABLES):
+            print("= CSVs unchanged since last load, skipping (use --force to reload)")
+            write_clean_tables(engine, CLEANING, changed=[])
+            return
+        
+        # Read CSV files (from their Parquet stages when current)
+        df_client = read_staged(os.path.join(DATA_DIR, 'client.csv'), source=sources['client'])
+        df_contract = read_staged(os.path.join(DATA_DIR, 'contract.csv'), source=sources['contract'])
+        df_loan = read_staged(os.path.join(DATA_DIR, 'loan.csv'), source=sources['loan'])
+        df_repayment = read_staged(os.path.join(DATA_DIR, 'repayment.csv'), source=sources['repayment'])
         
         print(f"\n📊 Data loaded:")
         print(f"   - client.csv: {len(df_client)} rows")
@@ -51,101 +135,52 @@ def load_lending_data():
         print(f"   - loan.csv: {len(df_loan)} rows")
         print(f"   - repayment.csv: {len(df_repayment)} rows")
         
-        # Drop tables if they exist (in correct order due to foreign keys)
-        cur.execute("DROP TABLE IF EXISTS repayment CASCADE;")
-        cur.execute("DROP TABLE IF EXISTS loan CASCADE;")
-        cur.execute("DROP TABLE IF EXISTS contract CASCADE;")
-        cur.execute("DROP TABLE IF EXISTS client CASCADE;")
-        
-        # Create client table
-        cur.execute("""
-        CREATE TABLE client (
-            client_id INTEGER PRIMARY KEY,
-            date_of_birth TEXT,
-            employment_status TEXT,
-            country TEXT
-        );
-        """)
-        print("✅ Created client table")
-        
-        # Create contract table
-        cur.execute("""
-        CREATE TABLE contract (
-            contract_id INTEGER PRIMARY KEY,
-            contract_date TEXT
-        );
-        """)
-        print("✅ Created contract table")
-        
-        # Create loan table
-        cur.execute("""
-        CREATE TABLE loan (
-            loan_id INTEGER PRIMARY KEY,
-            client_id INTEGER REFERENCES client(client_id),
-            contract_id INTEGER REFERENCES contract(contract_id),
-            principal_amount NUMERIC,
-            interest_rate NUMERIC,
-            loan_type TEXT
-        );
-        """)
-        print("✅ Created loan table")
-        
-        # Create repayment table
-        cur.execute("""
-        CREATE TABLE repayment (
-            repayment_id INTEGER PRIMARY KEY,
-            loan_id INTEGER REFERENCES loan(loan_id),
-            repayment_date TEXT,
-            repayment_amount NUMERIC,
-            repayment_channel TEXT
-        );
-        """)
-        print("✅ Created repayment table")
-        
-        # Insert client data
-        for _, row in df_client.iterrows():
-            cur.execute("""
-                INSERT INTO client (client_id, date_of_birth, employment_status, country)
-                VALUES (%s, %s, %s, %s)
-            """, (int(row['client_id']), row['date_of_birth'], row['employment_status'], row['country']))
+        # Rows failing VALIDATION are quarantined in <table>_rejects instead
+        # of failing the load; a loan whose client was rejected goes with it
+        frames = validate_frames(engine, VALIDATION, {'client': df_client, 'contract': df_contract,
+                                                      'loan': df_loan, 'repayment': df_repayment}, keys=KEYS)
+        
+        # Create each table under a shadow name, with column types inferred from
+        # its CSV (dates as DATE, amounts as NUMERIC); unparseable values
+        # go to data/rejects/. The live tables stay readable until the swap.
+        for t in TABLES:
+            frames[t], schema = typed_frame(frames[t], os.path.join(DATA_DIR, f'{t}.csv'), t)
+            # loan_type, country etc. as categoricals for the COPY and the cleaning below
+            frames[t] = compact_frame(frames[t], label=t)
+            cur.execute(f'DROP TABLE IF EXISTS "{shadow_name(t)}";')
+            cur.execute(create_table_sql(shadow_name(t), schema))
+            print(f"✅ Created {t} table: {describe_schema(schema)}")
+        
+        # Commit the empty tables so the COPY workers can see them
+        conn.commit()
+        # With LOAD_PARTITIONS=1 the contract and repayment shadows are range
+        # partitioned now, so COPY routes each row straight to its partition
+        partition_shadows(engine, PARTITIONS, frames)
         
-        # Insert contract data
-        for _, row in df_contract.iterrows():
-            cur.execute("""
-                INSERT INTO contract (contract_id, contract_date)
-                VALUES (%s, %s)
-            """, (int(row['contract_id']), row['contract_date']))
+        # Bulk load with COPY, one connection per table. The tables have no
+        # constraints yet, so all four load side by side.
+        start = time.perf_counter()
+        results = run_parallel({t: (lambda t=t: copy_table(t, frames[t])) for t in frames})
         
-        # Insert loan data
-        for _, row in df_loan.iterrows():
-            cur.execute("""
-                INSERT INTO loan (loan_id, client_id, contract_id, principal_amount, interest_rate, loan_type)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (int(row['loan_id']), int(row['client_id']), int(row['contract_id']), 
-                  float(row['principal_amount']), float(row['interest_rate']), row['loan_type']))
+        # The linked tables are swapped in together, so readers never mix old and new rows
+        swap_in(engine, *TABLES)
         
-        # Insert repayment data
-        for _, row in df_repayment.iterrows():
-            cur.execute("""
-                INSERT INTO repayment (repayment_id, loan_id, repayment_date, repayment_amount, repayment_channel)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (int(row['repayment_id']), int(row['loan_id']), row['repayment_date'], 
-                  float(row['repayment_amount']), row['repayment_channel']))
+        # Primary keys, foreign keys and their indexes, then fresh statistics
+        apply_keys(engine, KEYS)
+        print_timings(results, time.perf_counter() - start)
+        for t in TABLES:
+            record_load(conn, t, os.path.join(DATA_DIR, f'{t}.csv'), sources[t], results[t].value.rows)
         
-        conn.commit()
+        # Cleaned copies for the notebook, from the typed frames already in memory
+        write_clean_tables(engine, CLEANING, frames=frames)
         
         # Verify data
-        cur.execute("SELECT COUNT(*) FROM client;")
-        print(f"\n✅ Loaded {cur.fetchone()[0]} rows into client table")
-        
-        cur.execute("SELECT COUNT(*) FROM contract;")
-        print(f"✅ Loaded {cur.fetchone()[0]} rows into contract table")
-        
-        cur.execute("SELECT COUNT(*) FROM loan;")
-        print(f"✅ Loaded {cur.fetchone()[0]} rows into loan table")
-        
-        cur.execute("SELECT COUNT(*) FROM repayment;")
-        print(f"✅ Loaded {cur.fetchone()[0]} rows into repayment table")
+        print()
+        for t in TABLES:
+            with stage('verify', t):
+                cur.execute(f"SELECT COUNT(*) FROM {t};")
+                count = cur.fetchone()[0]
+            print(f"✅ Loaded {count} rows into {t} table")
         
         # Show sample data
         print("\n📋 Sample from client table:")
@@ -156,10 +191,14 @@ def load_lending_data():
     except Exception as e:
         print(f"❌ Error loading data: {e}")
         conn.rollback()
+        discard_shadows(engine, *TABLES)
         raise
     finally:
         cur.close()
         conn.close()
 
 if __name__ == "__main__":
-    load_lending_data()
+    load_dotenv(os.path.join(PROJECT_DIR, '.env'))
+    args = loader_parser("Load the Loan Insights CSVs into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        load_lending_data(force=args.force)
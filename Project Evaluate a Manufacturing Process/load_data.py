@@ -1,63 +1,55 @@
-import pandas as pd
-import psycopg2
-from sqlalchemy import create_engine, text
 import os
 from dotenv import load_dotenv
-from urllib.parse import quote_plus
+import sys
 import time
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
 
-# Database connection parameters
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_NAME = os.getenv('DB_NAME', 'manufacturing_db')
-DB_USER = os.getenv('DB_USER', 'postgres')
-DB_PASSWORD = os.getenv('DB_PASSWORD', 'your_password')
-DB_PORT = os.getenv('DB_PORT', '5434')
+sys.path.append(os.path.join(PROJECT_DIR, '..'))
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config
+from pgtools.loading import load_csv_table
+from pgtools.metrics import instrumented
+from pgtools.parallel import print_timings, run_parallel
+from pgtools.snapshot import snapshots
+from pgtools.spc import ControlChart, update_control_charts
 
-def create_connection():
-    """Create database connection with retry logic"""
-    # URL encode the password to handle special characters
-    encoded_password = quote_plus(DB_PASSWORD)
-    connection_string = f"postgresql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    
-    # Retry connection up to 5 times with 2 second delays
-    for attempt in range(5):
-        try:
-            engine = create_engine(connection_string)
-            # Test the connection
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            print("✅ Successfully connected to PostgreSQL database!")
-            return engine
-        except Exception as e:
-            if attempt < 4:
-                print(f"⏳ Waiting for database to be ready... (attempt {attempt + 1}/5)")
-                time.sleep(2)
-            else:
-                print(f"❌ Failed to connect to database after 5 attempts: {e}")
-                raise
+# Database connection parameters (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5434, default_db='manufacturing_db')
+
+# The notebook's SPC limits (5-part rolling mean ± 3 stddev per operator), updated
+# incrementally after each load; out-of-control parts go to spc_alerts
+CONTROL_CHARTS = [
+    ControlChart('manufacturing_parts', value='height', group='operator', order='item_no', window=5, sigmas=3),
+]
+
+def load_table(engine, table_name, force=False):
+    """Load data/<table_name>.csv into its table (skipped when the CSV is unchanged)"""
+    return load_csv_table(engine, os.path.join(DATA_DIR, f'{table_name}.csv'), table_name, force=force).columns
 
-def load_csv_to_db():
+def load_csv_to_db(force=False):
     """Load manufacturing CSV files to PostgreSQL database"""
-    engine = create_connection()
+    # Waits for the server with exponential backoff, then reuses the pooled engine
+    engine = ensure_database(CONFIG)
+    print("✅ Successfully connected to PostgreSQL database!")
     
-    # Load manufacturing_parts.csv (main table)
-    print(f"Loading data/manufacturing_parts.csv to table 'manufacturing_parts'...")
-    df_manufacturing = pd.read_csv('data/manufacturing_parts.csv')
-    df_manufacturing.to_sql('manufacturing_parts', engine, if_exists='replace', index=False)
-    print(f"✅ Successfully loaded {len(df_manufacturing)} rows to 'manufacturing_parts' table")
+    # manufacturing_parts (main table) and parts (reference table) load concurrently
+    start = time.perf_counter()
+    results = run_parallel({
+        'manufacturing_parts': lambda: load_table(engine, 'manufacturing_parts', force),
+        'parts': lambda: load_table(engine, 'parts', force),
+    })
+    print_timings(results, time.perf_counter() - start)
     
-    # Load parts.csv (reference table)
-    print(f"\nLoading data/parts.csv to table 'parts'...")
-    df_parts = pd.read_csv('data/parts.csv')
-    df_parts.to_sql('parts', engine, if_exists='replace', index=False)
-    print(f"✅ Successfully loaded {len(df_parts)} rows to 'parts' table")
+    print(f"\n📊 Manufacturing Parts Columns: {', '.join(results['manufacturing_parts'].value)}")
+    print(f"📊 Parts Columns: {', '.join(results['parts'].value)}")
     
-    print(f"\n📊 Manufacturing Parts Columns: {', '.join(df_manufacturing.columns.tolist())}")
-    print(f"📊 Parts Columns: {', '.join(df_parts.columns.tolist())}")
+    update_control_charts(engine, CONTROL_CHARTS)
     print(f"\n🎉 All data loading complete!")
 
 if __name__ == "__main__":
-    load_csv_to_db()
+    load_dotenv(os.path.join(PROJECT_DIR, '.env'))
+    args = loader_parser("Load the manufacturing CSVs into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        load_csv_to_db(force=args.force)
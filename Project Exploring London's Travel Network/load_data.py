@@ -1,70 +1,105 @@
 import os
-import pandas as pd
+import sys
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import URL
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
 
-# Database configuration
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = int(os.getenv("DB_PORT", "5439"))
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASS = os.getenv("DB_PASS")
-DB_NAME = os.getenv("DB_NAME", "tfl")
+sys.path.append(os.path.join(PROJECT_DIR, ".."))
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config
+from pgtools.dtypes import compact_frame
+from pgtools.manifest import fingerprint, is_unchanged, record_load
+from pgtools.metrics import instrumented, stage
+from pgtools.partitions import Partitioning, shadow_partitions, write_shadow
+from pgtools.rollups import Rollup, refresh_rollups
+from pgtools.snapshot import snapshots
+from pgtools.staging import read_staged
+from pgtools.streaming import DateCoercer, norm_cols, stream_chunksize, stream_csv_to_sql
+from pgtools.swap import shadow_name, swap_in
 
-def make_url(dbname: str) -> URL:
-    """Build a SQLAlchemy URL that properly escapes special chars in password."""
-    return URL.create(
-        "postgresql+psycopg2",
-        username=DB_USER,
-        password=DB_PASS,
-        host=DB_HOST,
-        port=DB_PORT,
-        database=dbname,
-    )
+# Database configuration (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5439, default_db="tfl")
 
-def ensure_database():
-    """Create database if it doesn't exist."""
-    admin_engine = create_engine(make_url("postgres"), isolation_level="AUTOCOMMIT")
-    with admin_engine.connect() as conn:
-        exists = conn.execute(
-            text("SELECT 1 FROM pg_database WHERE datname = :d"),
-            {"d": DB_NAME},
-        ).scalar()
-        if not exists:
-            conn.execute(text(f'CREATE DATABASE "{DB_NAME}";'))
-            print(f'Created database "{DB_NAME}".')
+# Yearly partitions with LOAD_PARTITIONS=1, for the per-year journey queries
+PARTITIONS = {'journeys': Partitioning('report_date', 'year')}
 
-def main():
-    ensure_database()
-    engine = create_engine(make_url(DB_NAME))
+# Version of main()'s transform for the Parquet stage (pgtools.staging):
+# bump it when the transform changes, so the stage is rebuilt
+STAGE_KEY = '1'
+
+# The notebook's journey totals, kept as materialized views and refreshed after each load
+ROLLUPS = [
+    Rollup("journeys_by_type", """
+        SELECT
+            journey_type,
+            ROUND(CAST(SUM(journeys_millions) AS NUMERIC), 2) AS total_journeys_millions
+        FROM journeys
+        GROUP BY journey_type
+    """, unique="journey_type"),
+    Rollup("journeys_by_year", """
+        SELECT
+            year,
+            journey_type,
+            ROUND(CAST(SUM(journeys_millions) AS NUMERIC), 2) AS total_journeys_millions
+        FROM journeys
+        GROUP BY year, journey_type
+    """, unique=["year", "journey_type"]),
+]
+
+def main(force=False):
+    engine = ensure_database(CONFIG)
     
     # Load TFL journeys data
-    csv_path = os.path.join("data", "TFL.JOURNEYS.csv")
+    csv_path = os.path.join(DATA_DIR, "TFL.JOURNEYS.csv")
+    source = fingerprint(csv_path)
+    if not force and is_unchanged(engine, 'journeys', source):
+        print(f"= {csv_path} unchanged since last load, skipping (use --force to reload)")
+        refresh_rollups(engine, ROLLUPS, changed=[])
+        return
     print(f"→ Loading {csv_path} -> journeys table")
     
-    df = pd.read_csv(csv_path)
+    # Normalize column names to lowercase with underscores and convert date columns
+    to_dates = DateCoercer(['report_date'])
+    transform = lambda chunk: to_dates(norm_cols(chunk))
     
-    # Normalize column names to lowercase with underscores
-    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    chunksize = stream_chunksize()
+    if chunksize:
+        # Streaming mode: constant memory, so skip the in-memory sample below
+        partitions = shadow_partitions(PARTITIONS, 'journeys')
+        rows = stream_csv_to_sql(csv_path, shadow_name('journeys'), engine, chunksize, transform, prepare=partitions)
+        partitions.report()
+        swap_in(engine, 'journeys')
+        print(f"   {rows:,} rows streamed to journeys table in chunks of {chunksize:,}")
+        record_load(engine, 'journeys', csv_path, source, rows)
+        refresh_rollups(engine, ROLLUPS, changed=['journeys'])
+        print("\nDone.")
+        return
     
-    # Convert date columns
-    if 'report_date' in df.columns:
-        df['report_date'] = pd.to_datetime(df['report_date'], errors='coerce')
+    df = read_staged(csv_path, transform, source, key=STAGE_KEY)
     
-    # Load to PostgreSQL
-    df.to_sql('journeys', engine, if_exists='replace', index=False)
+    # Load to PostgreSQL under a shadow name; readers keep the old table until the swap
+    with stage('write', 'journeys') as m:
+        write_shadow(engine, df, 'journeys', PARTITIONS)
+        m.rows = len(df)
+    swap_in(engine, 'journeys')
     print(f"   {len(df):,} rows written to journeys table")
+    record_load(engine, 'journeys', csv_path, source, len(df))
+    refresh_rollups(engine, ROLLUPS, changed=['journeys'])
+    
+    # Categorical labels and narrower numbers for the summaries below
+    df = compact_frame(df, label='journeys')
     
     # Display sample data
     print("\nSample data:")
     print(df.head())
     print(f"\nColumns: {list(df.columns)}")
-    print(f"Journey types: {df['journey_type'].unique() if 'journey_type' in df.columns else 'N/A'}")
+    print(f"Journey types: {df['journey_type'].unique().tolist() if 'journey_type' in df.columns else 'N/A'}")
     
     print("\nDone.")
 
 if __name__ == "__main__":
-    main()
+    load_dotenv(os.path.join(PROJECT_DIR, ".env"))
+    args = loader_parser("Load the TfL journeys CSV into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        main(force=args.force)
@@ -1,59 +1,92 @@
-import pandas as pd
-import psycopg2
-from psycopg2 import sql
 import os
+import sys
 from dotenv import load_dotenv
-import time
 
-# Load environment variables
-load_dotenv()
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
 
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST'),
-    'port': os.getenv('DB_PORT'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_NAME')
-}
+sys.path.append(os.path.join(PROJECT_DIR, '..'))
+from pgtools.bulk import copy_dataframe, format_stats
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config, raw_connection
+from pgtools.dtypes import compact_frame
+from pgtools.manifest import fingerprint, is_unchanged, record_load
+from pgtools.metrics import instrumented, stage
+from pgtools.snapshot import snapshots
+from pgtools.staging import read_staged
+from pgtools.streaming import norm_cols
+from pgtools.swap import shadow_name, swap_in
+from pgtools.validation import Between, OneOf, Parses, validate_frames
+
+# Database connection parameters (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5435, default_db='student_performance_db')
+
+RATINGS = ['Low', 'Medium', 'High']
+YES_NO = ['Yes', 'No']
 
-def connect_with_retry(max_retries=5, delay=2):
-    """Attempt to connect to PostgreSQL with retries."""
-    for attempt in range(max_retries):
-        try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            print(f"✅ Successfully connected to database on attempt {attempt + 1}")
-            return conn
-        except psycopg2.OperationalError as e:
-            if attempt < max_retries - 1:
-                print(f"⏳ Connection attempt {attempt + 1} failed. Retrying in {delay} seconds...")
-                time.sleep(delay)
-            else:
-                print(f"❌ Failed to connect after {max_retries} attempts")
-                raise e
+# Checked before the COPY, which would otherwise fail on the first value that
+# doesn't fit its column; failing rows go to student_performance_rejects
+VALIDATION = {
+    'student_performance': {
+        'hours_studied': [Parses('integer'), Between(low=0)],
+        'attendance': [Parses('number'), Between(0, 100)],
+        'sleep_hours': [Parses('number'), Between(0, 24)],
+        'previous_scores': [Parses('integer'), Between(low=0)],
+        'tutoring_sessions': [Parses('integer'), Between(low=0)],
+        'physical_activity': [Parses('integer'), Between(low=0)],
+        'exam_score': [Parses('number'), Between(low=0)],
+        'parental_involvement': OneOf(RATINGS),
+        'access_to_resources': OneOf(RATINGS),
+        'motivation_level': OneOf(RATINGS),
+        'family_income': OneOf(RATINGS),
+        'teacher_quality': OneOf(RATINGS),
+        'extracurricular_activities': OneOf(YES_NO),
+        'internet_access': OneOf(YES_NO),
+        'learning_disabilities': OneOf(YES_NO),
+        'school_type': OneOf(['Public', 'Private']),
+        'peer_influence': OneOf(['Positive', 'Neutral', 'Negative']),
+        'parental_education_level': OneOf(['High School', 'College', 'Postgraduate']),
+        'distance_from_home': OneOf(['Near', 'Moderate', 'Far']),
+        'gender': OneOf(['Male', 'Female']),
+    },
+}
 
-def load_student_performance_data():
+def load_student_performance_data(force=False):
     """Load student performance data into PostgreSQL."""
     
-    # Connect to database
-    conn = connect_with_retry()
+    # Wait for the server (exponential backoff) and check out a pooled connection
+    engine = ensure_database(CONFIG)
+    conn = raw_connection(CONFIG)
+    print("✅ Successfully connected to database")
     cur = conn.cursor()
     
     try:
-        # Read CSV
-        df = pd.read_csv('data/StudentPerformanceFactors.csv')
+        source = fingerprint(os.path.join(DATA_DIR, 'StudentPerformanceFactors.csv'))
+        if not force and is_unchanged(conn, 'student_performance', source):
+            print("= CSV unchanged since last load, skipping (use --force to reload)")
+            return
         
-        # Clean column names (lowercase and snake_case)
-        df.columns = df.columns.str.lower().str.replace(' ', '_')
+        # Read CSV (from the Parquet stage when it is current) and clean
+        # column names (lowercase and snake_case)
+        df = read_staged(os.path.join(DATA_DIR, 'StudentPerformanceFactors.csv'), norm_cols, source)
         
         print(f"\n📊 Loaded {len(df)} rows from StudentPerformanceFactors.csv")
         print(f"📋 Columns: {', '.join(df.columns)}")
         
-        # Drop table if exists and create new one
-        cur.execute("DROP TABLE IF EXISTS student_performance CASCADE;")
+        # Rows failing VALIDATION are quarantined instead of failing the COPY
+        df = validate_frames(engine, VALIDATION, {'student_performance': df})['student_performance']
+        
+        # Low/Medium/High ratings as categoricals, scores and hours as small integers
+        df = compact_frame(df, label='student_performance')
+        
+        # Build the new table under a shadow name; readers keep
+        # student_performance until the swap
+        shadow = shadow_name('student_performance')
+        cur.execute(f'DROP TABLE IF EXISTS "{shadow}";')
         
         # Create table with appropriate data types
-        create_table_query = """
-        CREATE TABLE student_performance (
+        create_table_query = f"""
+        CREATE TABLE "{shadow}" (
             hours_studied INTEGER,
             attendance FLOAT,
             parental_involvement VARCHAR(10),
@@ -80,24 +113,18 @@ def load_student_performance_data():
         cur.execute(create_table_query)
         print("✅ Created student_performance table")
         
-        # Insert data
-        for _, row in df.iterrows():
-            insert_query = """
-            INSERT INTO student_performance (
-                hours_studied, attendance, parental_involvement, access_to_resources,
-                extracurricular_activities, sleep_hours, previous_scores, motivation_level,
-                internet_access, tutoring_sessions, family_income, teacher_quality,
-                school_type, peer_influence, physical_activity, learning_disabilities,
-                parental_education_level, distance_from_home, gender, exam_score
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cur.execute(insert_query, tuple(row))
+        # Bulk load with COPY
+        stats = copy_dataframe(cur, df, shadow)
+        print(f"⚡ Copied student_performance: {format_stats(stats)}")
         
         conn.commit()
+        swap_in(engine, 'student_performance')
+        record_load(conn, 'student_performance', os.path.join(DATA_DIR, 'StudentPerformanceFactors.csv'), source, stats.rows)
         
         # Verify data
-        cur.execute("SELECT COUNT(*) FROM student_performance;")
-        count = cur.fetchone()[0]
+        with stage('verify', 'student_performance'):
+            cur.execute("SELECT COUNT(*) FROM student_performance;")
+            count = cur.fetchone()[0]
         print(f"✅ Loaded {count} rows into student_performance table")
         
         # Show sample data
@@ -115,4 +142,7 @@ def load_student_performance_data():
         conn.close()
 
 if __name__ == "__main__":
-    load_student_performance_data()
+    load_dotenv(os.path.join(PROJECT_DIR, '.env'))
+    args = loader_parser("Load the student performance CSV into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        load_student_performance_data(force=args.force)
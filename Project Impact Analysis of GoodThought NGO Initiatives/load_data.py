@@ -1,44 +1,90 @@
 import pandas as pd
-from sqlalchemy import create_engine
 import os
+import sys
+import time
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-DB_HOST = os.getenv('DB_HOST')
-DB_PORT = os.getenv('DB_PORT')
-DB_NAME = os.getenv('DB_NAME')
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-
-# Create database engine
-engine = create_engine(f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}')
-
-# Load CSV files
-print("Loading data...")
-
-# Load assignments
-df_assignments = pd.read_csv('data/assignments.csv')
-df_assignments.columns = df_assignments.columns.str.lower().str.replace(' ', '_')
-df_assignments.to_sql('assignments', engine, if_exists='replace', index=False)
-print(f"✓ assignments: {len(df_assignments)} rows")
-print(f"  Columns: {', '.join(df_assignments.columns)}")
-
-# Load donars
-df_donars = pd.read_csv('data/donars.csv')
-df_donars.columns = df_donars.columns.str.lower().str.replace(' ', '_')
-df_donars.to_sql('donars', engine, if_exists='replace', index=False)
-print(f"✓ donars: {len(df_donars)} rows")
-print(f"  Columns: {', '.join(df_donars.columns)}")
-
-# Load donations
-df_donations = pd.read_csv('data/donations.csv')
-df_donations.columns = df_donations.columns.str.lower().str.replace(' ', '_')
-df_donations.to_sql('donations', engine, if_exists='replace', index=False)
-print(f"✓ donations: {len(df_donations)} rows")
-print(f"  Columns: {', '.join(df_donations.columns)}")
-
-print(f"\nTotal records loaded: {len(df_assignments) + len(df_donars) + len(df_donations)}")
-print("\nSample data from assignments:")
-print(df_assignments.head(3))
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_DIR, 'data')
+
+sys.path.append(os.path.join(PROJECT_DIR, '..'))
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config
+from pgtools.keys import ForeignKey, KeySpec, apply_keys
+from pgtools.loading import load_csv_table
+from pgtools.metrics import instrumented
+from pgtools.parallel import default_workers, print_timings, run_parallel
+from pgtools.rollups import Rollup, refresh_rollups
+from pgtools.snapshot import snapshots
+
+# Database connection parameters (read from this project's .env)
+CONFIG = project_config(PROJECT_DIR, default_port=5442, default_db='ngo_db')
+
+TABLES = ['assignments', 'donars', 'donations']
+
+# Join keys used by the notebook, built after the load
+KEYS = KeySpec(
+    primary_keys={'assignments': 'assignment_id', 'donars': 'donor_id', 'donations': 'donation_id'},
+    foreign_keys=[
+        ForeignKey('donations', 'assignment_id', 'assignments', 'assignment_id'),
+        ForeignKey('donations', 'donor_id', 'donars', 'donor_id'),
+    ],
+)
+
+# Donation totals the notebook ranks, kept as a materialized view and refreshed after each load
+ROLLUPS = [
+    Rollup('donation_totals', """
+        SELECT
+            a.assignment_name,
+            a.region,
+            dn.donor_type,
+            ROUND(SUM(d.amount)::numeric, 2) AS rounded_total_donation_amount
+        FROM donations d
+        JOIN assignments a ON d.assignment_id = a.assignment_id
+        JOIN donars dn ON d.donor_id = dn.donor_id
+        GROUP BY a.assignment_name, a.region, dn.donor_type
+    """, unique=['assignment_name', 'region', 'donor_type']),
+]
+
+
+def norm_cols(df):
+    df.columns = df.columns.str.lower().str.replace(' ', '_')
+    return df
+
+
+def load_table(engine, table, force=False):
+    result = load_csv_table(engine, os.path.join(DATA_DIR, f'{table}.csv'), table, norm_cols, force)
+    print(f"✓ {table}: {result.rows} rows{' (unchanged)' if result.skipped else ''}")
+    print(f"  Columns: {', '.join(result.columns)}")
+    return result.rows
+
+
+def main(force=False):
+    # Shared pooled engine; the server is polled with exponential backoff first
+    engine = ensure_database(CONFIG)
+    workers = default_workers(len(TABLES))
+
+    # Load CSV files concurrently (the tables are independent)
+    print("Loading data...")
+    start = time.perf_counter()
+    results = run_parallel(
+        {t: (lambda t=t: load_table(engine, t, force)) for t in TABLES},
+        max_workers=workers,
+    )
+    # Keys and indexes go on after the bulk load, then the reloaded tables are analyzed
+    reloaded = [t for t, r in results.items() if r.value]
+    apply_keys(engine, KEYS, analyze=reloaded)
+    # Rollups over the reloaded tables are refreshed last
+    refresh_rollups(engine, ROLLUPS, changed=reloaded)
+
+    print(f"\nTotal records loaded: {sum(r.value for r in results.values())}")
+    print_timings(results, time.perf_counter() - start)
+    print("\nSample data from assignments:")
+    print(pd.read_sql("SELECT * FROM assignments LIMIT 3", engine))
+
+
+if __name__ == "__main__":
+    load_dotenv(os.path.join(PROJECT_DIR, '.env'))
+    args = loader_parser("Load the GoodThought NGO CSVs into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        main(force=args.force)
@@ -1,80 +1,83 @@
 # load_csvs_to_postgres.py
 import os
+import sys
 import glob
+import time
 import pandas as pd
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import URL
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.append(os.path.join(PROJECT_DIR, ".."))
+from pgtools.cli import loader_parser
+from pgtools.db import ensure_database, project_config
+from pgtools.keys import ForeignKey, KeySpec, apply_keys
+from pgtools.loading import load_csv_table
+from pgtools.metrics import instrumented
+from pgtools.parallel import default_workers, print_timings, run_parallel
+from pgtools.snapshot import snapshots
+from pgtools.streaming import norm_cols
 
 # --- Config ---
-CSV_DIR = os.path.join("data")  # folder containing your CSVs
-IF_EXISTS = "replace"            # or "replace"
+CSV_DIR = os.path.join(PROJECT_DIR, "data")  # folder containing your CSVs
 # ---------------
 
-# Load environment variables from .env (not tracked in GitHub)
-load_dotenv()
+# Connection settings come from .env (not tracked in GitHub)
+CONFIG = project_config(PROJECT_DIR, default_port=5432, default_db="Oldest_Businesses_DB")
 
-# Read values from .env
-PG_HOST = os.getenv("DB_HOST", "localhost")
-PG_PORT = int(os.getenv("DB_PORT", "5432"))
-PG_USER = os.getenv("DB_USER", "postgres")
-PG_PASSWORD = os.getenv("DB_PASS")
-PG_DB = os.getenv("DB_NAME", "Oldest_Businesses_DB")
+# Join keys used by the notebook, built after the load
+KEYS = KeySpec(
+    primary_keys={"categories": "category_code", "countries": "country_code"},
+    foreign_keys=[
+        ForeignKey(table, column, parent, column)
+        for table in ("businesses", "new_businesses")
+        for column, parent in (("country_code", "countries"), ("category_code", "categories"))
+    ],
+)
 
-
-def make_url(dbname: str) -> URL:
-    """Build a SQLAlchemy URL that properly escapes special chars in password."""
-    return URL.create(
-        "postgresql+psycopg2",
-        username=PG_USER,
-        password=PG_PASSWORD,
-        host=PG_HOST,
-        port=PG_PORT,
-        database=dbname,
-    )
-
-def ensure_database():
-    # connect to admin DB 'postgres' and create PG_DB if not exists
-    admin_engine = create_engine(make_url("postgres"), isolation_level="AUTOCOMMIT")
-    with admin_engine.connect() as conn:
-        exists = conn.execute(
-            text("SELECT 1 FROM pg_database WHERE datname = :d"),
-            {"d": PG_DB},
-        ).scalar()
-        if not exists:
-            conn.execute(text(f'CREATE DATABASE "{PG_DB}";'))
-            print(f'Created database "{PG_DB}".')
+# Version of prepare() for the Parquet stage (pgtools.staging):
+# bump it when prepare() changes, so the stage is rebuilt
+STAGE_KEY = "1"
 
 def norm_table_name(path: str) -> str:
     base = os.path.splitext(os.path.basename(path))[0]
     return base.strip().lower().replace(" ", "_")
 
-def norm_cols(df: pd.DataFrame) -> pd.DataFrame:
-    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+def prepare(df: pd.DataFrame) -> pd.DataFrame:
+    df = norm_cols(df)
+    # optional: gently convert year columns
+    for col in df.columns:
+        if col.endswith("year") or col.endswith("year_founded"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
     return df
 
-def main():
-    ensure_database()
-    engine = create_engine(make_url(PG_DB))
+def load_csv(engine, csv_path: str, force: bool = False) -> int:
+    return load_csv_table(engine, csv_path, norm_table_name(csv_path), prepare, force, stage_key=STAGE_KEY).rows
+
+def main(force: bool = False):
+    engine = ensure_database(CONFIG)
 
     csv_paths = sorted(glob.glob(os.path.join(CSV_DIR, "*.csv")))
     if not csv_paths:
         print(f"No CSVs found under: {CSV_DIR}")
         return
 
-    for csv_path in csv_paths:
-        table = norm_table_name(csv_path)
-        print(f"→ Loading {csv_path} -> {table}")
-        df = pd.read_csv(csv_path)
-        df = norm_cols(df)
-        # optional: gently convert year columns
-        for col in df.columns:
-            if col.endswith("year") or col.endswith("year_founded"):
-                df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
-        df.to_sql(table, engine, if_exists=IF_EXISTS, index=False)
-        print(f"   {len(df):,} rows written to {table}")
+    # Tables are independent, so each CSV gets its own worker and pooled connection
+    workers = default_workers(len(csv_paths))
+    start = time.perf_counter()
+    results = run_parallel(
+        {norm_table_name(p): (lambda p=p: load_csv(engine, p, force)) for p in csv_paths},
+        max_workers=workers,
+    )
+    # Keys and indexes go on after the bulk load, then the reloaded tables are analyzed
+    apply_keys(engine, KEYS, analyze=[t for t, r in results.items() if r.value])
+    print(f"\nLoaded {len(results)} tables with {workers} workers:")
+    print_timings(results, time.perf_counter() - start)
 
     print("\nDone.")
 
 if __name__ == "__main__":
-    main()
+    load_dotenv(os.path.join(PROJECT_DIR, ".env"))
+    args = loader_parser("Load the Oldest Businesses CSVs into PostgreSQL.").parse_args()
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        main(force=args.force)
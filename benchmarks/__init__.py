@@ -0,0 +1,7 @@
+"""Benchmark harness for the loaders and notebook queries.
+
+Run from the repository root::
+
+    python -m benchmarks.run --rows 1000000
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+"""
@@ -0,0 +1,66 @@
+"""Compare two benchmark result files, e.g. before and after a change.
+
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/new.json
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Optional, Tuple
+
+Key = Tuple[str, str, str]
+
+
+def _metric(record: dict) -> Optional[float]:
+    """Seconds for loads, median seconds for queries; None for failed queries."""
+    if record["kind"] == "load":
+        return record["seconds"]
+    return record["median_ms"] / 1000 if "median_ms" in record else None
+
+
+def _index(path: str) -> Tuple[dict, Dict[Key, dict]]:
+    with open(path) as f:
+        doc = json.load(f)
+    return doc["meta"], {(r["kind"], r["project"], r["name"]): r for r in doc["results"]}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent slowdown reported as a regression (default: 10)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args(argv)
+
+    base_meta, base = _index(args.base)
+    new_meta, new = _index(args.new)
+    print(f"base {base_meta['commit']} ({base_meta['rows']:,} rows)  ->  new {new_meta['commit']} ({new_meta['rows']:,} rows)")
+    if base_meta["rows"] != new_meta["rows"]:
+        print("⚠️  the runs used different scales; timings are not directly comparable")
+
+    regressions = 0
+    for key in sorted(base.keys() & new.keys()):
+        before, after = _metric(base[key]), _metric(new[key])
+        if before is None or after is None or before == 0:
+            continue
+        change = (after - before) / before * 100
+        flag = ""
+        if change > args.threshold:
+            flag = "  ⚠️ regression"
+            regressions += 1
+        elif change < -args.threshold:
+            flag = "  ✓ faster"
+        kind, project, name = key
+        print(f"{kind:<5} {project:<20} {name[:50]:<50} {before:9.3f}s -> {after:9.3f}s  {change:+7.1f}%{flag}")
+
+    for key in sorted(new.keys() - base.keys()):
+        print(f"new   {key[1]:<20} {key[2][:50]}")
+    for key in sorted(base.keys() - new.keys()):
+        print(f"gone  {key[1]:<20} {key[2][:50]}")
+
+    print(f"\n{regressions} regression(s) over {args.threshold:g}%")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Scale a project's CSVs up to benchmark size while keeping its schema and distributions.
+
+Every row is resampled from the project's own ``data/`` CSVs (a bootstrap, so
+each column keeps its value distribution, null rate and correlations with the
+other columns). Integer primary keys declared in the loader's ``KEYS`` are
+renumbered so they stay unique, and integer foreign keys are redrawn from the
+scaled parent's key range so joins still match. Lookup tables keyed by text
+codes (countries, categories, products) keep their original size.
+"""
+import glob
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from pgtools.keys import KeySpec, as_columns
+from pgtools.projects import Project, load_module
+
+GENERATE_CHUNK_ROWS = 1_000_000
+
+
+class TablePlan(NamedTuple):
+    csv_name: str
+    table: str
+    seed_rows: int
+    rows: int
+    key: Optional[str]  # CSV column holding an integer primary key to renumber
+
+
+def _norm(name: str) -> str:
+    return name.strip().lower().replace(" ", "_")
+
+
+def seed_csvs(project: Project) -> List[str]:
+    return sorted(glob.glob(os.path.join(project.path, "data", "*.csv")))
+
+
+def key_spec(project: Project) -> KeySpec:
+    return getattr(load_module(project), "KEYS", KeySpec())
+
+
+def plan(project: Project, rows: int) -> Dict[str, TablePlan]:
+    """Target row counts: the largest table gets ``rows``, the others keep their ratio to it."""
+    spec = key_spec(project)
+    seeds = {}
+    for path in seed_csvs(project):
+        head = pd.read_csv(path, nrows=1000)
+        with open(path, encoding="utf-8", errors="replace") as f:
+            seeds[path] = (head, sum(1 for _ in f) - 1)
+    if not seeds:
+        return {}
+    factor = rows / max(n for _, n in seeds.values())
+
+    plans = {}
+    for path, (head, n) in seeds.items():
+        name = os.path.basename(path)
+        table = project.table_for(name)
+        key = None
+        pk = spec.primary_keys.get(table)
+        if pk is not None and len(as_columns(pk)) == 1:
+            column = {_norm(c): c for c in head.columns}.get(as_columns(pk)[0])
+            if column is not None and pd.api.types.is_integer_dtype(head[column]):
+                key = column
+        lookup = pk is not None and key is None  # keyed by a text code: keep as is
+        plans[table] = TablePlan(name, table, n, n if lookup else max(1, round(n * factor)), key)
+    return plans
+
+
+def _depth(spec: KeySpec, table: str, seen=()) -> int:
+    parents = [fk.references for fk in spec.foreign_keys
+               if fk.table == table and fk.references != table and fk.references not in seen]
+    return 1 + max(_depth(spec, p, seen + (table,)) for p in parents) if parents else 0
+
+
+def generate(project: Project, rows: int, out_dir: str, seed: int = 42) -> Dict[str, int]:
+    """Write scaled copies of every seed CSV into ``out_dir``; returns rows per table.
+
+    Files are written in chunks of ``GENERATE_CHUNK_ROWS``, so memory stays flat
+    at any scale. Existing output for the same scale and seed is reused.
+    """
+    plans = plan(project, rows)
+    spec = key_spec(project)
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = os.path.join(out_dir, ".generated")
+    signature = f"{rows}:{seed}"
+    if os.path.exists(stamp) and open(stamp).read() == signature:
+        return {p.table: p.rows for p in plans.values()}
+
+    rng = np.random.default_rng(seed)
+    key_ranges: Dict[str, tuple] = {}  # parent table -> (first key, count)
+    # Parents first, so children can draw foreign keys from the scaled key range
+    for p in sorted(plans.values(), key=lambda p: _depth(spec, p.table)):
+        seed_df = pd.read_csv(os.path.join(project.path, "data", p.csv_name))
+        columns = {_norm(c): c for c in seed_df.columns}
+        first_key = int(seed_df[p.key].min()) if p.key else 0
+        if p.key:
+            key_ranges[p.table] = (first_key, p.rows)
+        fks = {columns[as_columns(fk.columns)[0]]: fk.references for fk in spec.foreign_keys
+               if fk.table == p.table and len(as_columns(fk.columns)) == 1 and as_columns(fk.columns)[0] in columns}
+
+        path = os.path.join(out_dir, p.csv_name)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for start in range(0, p.rows, GENERATE_CHUNK_ROWS):
+                n = min(GENERATE_CHUNK_ROWS, p.rows - start)
+                if p.rows == p.seed_rows:
+                    chunk = seed_df.iloc[start:start + n].copy()
+                else:
+                    chunk = seed_df.iloc[rng.integers(0, len(seed_df), n)].reset_index(drop=True)
+                if p.key:
+                    chunk[p.key] = np.arange(first_key + start, first_key + start + n)
+                for column, parent in fks.items():
+                    if parent in key_ranges and parent != p.table:
+                        lo, count = key_ranges[parent]
+                        drawn = pd.Series(rng.integers(lo, lo + count, n), index=chunk.index)
+                        chunk[column] = drawn.where(chunk[column].notna()).astype("Int64")
+                chunk.to_csv(f, index=False, header=start == 0)
+    with open(stamp, "w") as f:
+        f.write(signature)
+    return {p.table: p.rows for p in plans.values()}
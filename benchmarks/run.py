@@ -0,0 +1,235 @@
+"""Time every load strategy and notebook query on synthetic data at a chosen scale.
+
+Each project is loaded into its own ``bench_<project>`` database on the
+benchmark server (``benchmarks/docker-compose.yml``, port 5450 by default), so
+the notebooks' databases are never touched. Results are written as JSON to
+``benchmarks/results/<timestamp>-<commit>.json`` for ``benchmarks.compare``.
+
+    python -m benchmarks.run --rows 1000000
+    python -m benchmarks.run manufacturing loans --rows 10000000 --repeat 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import pandas as pd
+
+from benchmarks.generate import generate
+from pgtools.db import raw_connection
+from pgtools.notebooks import notebook_queries
+from pgtools.projects import PROJECTS, REPO_ROOT, Project, load_module, loader
+from pgtools.staging import STAGE_DIR
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Environment overrides per load strategy; "default" runs last so the
+# queries see the tables exactly as the normal loader leaves them. Every
+# strategy but "staged" parses the CSVs (LOAD_STAGING=0), so none of them
+# reads a Parquet stage another one wrote; "staged" times a load from a
+# stage written by an untimed load just before.
+STRATEGIES = {
+    "streaming": {"LOAD_CHUNKSIZE": "100000", "LOAD_STAGING": "0"},
+    "serial": {"LOAD_WORKERS": "1", "LOAD_STAGING": "0"},
+    "staged": {"LOAD_STAGING": "1"},
+    # Parallel range COPY at any file size, to see the load scale with the parts
+    **{f"ranges-{n}": {"LOAD_COPY_PARTS": str(n), "LOAD_COPY_MIN_MB": "0", "LOAD_STAGING": "0"} for n in (2, 4, 8)},
+    "default": {"LOAD_STAGING": "0"},
+}
+
+
+@contextlib.contextmanager
+def _env(overrides: Dict[str, str]):
+    saved = {k: os.environ.get(k) for k in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _seconds(run) -> float:
+    """Wall time of ``run()``, without tracing."""
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def _peak_mb(run) -> float:
+    """Peak traced Python/NumPy allocation of ``run()``, in a separate, untimed pass.
+
+    Tracing slows every allocation down, so it never runs during a timing.
+    """
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def _clear_stages(data_dir: str) -> None:
+    shutil.rmtree(os.path.join(data_dir, STAGE_DIR), ignore_errors=True)
+
+
+def applicable_strategies(module) -> List[str]:
+    names = []
+    if hasattr(module, "load_csv_table") or hasattr(module, "stream_chunksize"):
+        names.append("streaming")
+    if hasattr(module, "run_parallel"):
+        names.append("serial")
+    if hasattr(module, "read_staged") or hasattr(module, "load_csv_table"):
+        names.append("staged")
+    if hasattr(module, "load_csv_table") or hasattr(module, "copy_frame_ranges"):
+        names += [name for name in STRATEGIES if name.startswith("ranges-")]
+    return names + ["default"]
+
+
+def bench_project(project: Project, rows: int, repeat: int, seed: int, skip_loads: bool,
+                  memory: bool = True) -> List[dict]:
+    module = load_module(project)
+    data_dir = os.path.join(BENCH_DIR, ".data", project.key, str(rows))
+    table_rows = generate(project, rows, data_dir, seed)
+    if not table_rows:
+        print(f"   {project.key}: no CSVs under data/, skipped")
+        return []
+    total_rows = sum(table_rows.values())
+
+    # Point the loader at the generated CSVs and a scratch database
+    module.DATA_DIR = module.CSV_DIR = data_dir
+    module.CONFIG = module.CONFIG._replace(dbname=f"bench_{project.key}")
+
+    results = []
+    load = loader(project)
+    for strategy in ([] if skip_loads else applicable_strategies(module)):
+        with _env(STRATEGIES[strategy]), contextlib.redirect_stdout(io.StringIO()):
+            # Stages left by an earlier run (or another strategy) would make this one warm
+            _clear_stages(data_dir)
+            if strategy == "staged":
+                load(force=True)
+            seconds = _seconds(lambda: load(force=True))
+            peak_mb = _peak_mb(lambda: load(force=True)) if memory else None
+        results.append({
+            "kind": "load", "project": project.key, "name": strategy,
+            "rows": total_rows, "seconds": round(seconds, 4),
+            "rows_per_sec": round(total_rows / seconds, 1),
+            "peak_mb": None if peak_mb is None else round(peak_mb, 1),
+        })
+        memory_note = "" if peak_mb is None else f"  {peak_mb:8.1f} MB"
+        print(f"   load  {project.key:<20} {strategy:<10} {seconds:8.2f}s  "
+              f"{total_rows / seconds:>12,.0f} rows/s{memory_note}")
+    _clear_stages(data_dir)
+
+    conn = raw_connection(module.CONFIG)
+    names = set()
+    try:
+        for q in notebook_queries(project):
+            name = f"cell {q.cell}: {q.label}"
+            if name in names:  # several queries in one cell
+                name = f"{name} #{sum(n.startswith(name) for n in names) + 1}"
+            names.add(name)
+            record = {"kind": "query", "project": project.key, "name": name, "sql": q.sql}
+            timings = []
+            try:
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    df = pd.read_sql(q.sql, conn)
+                    timings.append(time.perf_counter() - start)
+                record["rows"] = len(df)
+                if memory:
+                    record["peak_mb"] = round(_peak_mb(lambda: pd.read_sql(q.sql, conn)), 1)
+                conn.rollback()
+            except Exception as e:
+                conn.rollback()
+                record["error"] = str(e).splitlines()[0]
+                print(f"   query {project.key:<20} {name[:50]:<50} ERROR {record['error']}")
+                results.append(record)
+                continue
+            record.update(median_ms=round(statistics.median(timings) * 1000, 2),
+                          min_ms=round(min(timings) * 1000, 2))
+            results.append(record)
+            print(f"   query {project.key:<20} {name[:50]:<50} {record['median_ms']:10.1f} ms")
+    finally:
+        conn.close()
+    return results
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def metadata(args) -> dict:
+    import psycopg2
+    import sqlalchemy
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rows": args.rows, "repeat": args.repeat, "seed": args.seed,
+        "python": platform.python_version(), "pandas": pd.__version__,
+        "sqlalchemy": sqlalchemy.__version__, "psycopg2": psycopg2.__version__.split()[0],
+        "cpu_count": os.cpu_count(), "server": f"{os.environ['DB_HOST']}:{os.environ['DB_PORT']}",
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("projects", nargs="*", metavar="PROJECT", help=f"default: all ({', '.join(PROJECTS)})")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows in each project's largest table")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query (median reported)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-loads", action="store_true", help="only time queries on already loaded data")
+    parser.add_argument("--skip-memory", action="store_true",
+                        help="no separate traced pass for peak memory (halves the run time)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    unknown = [p for p in args.projects if p not in PROJECTS]
+    if unknown:
+        parser.error(f"unknown project(s): {', '.join(unknown)}")
+
+    # One benchmark server for every project; DB_* overrides each project's .env
+    os.environ["DB_HOST"] = os.getenv("BENCH_DB_HOST", "localhost")
+    os.environ["DB_PORT"] = os.getenv("BENCH_DB_PORT", "5450")
+    os.environ["DB_USER"] = os.getenv("BENCH_DB_USER", "postgres")
+    os.environ["DB_PASSWORD"] = os.getenv("BENCH_DB_PASSWORD", "postgres")
+
+    # The notebooks read through plain psycopg2 connections too; same code path, no warning spam
+    warnings.filterwarnings("ignore", message="pandas only supports SQLAlchemy")
+
+    results = []
+    for key in args.projects or list(PROJECTS):
+        print(f"== {key}")
+        results += bench_project(PROJECTS[key], args.rows, args.repeat, args.seed, args.skip_loads,
+                                 memory=not args.skip_memory)
+
+    meta = metadata(args)
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{meta['created_at'].replace(':', '')[:17]}-{meta['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=1)
+    print(f"\nResults written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
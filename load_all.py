@@ -0,0 +1,78 @@
+"""Load any subset of the projects into PostgreSQL from a single process.
+
+Each project keeps its own database and ``.env``; engines are pooled per server
+and database, servers are polled with exponential backoff, and the projects run
+concurrently with a combined timing summary at the end. An empty database is
+restored from the project's snapshot first (see ``pgtools.snapshot``).
+
+    python load_all.py                    # every project
+    python load_all.py loans grocery      # a subset
+    python load_all.py --force --workers 4
+    python load_all.py --metrics metrics/loads.jsonl   # per-stage metrics as JSON lines
+"""
+import argparse
+import sys
+import time
+import traceback
+
+from pgtools.cli import loader_parser
+from pgtools.metrics import instrumented, project_scope
+from pgtools.parallel import default_workers, run_parallel
+from pgtools.projects import PROJECTS, load_module, loader
+from pgtools.snapshot import snapshots
+
+
+def run_project(key: str, force: bool):
+    """Run one project's loader, returning the error instead of raising it."""
+    project = PROJECTS[key]
+    try:
+        with project_scope(key), snapshots(load_module(project).CONFIG, project.path, force):
+            loader(project)(force=force)
+        return None
+    except Exception as e:
+        traceback.print_exc()
+        return e
+
+
+def main(argv=None) -> int:
+    parser = loader_parser(__doc__.splitlines()[0])
+    parser.formatter_class = argparse.RawDescriptionHelpFormatter
+    parser.add_argument("projects", nargs="*", metavar="PROJECT",
+                        help=f"projects to load (default: all): {', '.join(PROJECTS)}")
+    parser.add_argument("--workers", type=int,
+                        help="projects to load at the same time (default: LOAD_WORKERS or CPU count)")
+    parser.add_argument("--list", action="store_true", help="list project keys and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for key, project in PROJECTS.items():
+            print(f"{key:<22} {project.folder}")
+        return 0
+
+    unknown = [p for p in args.projects if p not in PROJECTS]
+    if unknown:
+        parser.error(f"unknown project(s): {', '.join(unknown)}")
+    selected = args.projects or list(PROJECTS)
+
+    with instrumented(args):
+        start = time.perf_counter()
+        results = run_parallel(
+            {key: (lambda key=key: run_project(key, args.force)) for key in selected},
+            max_workers=args.workers or default_workers(len(selected)),
+        )
+        wall = time.perf_counter() - start
+
+    print("\n=== Load summary ===")
+    failed = 0
+    for key in sorted(results, key=lambda k: -results[k].seconds):
+        result = results[key]
+        status = "ok" if result.value is None else f"FAILED: {result.value}"
+        failed += result.value is not None
+        print(f"   {key:<22} {result.seconds:7.2f}s  {status}")
+    total = sum(r.seconds for r in results.values())
+    print(f"   wall clock {wall:.2f}s (sum of projects {total:.2f}s), {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
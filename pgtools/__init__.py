@@ -0,0 +1,5 @@
+"""Shared PostgreSQL loading helpers used by the project ``load_data.py`` scripts.
+
+Each project folder is self-contained, so the loaders add the repository root
+to ``sys.path`` before importing from this package.
+"""
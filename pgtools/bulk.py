@@ -0,0 +1,97 @@
+import io
+import time
+from typing import NamedTuple, Optional, Sequence
+
+import pandas as pd
+from psycopg2 import sql
+
+from .metrics import stage
+
+# Rows rendered to CSV per read from the COPY stream
+COPY_CHUNK_ROWS = 50_000
+
+
+class CopyStats(NamedTuple):
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+
+def copy_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Prepare a DataFrame for COPY.
+
+    Integer columns that picked up NaN are read by pandas as float64 and would be
+    rendered as ``12.0``, which PostgreSQL rejects for INTEGER columns, so those
+    are turned back into nullable ``Int64``. Empty strings become NULL, matching
+    what the row-by-row loaders did by hand.
+    """
+    df = df.copy()
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_float_dtype(s):
+            values = s.dropna()
+            if len(values) and (values == values.round()).all():
+                df[col] = s.astype("Int64")
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            df[col] = s.mask(s.astype("string").str.len() == 0)
+    return df
+
+
+class _CsvStream(io.TextIOBase):
+    """File-like object that renders a DataFrame to CSV one slice at a time."""
+
+    def __init__(self, df: pd.DataFrame, chunk_rows: int):
+        self._df = df
+        self._chunk_rows = chunk_rows
+        self._pos = 0
+        self._buf = ""
+        self._offset = 0  # how much of _buf has been read
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        chunk = self._df.iloc[self._pos:self._pos + self._chunk_rows]
+        self._pos += self._chunk_rows
+        # Only the unread tail is kept, so each rendered chunk is copied once
+        self._buf = self._buf[self._offset:] + chunk.to_csv(index=False, header=False, na_rep="")
+        self._offset = 0
+
+    def read(self, size=-1):
+        while (size < 0 or len(self._buf) - self._offset < size) and self._pos < len(self._df):
+            self._fill()
+        end = len(self._buf) if size < 0 else min(self._offset + size, len(self._buf))
+        out = self._buf[self._offset:end]
+        self._offset = end
+        return out
+
+
+def copy_dataframe(cur, df: pd.DataFrame, table: str,
+                   columns: Optional[Sequence[str]] = None,
+                   chunk_rows: int = COPY_CHUNK_ROWS) -> CopyStats:
+    """Stream ``df`` into an existing table with ``COPY ... FROM STDIN``.
+
+    ``cur`` is a psycopg2 cursor; the caller owns the transaction. ``columns``
+    defaults to the DataFrame's columns, so the table keeps whatever typed
+    schema its ``CREATE TABLE`` declared. NaN/None values are sent as NULL.
+    """
+    columns = list(columns) if columns is not None else list(df.columns)
+    frame = copy_frame(df[columns])
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '')").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
+    )
+    with stage("copy", table) as m:
+        start = time.perf_counter()
+        cur.copy_expert(statement, _CsvStream(frame, chunk_rows))
+        elapsed = time.perf_counter() - start
+        m.rows = cur.rowcount if cur.rowcount >= 0 else len(frame)
+    return CopyStats(table, m.rows, elapsed)
+
+
+def format_stats(stats: CopyStats) -> str:
+    return f"{stats.rows:,} rows in {stats.seconds:.2f}s ({stats.rows_per_sec:,.0f} rows/sec)"
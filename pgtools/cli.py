@@ -0,0 +1,22 @@
+import argparse
+
+
+def loader_parser(description: str) -> argparse.ArgumentParser:
+    """Command-line options shared by every project loader."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="reload every table, even when its CSV is unchanged since the last load",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="append per-stage timings, throughput and memory to PATH as JSON lines (default: LOAD_METRICS)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="run the load stages under cProfile and print the slowest stage's hottest functions",
+    )
+    return parser
@@ -0,0 +1,249 @@
+"""A precomputed rollup cube: every group-by of a few dimensions, as NumPy arrays.
+
+The Motorcycle loader builds one over its sales after the load::
+
+    cube = build_cube(df, ['product_line', 'month', 'warehouse', 'client_type', 'payment'],
+                      {'total': df['total'], 'fees': df['total'] * df['payment_fee']})
+    cube.save(cube_path(csv_path), source.content_hash)
+
+The dimensions are integer-coded once, and one ``np.bincount`` per measure
+over the combined codes fills the base cells (row count and the sums). Each
+dimension then gets an extra "all" slot holding the total over that
+dimension, so every combination of group-bys and filters is a slice of a
+small array instead of a scan of the rows::
+
+    cube = load_cube(cube_path(csv_path))
+    cube.value('total', client_type='Wholesale')                     # one number
+    cube.frame(['product_line', 'month'], client_type='Wholesale')   # a GROUP BY result
+
+A file read in chunks (``LOAD_CHUNKSIZE``) gets the same cube from a
+:class:`CubeBuilder`, which adds each chunk's bincounts as it goes by.
+
+Sums are float64 and added in row order, so they can differ from
+PostgreSQL's ``SUM`` in the last bits; rounded half up to cents, as
+``ROUND(...::NUMERIC, 2)`` does, they agree.
+``python -m pgtools.cube data/.cube/sales.npz --by product_line --where
+client_type=Wholesale`` answers from a saved cube.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .metrics import stage
+
+CUBE_DIR = ".cube"
+ROWS = "rows"
+
+
+def cube_path(csv_path: str) -> str:
+    """``data/sales.csv``'s cube is ``data/.cube/sales.npz``."""
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, CUBE_DIR, os.path.splitext(name)[0] + ".npz")
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class Cube:
+    """Row counts and sums for every combination of ``dims``; index ``len(labels[d])`` of an axis is "all"."""
+
+    def __init__(self, dims: Sequence[str], labels: Mapping[str, List], measures: Mapping[str, np.ndarray]):
+        self.dims = list(dims)
+        self.labels = {d: list(labels[d]) for d in self.dims}
+        self.measures = dict(measures)
+
+    def _index(self, dim: str, label) -> int:
+        labels = self.labels[dim]
+        if label in labels:
+            return labels.index(label)
+        # Labels from the command line arrive as text
+        matches = [i for i, known in enumerate(labels) if str(known) == str(label)]
+        if not matches:
+            raise KeyError(f"{dim} has no {label!r} (known: {', '.join(map(str, labels))})")
+        return matches[0]
+
+    def _check(self, names) -> None:
+        unknown = [d for d in names if d not in self.labels]
+        if unknown:
+            raise KeyError(f"not a dimension of the cube: {', '.join(unknown)}")
+
+    def _cells(self, by: Sequence[str], where: Mapping[str, object]) -> tuple:
+        self._check([*by, *where])
+        index = []
+        for d in self.dims:
+            if d in by:
+                index.append(slice(0, len(self.labels[d])))
+            elif d in where:
+                index.append(self._index(d, where[d]))
+            else:
+                index.append(len(self.labels[d]))
+        return tuple(index)
+
+    def value(self, measure: str, **where):
+        """``measure`` over the rows matching ``where`` (``rows`` is the row count)."""
+        return _plain(self.measures[measure][self._cells([], where)])
+
+    def frame(self, by: Sequence[str], measures: Optional[Sequence[str]] = None, **where) -> pd.DataFrame:
+        """``GROUP BY by`` over the rows matching ``where``; combinations without rows are left out."""
+        measures = measures or list(self.measures)
+        self._check(by)
+        by = [d for d in self.dims if d in by]
+        if not by:
+            return pd.DataFrame({measure: [self.value(measure, **where)] for measure in measures})
+        cells = self._cells(by, where)
+        counts = self.measures[ROWS][cells]
+        present = np.nonzero(counts)
+        out = {d: np.asarray(self.labels[d], dtype=object)[present[i]] for i, d in enumerate(by)}
+        for measure in measures:
+            out[measure] = self.measures[measure][cells][present]
+        return pd.DataFrame(out)
+
+    def save(self, path: str, source: str = "") -> None:
+        """Write the cube (``source`` identifies the data it was built from, e.g. the CSV's hash)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = json.dumps({"dims": self.dims, "labels": self.labels, "source": source}, default=_plain)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, __meta__=np.array(meta), **self.measures)
+        os.replace(tmp, path)
+
+
+def load_cube(path: str, source: Optional[str] = None) -> Optional[Cube]:
+    """The cube saved at ``path``; None if there is none or it was built from another ``source``."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["__meta__"]))
+        if source is not None and meta["source"] != source:
+            return None
+        measures = {name: data[name] for name in data.files if name != "__meta__"}
+    return Cube(meta["dims"], meta["labels"], measures)
+
+
+def build_cube(df: pd.DataFrame, dims: Sequence[str], sums: Mapping[str, pd.Series]) -> Cube:
+    """Count the rows of ``df`` and add up each of ``sums`` for every combination of ``dims``.
+
+    Missing values are a label of their own in a dimension and count as 0 in
+    a sum, as ``SUM`` skips NULLs.
+    """
+    with stage("cube") as m:
+        codes, labels = [], {}
+        for d in dims:
+            column = df[d]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.cat.remove_unused_categories()
+            c, uniques = pd.factorize(column, sort=True, use_na_sentinel=False)
+            codes.append(c)
+            labels[d] = [None if pd.isna(u) else _plain(u) for u in uniques]
+        shape = tuple(len(labels[d]) for d in dims)
+        flat = np.ravel_multi_index(codes, shape) if len(df) else np.zeros(0, dtype=np.intp)
+        size = int(np.prod(shape))
+
+        measures = {ROWS: np.bincount(flat, minlength=size).reshape(shape)}
+        for name, values in sums.items():
+            weights = np.nan_to_num(np.asarray(values, dtype=np.float64))
+            measures[name] = np.bincount(flat, weights=weights, minlength=size).reshape(shape)
+        m.rows = len(df)
+        return Cube(dims, labels, {name: _with_totals(base) for name, base in measures.items()})
+
+
+class CubeBuilder:
+    """:func:`build_cube` over a frame that arrives in chunks: ``add()`` each, then ``cube()``.
+
+    Labels are numbered as they are first seen and the base cells grow to fit
+    them; ``cube()`` puts each dimension's labels in sorted order, as
+    :func:`build_cube` does (a categorical's are sorted by value, not by its
+    category order).
+    """
+
+    def __init__(self, dims: Sequence[str], sums: Sequence[str]):
+        self.dims = list(dims)
+        self.labels: dict = {d: [] for d in self.dims}
+        self._codes: dict = {d: {} for d in self.dims}
+        shape = (0,) * len(self.dims)
+        self.base = {ROWS: np.zeros(shape, dtype=np.int64), **{name: np.zeros(shape) for name in sums}}
+
+    def _code(self, dim: str, df: pd.DataFrame) -> np.ndarray:
+        """``df[dim]`` as positions in ``labels[dim]``, which gains the labels new in this chunk."""
+        column = df[dim]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype(object)
+        c, uniques = pd.factorize(column, use_na_sentinel=False)
+        codes, labels = self._codes[dim], self.labels[dim]
+        known = []
+        for u in uniques:
+            label = None if pd.isna(u) else _plain(u)
+            if label not in codes:
+                codes[label] = len(labels)
+                labels.append(label)
+            known.append(codes[label])
+        return np.asarray(known, dtype=np.intp)[c]
+
+    def add(self, df: pd.DataFrame, sums: Mapping[str, pd.Series]) -> None:
+        """Count the rows of ``df`` and add up each of ``sums`` into the cells."""
+        with stage("cube") as m:
+            codes = [self._code(d, df) for d in self.dims]
+            shape = tuple(len(self.labels[d]) for d in self.dims)
+            flat = np.ravel_multi_index(codes, shape) if len(df) else np.zeros(0, dtype=np.intp)
+            size = int(np.prod(shape))
+            for name, base in self.base.items():
+                weights = None if name == ROWS else np.nan_to_num(np.asarray(sums[name], dtype=np.float64))
+                counts = np.bincount(flat, weights=weights, minlength=size).reshape(shape)
+                counts[tuple(slice(0, n) for n in base.shape)] += base
+                self.base[name] = counts
+            m.rows = len(df)
+
+    def cube(self) -> Cube:
+        """The cube over every row added so far."""
+        labels, base = {}, dict(self.base)
+        for axis, d in enumerate(self.dims):
+            # Sorted, with the missing label last, as pd.factorize(sort=True) orders them
+            seen = self.labels[d]
+            order = sorted(range(len(seen)), key=lambda i: (seen[i] is None, seen[i]))
+            labels[d] = [seen[i] for i in order]
+            base = {name: np.take(cells, order, axis=axis) for name, cells in base.items()}
+        return Cube(self.dims, labels, {name: _with_totals(cells) for name, cells in base.items()})
+
+
+def _with_totals(base: np.ndarray) -> np.ndarray:
+    """``base`` with one more slot per axis, holding the sum over that axis."""
+    full = np.zeros(tuple(n + 1 for n in base.shape), dtype=base.dtype)
+    full[tuple(slice(0, n) for n in base.shape)] = base
+    for axis, n in enumerate(base.shape):
+        total = [slice(None)] * base.ndim
+        total[axis] = n
+        part = [slice(None)] * base.ndim
+        part[axis] = slice(0, n)
+        full[tuple(total)] = full[tuple(part)].sum(axis=axis)
+    return full
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a group-by from a saved rollup cube.")
+    parser.add_argument("path", help="a cube written by a loader, e.g. data/.cube/sales.npz")
+    parser.add_argument("--by", nargs="*", default=[], metavar="DIM")
+    parser.add_argument("--where", nargs="*", default=[], metavar="DIM=LABEL")
+    parser.add_argument("--measure", nargs="*", metavar="NAME", help="default: all")
+    args = parser.parse_args(argv)
+
+    cube = load_cube(args.path)
+    if cube is None:
+        parser.error(f"no cube at {args.path}")
+    where = dict(item.split("=", 1) for item in args.where)
+    start = time.perf_counter()
+    result = cube.frame(args.by, args.measure, **where)
+    elapsed = time.perf_counter() - start
+    print(result.to_string(index=False))
+    print(f"\n{len(result):,} rows from a {'x'.join(str(len(l)) for l in cube.labels.values())} cube "
+          f"in {elapsed * 1e6:,.0f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
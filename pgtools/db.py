@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from dotenv import dotenv_values
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, Engine
+from sqlalchemy.exc import OperationalError
+
+ENV_KEYS = ("DB_HOST", "DB_PORT", "DB_USER", "DB_PASSWORD", "DB_PASS", "DB_NAME")
+
+
+class DBConfig(NamedTuple):
+    host: str
+    port: int
+    user: str
+    password: Optional[str]
+    dbname: str
+
+    @property
+    def server(self) -> Tuple[str, int, str]:
+        return (self.host, self.port, self.user)
+
+
+def project_config(project_dir: str, default_port: int, default_db: str) -> DBConfig:
+    """Read a project's connection settings from its ``.env`` file.
+
+    Values already present in the process environment win, as with
+    ``load_dotenv()``, but the file is read without modifying ``os.environ`` so
+    several projects can be configured side by side in one process. Both
+    ``DB_PASSWORD`` and the older ``DB_PASS`` spelling are accepted.
+    """
+    env = {k: v for k, v in dotenv_values(os.path.join(project_dir, ".env")).items() if v is not None}
+    env.update({k: os.environ[k] for k in ENV_KEYS if k in os.environ})
+    return DBConfig(
+        host=env.get("DB_HOST") or "localhost",
+        port=int(env.get("DB_PORT") or default_port),
+        user=env.get("DB_USER") or "postgres",
+        password=env.get("DB_PASSWORD") or env.get("DB_PASS"),
+        dbname=env.get("DB_NAME") or default_db,
+    )
+
+
+def make_url(config: DBConfig, dbname: Optional[str] = None) -> URL:
+    """Build a SQLAlchemy URL that properly escapes special chars in password."""
+    return URL.create(
+        "postgresql+psycopg2",
+        username=config.user,
+        password=config.password,
+        host=config.host,
+        port=config.port,
+        database=dbname or config.dbname,
+    )
+
+
+_engines: Dict[tuple, Engine] = {}
+_ready_servers = set()
+_lock = threading.Lock()
+
+
+def get_engine(config: DBConfig, dbname: Optional[str] = None, **kwargs) -> Engine:
+    """Return the shared, pooled engine for ``config`` (one per server and database).
+
+    ``pool_pre_ping`` drops connections that died with a restarted container
+    instead of failing the next load.
+    """
+    key = (*config.server, dbname or config.dbname, tuple(sorted(kwargs.items())))
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            options = {"pool_size": 5, "max_overflow": 10, "pool_pre_ping": True}
+            options.update(kwargs)
+            engine = _engines[key] = create_engine(make_url(config, dbname), **options)
+    return engine
+
+
+def wait_until_ready(config: DBConfig, timeout: float = 60.0,
+                     initial_delay: float = 0.25, max_delay: float = 5.0) -> None:
+    """Block until the server accepts connections, backing off exponentially.
+
+    A server that has already answered in this process is not probed again.
+    """
+    if config.server in _ready_servers:
+        return
+    engine = get_engine(config, "postgres", isolation_level="AUTOCOMMIT")
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    attempt = 1
+    while True:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            break
+        except OperationalError:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"❌ {config.host}:{config.port} not ready after {attempt} attempts")
+                raise
+            print(f"⏳ Waiting for {config.host}:{config.port} (attempt {attempt}, retrying in {delay:.2f}s)...")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+            attempt += 1
+    with _lock:
+        _ready_servers.add(config.server)
+
+
+def ensure_database(config: DBConfig) -> Engine:
+    """Wait for the server, create the project database if needed and return its engine."""
+    wait_until_ready(config)
+    admin = get_engine(config, "postgres", isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :d"),
+            {"d": config.dbname},
+        ).scalar()
+        if not exists:
+            conn.execute(text(f'CREATE DATABASE "{config.dbname}";'))
+            print(f'Created database "{config.dbname}".')
+    return get_engine(config)
+
+
+def raw_connection(config: DBConfig):
+    """A pooled psycopg2 connection for the COPY-based loaders; ``close()`` returns it to the pool."""
+    return get_engine(config).raw_connection()
@@ -0,0 +1,97 @@
+"""Memory-compact dtypes for the loaders' and notebooks' DataFrames.
+
+Low-cardinality text (``client_type``, ``journey_type``, Low/Medium/High
+ratings) becomes categorical, integers are downcast to the smallest type that
+holds their range and floats to ``float32`` where that loses nothing::
+
+    df = compact_frame(df, label='sales')
+    # 🗜️  sales: 9.4 MiB -> 1.1 MiB in memory (8.5x)
+
+Categoricals also make the loaders' ``groupby``/``unique`` summaries cheaper.
+Column values are unchanged, so COPY and the schema inference in
+:mod:`pgtools.schema` give the same tables.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# A text column becomes categorical when at most this share of its values are distinct
+CATEGORY_RATIO = 0.5
+
+_INTS = [(np.int8, "Int8"), (np.int16, "Int16"), (np.int32, "Int32")]
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """Memory held by ``df``, strings included."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _size(n: int) -> str:
+    if n < 1024 * 1024:
+        return f"{n / 1024:.0f} KiB"
+    return f"{n / (1024 * 1024):.1f} MiB"
+
+
+def print_memory(label: str, before: int, after: int) -> None:
+    ratio = before / after if after else float("inf")
+    print(f"🗜️  {label}: {_size(before)} -> {_size(after)} in memory ({ratio:.1f}x)")
+
+
+def _is_text(s: pd.Series) -> bool:
+    # Object columns of dates or Decimals keep their ordering and arithmetic
+    if pd.api.types.is_object_dtype(s):
+        return pd.api.types.infer_dtype(s, skipna=True) == "string"
+    return pd.api.types.is_string_dtype(s) and not isinstance(s.dtype, pd.CategoricalDtype)
+
+
+def compact_series(s: pd.Series, categories: bool = True, numbers: bool = True,
+                   max_ratio: float = CATEGORY_RATIO) -> pd.Series:
+    """``s`` in the smallest dtype that holds its values exactly."""
+    if categories and _is_text(s):
+        present = s.notna().sum()
+        if present and s.nunique(dropna=True) <= max_ratio * present:
+            return s.astype("category")
+        return s
+    if not numbers or pd.api.types.is_bool_dtype(s):
+        return s
+    if pd.api.types.is_integer_dtype(s):
+        values = s.dropna()
+        if values.empty:
+            return s
+        lo, hi = values.min(), values.max()
+        nullable = isinstance(s.dtype, pd.api.extensions.ExtensionDtype)
+        for numpy_type, extension in _INTS:
+            info = np.iinfo(numpy_type)
+            if info.min <= lo and hi <= info.max:
+                target = extension if nullable else numpy_type
+                return s if s.dtype == target else s.astype(target)
+        return s
+    if s.dtype == np.float64:
+        narrow = s.astype(np.float32)
+        values = s.to_numpy()
+        # Exact, and printed (as COPY and to_csv do) as text that parses back to the same double
+        if (np.array_equal(narrow.to_numpy(dtype=np.float64), values, equal_nan=True)
+                and np.array_equal(narrow.to_numpy().astype(str).astype(np.float64), values, equal_nan=True)):
+            return narrow
+    return s
+
+
+def compact_frame(df: pd.DataFrame, categories: bool = True, numbers: bool = True,
+                  max_ratio: float = CATEGORY_RATIO, exclude: Iterable[str] = (),
+                  label: Optional[str] = None) -> pd.DataFrame:
+    """A copy of ``df`` with every column compacted (``exclude`` keeps columns as they are).
+
+    ``numbers=False`` leaves numeric columns alone, e.g. for results that are
+    used in arithmetic, where an ``int8`` would overflow. With ``label`` the
+    memory before and after is printed.
+    """
+    before = frame_bytes(df) if label else 0
+    skip = set(exclude)
+    out = df.copy()
+    for col in out.columns:
+        if col not in skip:
+            out[col] = compact_series(out[col], categories, numbers, max_ratio)
+    if label:
+        print_memory(label, before, frame_bytes(out))
+    return out
@@ -0,0 +1,249 @@
+"""Opt-in query profiling: EXPLAIN (ANALYZE, BUFFERS) capture, slow-query log and plan baselines.
+
+With ``QUERY_PROFILE=1`` the notebooks' ``run_query`` (:class:`pgtools.query.QueryCache`)
+profiles every query it sends to the server (cache hits never reach it)::
+
+    ⏱  412.3 ms    1,234 rows  buffers 5,010 hit / 120 read  Top 5 products in each category ...
+
+Each profile records the execution and planning time, the rows returned,
+the shared buffers hit and read, and the plan. Queries slower than
+``QUERY_SLOW_MS`` (default 200) are appended with their plan to
+``.query_profile/slow.jsonl``. The first profile of a query becomes its
+baseline in ``.query_profile/baseline/``; later ones are compared with it and
+a changed plan shape (node types, join types, relations and indexes) or an
+execution ``REGRESSION_RATIO`` times slower than the baseline is flagged.
+``QUERY_PROFILE=update`` replaces the baselines instead.
+
+Only queries (``SELECT``/``WITH``) are profiled, never commands. The query
+is run once more under EXPLAIN ANALYZE, in a savepoint that is rolled back,
+so profiling roughly doubles the time of each query it sees. Every notebook query of a project::
+
+    python -m pgtools.explain superstore unicorns         # profile and compare
+    python -m pgtools.explain superstore --update-baseline
+"""
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+from .query import is_read, normalize_sql
+
+PROFILE_ENV = "QUERY_PROFILE"
+SLOW_MS_ENV = "QUERY_SLOW_MS"
+DEFAULT_SLOW_MS = 200.0
+DEFAULT_PROFILE_DIR = ".query_profile"
+# Flag a query this many times slower than its baseline (and over the slow threshold)
+REGRESSION_RATIO = 2.0
+
+
+def profiling_mode() -> Optional[str]:
+    """``'compare'`` or ``'update'`` from ``QUERY_PROFILE``, None when profiling is off."""
+    value = os.getenv(PROFILE_ENV, "").strip().lower()
+    if value in ("", "0", "false", "no"):
+        return None
+    return "update" if value == "update" else "compare"
+
+
+class QueryProfile(NamedTuple):
+    sql: str
+    execution_ms: float
+    planning_ms: float
+    rows: int
+    shared_hit: int
+    shared_read: int
+    plan: List[str]
+    shape: List[str]
+
+    @property
+    def label(self) -> str:
+        return self.sql[:80]
+
+    def as_dict(self) -> dict:
+        return {**self._asdict(), "label": self.label}
+
+
+def explain_analyze(conn, sql: str) -> QueryProfile:
+    """Run ``sql`` under ``EXPLAIN (ANALYZE, BUFFERS)`` on a psycopg2 connection.
+
+    EXPLAIN ANALYZE executes the query, so it runs in a savepoint that is
+    rolled back: the caller's transaction keeps its earlier work and stays
+    usable even if the EXPLAIN fails. Under autocommit, where there is no
+    transaction to hold a savepoint, it runs in one of its own.
+    """
+    sql = normalize_sql(sql)
+    own = conn.autocommit
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN" if own else "SAVEPOINT pgtools_explain")
+        try:
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            document = cur.fetchone()[0]
+        finally:
+            cur.execute("ROLLBACK" if own else "ROLLBACK TO SAVEPOINT pgtools_explain; RELEASE SAVEPOINT pgtools_explain")
+    finally:
+        cur.close()
+    document = json.loads(document) if isinstance(document, str) else document
+    root = document[0]
+    plan = root["Plan"]
+    return QueryProfile(
+        sql=sql,
+        execution_ms=root.get("Execution Time", 0.0),
+        planning_ms=root.get("Planning Time", 0.0),
+        rows=int(plan.get("Actual Rows", 0) * plan.get("Actual Loops", 1)),
+        shared_hit=plan.get("Shared Hit Blocks", 0),
+        shared_read=plan.get("Shared Read Blocks", 0),
+        plan=plan_lines(plan),
+        shape=plan_shape(plan),
+    )
+
+
+def _describe(node: dict) -> List[str]:
+    parts = [node["Node Type"]]
+    for key in ("Join Type", "Strategy", "Relation Name", "Index Name", "CTE Name"):
+        if key in node:
+            parts.append(f"{key.split()[0].lower()}={node[key]}")
+    return parts
+
+
+def plan_shape(node: dict, depth: int = 0) -> List[str]:
+    """One line per plan node with what decides the plan, without costs, timings or row counts."""
+    lines = ["  " * depth + " ".join(_describe(node))]
+    for child in node.get("Plans", []):
+        lines += plan_shape(child, depth + 1)
+    return lines
+
+
+def plan_lines(node: dict, depth: int = 0) -> List[str]:
+    """The plan with each node's actual time, rows, loops and buffers, like EXPLAIN's text output."""
+    actual = (f"(actual time={node.get('Actual Total Time', 0):.3f} ms rows={node.get('Actual Rows', 0):,} "
+              f"loops={node.get('Actual Loops', 1)}) buffers {node.get('Shared Hit Blocks', 0):,} hit / "
+              f"{node.get('Shared Read Blocks', 0):,} read")
+    lines = ["  " * depth + "-> " + " ".join(_describe(node)) + "  " + actual]
+    for child in node.get("Plans", []):
+        lines += plan_lines(child, depth + 1)
+    return lines
+
+
+class QueryProfiler:
+    """Profiles queries, logs the slow ones and compares plans with their baselines."""
+
+    def __init__(self, conn, profile_dir: str = DEFAULT_PROFILE_DIR, slow_ms: Optional[float] = None,
+                 update_baseline: bool = False, verbose: bool = True):
+        self.conn = conn
+        self.profile_dir = profile_dir
+        self.slow_ms = float(os.getenv(SLOW_MS_ENV, DEFAULT_SLOW_MS)) if slow_ms is None else slow_ms
+        self.update_baseline = update_baseline
+        self.verbose = verbose
+        self.profiles: List[QueryProfile] = []
+
+    def __call__(self, sql: str) -> Optional[QueryProfile]:
+        """Profile one query; commands are skipped, and a query that fails under EXPLAIN is reported."""
+        if not is_read(sql):
+            return None
+        try:
+            profile = explain_analyze(self.conn, sql)
+        except Exception as e:
+            print(f"⚠️  not profiled: {str(e).strip().splitlines()[0]}")
+            return None
+        self.profiles.append(profile)
+        if self.verbose:
+            print(f"⏱  {profile.execution_ms:8.1f} ms {profile.rows:>9,} rows  "
+                  f"buffers {profile.shared_hit:,} hit / {profile.shared_read:,} read  {profile.label}")
+        if profile.execution_ms >= self.slow_ms:
+            self._log_slow(profile)
+        for problem in self.compare(profile):
+            print(f"⚠️  {problem}")
+        return profile
+
+    def _path(self, *parts: str) -> str:
+        path = os.path.join(self.profile_dir, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _baseline_path(self, profile: QueryProfile) -> str:
+        key = hashlib.sha256(profile.sql.encode()).hexdigest()[:24]
+        return self._path("baseline", f"{key}.json")
+
+    def _log_slow(self, profile: QueryProfile) -> None:
+        record = {"at": datetime.now(timezone.utc).isoformat(timespec="seconds"), **profile.as_dict()}
+        with open(self._path("slow.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def compare(self, profile: QueryProfile) -> List[str]:
+        """What changed since the query's baseline; the first profile (or an update) becomes the baseline."""
+        path = self._baseline_path(profile)
+        if self.update_baseline or not os.path.exists(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(profile.as_dict(), f, indent=1)
+            return []
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        problems = []
+        if baseline["shape"] != profile.shape:
+            diff = difflib.unified_diff(baseline["shape"], profile.shape, "baseline", "now", lineterm="", n=1)
+            problems.append(f"plan changed for {profile.label}\n      " + "\n      ".join(list(diff)[2:]))
+        slower = profile.execution_ms / max(baseline["execution_ms"], 1e-3)
+        if slower >= REGRESSION_RATIO and profile.execution_ms >= self.slow_ms:
+            problems.append(f"{slower:.1f}x slower than its baseline ({baseline['execution_ms']:.1f} -> "
+                            f"{profile.execution_ms:.1f} ms): {profile.label}")
+        return problems
+
+
+def profile_project(project, update_baseline: bool = False) -> List[dict]:
+    """Profile every notebook query of ``project`` on its PostgreSQL database."""
+    from .db import raw_connection
+    from .notebooks import notebook_queries
+    from .projects import load_module
+
+    queries = notebook_queries(project)
+    if not queries:
+        return []
+    conn = raw_connection(load_module(project).CONFIG)
+    profiler = QueryProfiler(conn, os.path.join(project.path, DEFAULT_PROFILE_DIR),
+                             update_baseline=update_baseline, verbose=False)
+    report = []
+    try:
+        for q in queries:
+            profile = profiler(q.sql)
+            if profile is not None:
+                report.append({"cell": q.cell, "label": q.label, "profile": profile,
+                               "slow": profile.execution_ms >= profiler.slow_ms})
+    finally:
+        conn.close()
+    return report
+
+
+def main(argv=None) -> int:
+    from .projects import PROJECTS
+
+    parser = argparse.ArgumentParser(description="Profile the notebook queries with EXPLAIN (ANALYZE, BUFFERS).")
+    parser.add_argument("projects", nargs="*", metavar="PROJECT", help=f"default: all ({', '.join(PROJECTS)})")
+    parser.add_argument("--update-baseline", action="store_true", help="store the plans as the new baselines")
+    parser.add_argument("--plans", action="store_true", help="print each query's EXPLAIN ANALYZE output")
+    args = parser.parse_args(argv)
+
+    unknown = [p for p in args.projects if p not in PROJECTS]
+    if unknown:
+        parser.error(f"unknown project(s): {', '.join(unknown)}")
+
+    slow = 0
+    for key in args.projects or list(PROJECTS):
+        print(f"== {key}")
+        for r in profile_project(PROJECTS[key], args.update_baseline):
+            p = r["profile"]
+            slow += r["slow"]
+            print(f"   {'🐢' if r['slow'] else '  '} cell {r['cell']:>3}: {p.execution_ms:9.1f} ms {p.rows:>9,} rows "
+                  f"{p.shared_hit + p.shared_read:>9,} buffers  {r['label'][:50]}")
+            if args.plans:
+                print("\n".join(f"         {line}" for line in p.plan))
+    print(f"\n{slow} slow queries (>= {os.getenv(SLOW_MS_ENV, DEFAULT_SLOW_MS)} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+from typing import Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import text
+
+from .metrics import stage
+
+Columns = Union[str, Sequence[str]]
+
+
+def as_columns(columns: Columns) -> Tuple[str, ...]:
+    return (columns,) if isinstance(columns, str) else tuple(columns)
+
+
+def _ident_list(columns: Iterable[str]) -> str:
+    return ", ".join(f'"{c}"' for c in columns)
+
+
+class ForeignKey(NamedTuple):
+    table: str
+    columns: Columns
+    references: str
+    ref_columns: Columns
+
+    @property
+    def name(self) -> str:
+        return f"{self.table}_{'_'.join(as_columns(self.columns))}_fkey"
+
+
+class KeySpec(NamedTuple):
+    """Keys and indexes a project's notebooks rely on, built after the bulk load.
+
+    ``primary_keys`` maps table -> key column(s), ``foreign_keys`` lists
+    :class:`ForeignKey` entries (their columns are indexed automatically) and
+    ``indexes`` maps table -> list of extra column sets to index.
+    """
+    primary_keys: Mapping[str, Columns] = {}
+    foreign_keys: Sequence[ForeignKey] = ()
+    indexes: Mapping[str, Sequence[Columns]] = {}
+
+    def tables(self) -> List[str]:
+        names = list(self.primary_keys) + [fk.table for fk in self.foreign_keys] + list(self.indexes)
+        return list(dict.fromkeys(names))
+
+
+def keys_lock(conn) -> None:
+    """Hold the database's key-change lock until ``conn``'s transaction ends.
+
+    One key or table swap at a time per database, whichever loader thread
+    asks: concurrent swaps of linked tables would otherwise deadlock on each
+    other's constraints.
+    """
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('pgtools.keys'))"))
+
+
+def drop_foreign_keys(conn, table: str) -> None:
+    """Drop every foreign key into or out of ``table`` so it can be replaced.
+
+    Runs inside the caller's transaction, which should hold :func:`keys_lock`;
+    :func:`apply_keys` puts the constraints back after the load.
+    """
+    rows = conn.execute(text("""
+        SELECT conrelid::regclass::text, quote_ident(conname)
+        FROM pg_constraint
+        WHERE contype = 'f'
+          AND to_regclass(:t) IS NOT NULL
+          AND (conrelid = to_regclass(:t) OR confrelid = to_regclass(:t))
+    """), {"t": f'"{table}"'}).fetchall()
+    for owner, name in rows:
+        conn.execute(text(f"ALTER TABLE {owner} DROP CONSTRAINT IF EXISTS {name}"))
+
+
+def partition_key(conn, table: str) -> Tuple[str, ...]:
+    """The columns ``table`` is partitioned by; empty for a plain table."""
+    rows = conn.execute(text("""
+        SELECT a.attname
+        FROM pg_partitioned_table p
+        CROSS JOIN LATERAL unnest(p.partattrs::int2[]) WITH ORDINALITY AS k(attnum, n)
+        JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = k.attnum
+        WHERE p.partrelid = to_regclass(:t)
+        ORDER BY k.n
+    """), {"t": f'"{table}"'}).fetchall()
+    return tuple(row[0] for row in rows)
+
+
+def _partition_key(engine, table: str) -> Tuple[str, ...]:
+    with engine.connect() as conn:
+        return partition_key(conn, table)
+
+
+def _run(engine, statement: str, failure: str) -> bool:
+    """Run one DDL statement in its own transaction; report and carry on if the data rejects it."""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+        return True
+    except Exception as e:
+        reason = getattr(e, "orig", e)
+        print(f"   ⚠️  {failure}: {str(reason).splitlines()[0]}")
+        return False
+
+
+def _exists(engine, query: str, **params) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(text(query), params).scalar() is not None
+
+
+@stage("keys")
+def apply_keys(engine, spec: KeySpec, analyze: Optional[Iterable[str]] = None) -> None:
+    """Create the declared primary keys, foreign keys and indexes, then ANALYZE.
+
+    Everything is idempotent, so tables skipped as unchanged keep their keys.
+    A key the data violates (duplicate ids, orphaned references) is reported
+    and replaced by a plain index rather than failing the load. ``analyze``
+    limits ANALYZE to the tables that were just reloaded (default: all tables
+    in the spec).
+
+    On a partitioned table (:mod:`pgtools.partitions`) the primary key also
+    covers the partition columns, as PostgreSQL requires, and foreign keys
+    can't reference it.
+    """
+    for table, columns in spec.primary_keys.items():
+        columns = as_columns(columns)
+        columns += tuple(c for c in _partition_key(engine, table) if c not in columns)
+        if _exists(engine, "SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(:t) AND contype = 'p'",
+                   t=f'"{table}"'):
+            continue
+        if _run(engine, f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ({_ident_list(columns)})',
+                f"no primary key on {table}({', '.join(columns)})"):
+            print(f"   🔑 {table}: primary key ({', '.join(columns)})")
+        else:
+            _create_index(engine, table, columns)
+
+    indexes = [(table, as_columns(c)) for table, sets in spec.indexes.items() for c in sets]
+    indexes += [(fk.table, as_columns(fk.columns)) for fk in spec.foreign_keys]
+    for table, columns in dict.fromkeys(indexes):
+        if columns != as_columns(spec.primary_keys.get(table, ())):  # already indexed by the key
+            _create_index(engine, table, columns)
+
+    for fk in spec.foreign_keys:
+        if _exists(engine, "SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(:t) AND conname = :n",
+                   t=f'"{fk.table}"', n=fk.name):
+            continue
+        target = f"{fk.references}({', '.join(as_columns(fk.ref_columns))})"
+        partitioned_by = [c for c in _partition_key(engine, fk.references) if c not in as_columns(fk.ref_columns)]
+        if partitioned_by:
+            print(f"   ⚠️  no foreign key {fk.table}({', '.join(as_columns(fk.columns))}) -> {target}: "
+                  f"{fk.references} is partitioned by {', '.join(partitioned_by)}")
+            continue
+        if _run(engine,
+                f'ALTER TABLE "{fk.table}" ADD CONSTRAINT "{fk.name}" FOREIGN KEY ({_ident_list(as_columns(fk.columns))}) '
+                f'REFERENCES "{fk.references}" ({_ident_list(as_columns(fk.ref_columns))})',
+                f"no foreign key {fk.table}({', '.join(as_columns(fk.columns))}) -> {target}"):
+            print(f"   🔗 {fk.table}({', '.join(as_columns(fk.columns))}) -> {target}")
+
+    tables = spec.tables() if analyze is None else list(analyze)
+    if tables:
+        with engine.begin() as conn:
+            conn.execute(text(f"ANALYZE {_ident_list(tables)}"))
+        print(f"   📈 Analyzed {', '.join(tables)}")
+
+
+def _create_index(engine, table: str, columns: Tuple[str, ...]) -> None:
+    name = f"{table}_{'_'.join(columns)}_idx"
+    _run(engine, f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({_ident_list(columns)})',
+         f"no index on {table}({', '.join(columns)})")
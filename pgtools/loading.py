@@ -0,0 +1,143 @@
+from typing import List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from .manifest import fingerprint, is_unchanged, record_load
+from .metrics import stage
+from .partitions import Partitioning, shadow_partitions, write_shadow
+from .rangecopy import copy_csv_ranges, copy_parts
+from .schema import (SchemaCoercer, SchemaProfiler, SqlType, describe_schema, sqlalchemy_dtypes,
+                     typed_frame, write_rejects)
+from .staging import read_staged
+from .streaming import Transform, read_csv_stream, stream_chunksize, stream_csv_to_sql
+from .swap import discard_shadows, shadow_name, swap_in
+from .validation import Check, ChunkValidator
+
+
+class LoadResult(NamedTuple):
+    table: str
+    rows: int
+    columns: List[str]
+    skipped: bool = False
+
+
+def table_columns(engine, table: str) -> List[str]:
+    return pd.read_sql(f'SELECT * FROM "{table}" LIMIT 0', engine).columns.tolist()
+
+
+def load_csv_table(engine, csv_path: str, table: str,
+                   transform: Optional[Transform] = None,
+                   force: bool = False,
+                   typed: bool = False,
+                   overrides: Optional[Mapping[str, SqlType]] = None,
+                   partition: Optional[Partitioning] = None,
+                   validation: Optional[Mapping[str, Union[Check, Sequence[Check]]]] = None,
+                   stage_key: Optional[str] = None) -> LoadResult:
+    """Replace ``table`` with ``csv_path`` via ``to_sql`` unless the CSV is unchanged.
+
+    The load manifest is consulted first (``force`` bypasses it), then the file
+    is either read whole (through the Parquet stage in ``data/.staged/``),
+    streamed in ``LOAD_CHUNKSIZE`` chunks, or, when it is large, split into
+    byte ranges that are parsed and COPYed side by side
+    (:mod:`pgtools.rangecopy`), with ``transform`` applied to the frame, to
+    every chunk or to every range. The rows go to a shadow table that is
+    swapped in when complete (:mod:`pgtools.swap`), so readers keep the old
+    table until then; the swap drops the table's foreign keys, which the
+    loader's ``apply_keys`` stage restores, recreates the views over it and
+    leaves the rollups to ``refresh_rollups``.
+
+    With ``typed``, column types are inferred from the data (``overrides`` pins
+    specific columns), values are parsed before the write and unparseable ones
+    are reported in ``data/rejects/<table>_types.csv``.
+
+    With ``partition`` and ``LOAD_PARTITIONS`` set, the table is range
+    partitioned on a date column (:mod:`pgtools.partitions`) before its rows
+    are written, so it is read whole or streamed but not copied in ranges.
+
+    With ``validation`` (the table's checks per column, see
+    :mod:`pgtools.validation`), the frame, every chunk or every range is
+    checked after ``transform`` and before the write; failing rows go to
+    ``<table>_rejects`` and the others load.
+
+    ``stage_key`` is the ``key`` of the Parquet stage
+    (:func:`~pgtools.staging.read_staged`): a loader with a transform of its
+    own passes one and changes it whenever the transform changes.
+    """
+    source = fingerprint(csv_path)
+    if not force and is_unchanged(engine, table, source):
+        print(f"= {csv_path} unchanged since last load, skipping {table}")
+        return LoadResult(table, 0, table_columns(engine, table), skipped=True)
+
+    print(f"→ Loading {csv_path} -> {table}")
+    try:
+        validator = ChunkValidator(engine, table, validation) if validation else None
+        rows, columns = _load_shadow(engine, csv_path, table, transform, typed, overrides, source,
+                                     {table: partition} if partition else {}, validator, stage_key)
+        if validator is not None:
+            validator.write()
+        swap_in(engine, table)
+    except Exception:
+        discard_shadows(engine, table)
+        raise
+
+    record_load(engine, table, csv_path, source, rows)
+    return LoadResult(table, rows, columns)
+
+
+def _load_shadow(engine, csv_path: str, table: str, transform: Optional[Transform], typed: bool,
+                 overrides: Optional[Mapping[str, SqlType]], source,
+                 partitions: Mapping[str, Partitioning],
+                 validator: Optional[ChunkValidator] = None,
+                 stage_key: Optional[str] = None) -> Tuple[int, List[str]]:
+    """Write ``csv_path`` to ``table``'s shadow; returns the row count and columns."""
+    shadow = shadow_name(table)
+    chunksize = stream_chunksize()
+    partitioned = shadow_partitions(partitions, table)
+    # copy_csv_ranges creates the shadow itself, without the partitions
+    parts = 1 if chunksize or typed or partitioned else copy_parts(csv_path)
+    rows = None
+    if parts > 1:
+        try:
+            rows = copy_csv_ranges(engine, csv_path, shadow, transform, parts, validate=validator)
+            columns = table_columns(engine, shadow)
+            print(f"   {rows:,} rows copied to {table} in {parts} parallel ranges")
+        except ValueError as e:
+            print(f"   ⚠️  {e}; loading it whole")
+    if chunksize:
+        sql_dtype = None
+        checked = _then(transform, validator) if validator else transform
+        if typed:
+            # Profile the whole file first so every chunk gets the same types
+            profiler = SchemaProfiler()
+            for chunk in read_csv_stream(csv_path, chunksize, transform):
+                profiler.update(chunk)
+            schema = profiler.schema(overrides)
+            coercer = SchemaCoercer(schema, profiler.date_formats())
+            checked = _then(checked, coercer)
+            sql_dtype = sqlalchemy_dtypes(schema)
+            print(f"   Types: {describe_schema(schema)}")
+        rows = stream_csv_to_sql(csv_path, shadow, engine, chunksize, checked, sql_dtype, prepare=partitioned)
+        partitioned.report()
+        if typed:
+            write_rejects(coercer, csv_path, table)
+        columns = table_columns(engine, shadow)
+        print(f"   {rows:,} rows streamed to {table} in chunks of {chunksize:,}")
+    elif rows is None:
+        df = read_staged(csv_path, transform, source, key=stage_key)
+        if validator:
+            df = validator(df)
+        sql_dtype = None
+        if typed:
+            df, schema = typed_frame(df, csv_path, table, overrides)
+            sql_dtype = sqlalchemy_dtypes(schema)
+            print(f"   Types: {describe_schema(schema)}")
+        with stage("write", table) as m:
+            write_shadow(engine, df, table, partitions, dtype=sql_dtype)
+            m.rows = len(df)
+        rows, columns = len(df), df.columns.tolist()
+        print(f"   {rows:,} rows written to {table}")
+    return rows, columns
+
+
+def _then(first: Optional[Transform], second: Transform) -> Transform:
+    return second if first is None else (lambda df: second(first(df)))
@@ -0,0 +1,122 @@
+import hashlib
+import os
+from contextlib import contextmanager
+from typing import Iterable, NamedTuple, Optional
+
+MANIFEST_TABLE = "load_manifest"
+
+_CREATE_MANIFEST = f"""
+CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+    table_name   TEXT PRIMARY KEY,
+    source_path  TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    size_bytes   BIGINT NOT NULL,
+    row_count    BIGINT,
+    loaded_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+class Fingerprint(NamedTuple):
+    content_hash: str
+    size_bytes: int
+
+
+def fingerprint(path: str, block_size: int = 1 << 20) -> Fingerprint:
+    """SHA-256 of a file, read in blocks so large CSVs are never held in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return Fingerprint(digest.hexdigest(), os.path.getsize(path))
+
+
+@contextmanager
+def _cursor(bind):
+    """Yield a DB-API cursor from a SQLAlchemy engine or a psycopg2 connection."""
+    owned = hasattr(bind, "raw_connection")
+    conn = bind.raw_connection() if owned else bind
+    cur = conn.cursor()
+    try:
+        # Serialise the CREATE so parallel table workers don't race on a fresh database
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (MANIFEST_TABLE,))
+        cur.execute(_CREATE_MANIFEST)
+        yield cur
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        if owned:
+            conn.close()
+
+
+def is_unchanged(bind, table: str, current: Fingerprint) -> bool:
+    """True when ``table`` exists and was last loaded from a file with this fingerprint."""
+    with _cursor(bind) as cur:
+        cur.execute(
+            f"""
+            SELECT m.content_hash, m.size_bytes
+            FROM {MANIFEST_TABLE} m
+            WHERE m.table_name = %s AND to_regclass(quote_ident(m.table_name)) IS NOT NULL
+            """,
+            (table,),
+        )
+        row = cur.fetchone()
+    return row is not None and Fingerprint(row[0], row[1]) == current
+
+
+def record_load(bind, table: str, path: str, current: Fingerprint,
+                row_count: Optional[int]) -> None:
+    """Upsert the manifest entry for ``table`` after a successful load.
+
+    ``current`` should be taken before the CSV is read, so a file that changes
+    mid-load is picked up again on the next run.
+    """
+    with _cursor(bind) as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {MANIFEST_TABLE} (table_name, source_path, content_hash, size_bytes, row_count, loaded_at)
+            VALUES (%s, %s, %s, %s, %s, now())
+            ON CONFLICT (table_name) DO UPDATE
+            SET source_path = EXCLUDED.source_path,
+                content_hash = EXCLUDED.content_hash,
+                size_bytes = EXCLUDED.size_bytes,
+                row_count = EXCLUDED.row_count,
+                loaded_at = EXCLUDED.loaded_at
+            """,
+            (table, os.path.abspath(path), current.content_hash, current.size_bytes, row_count),
+        )
+
+
+def record_derived(bind, table: str, sources: Iterable[str], row_count: Optional[int],
+                   if_missing: bool = False) -> None:
+    """Upsert the manifest entry for ``table``, built from the loaded ``sources`` (a rollup, a clean table).
+
+    Its ``source_path`` lists those of ``sources`` that are in the manifest
+    and its ``content_hash`` covers theirs, so ``QueryCache`` can key queries on it like on a loaded
+    table. With ``if_missing``, an existing entry is left as it is.
+    """
+    sources = sorted(set(sources))
+    with _cursor(bind) as cur:
+        cur.execute(
+            f"SELECT table_name, content_hash FROM {MANIFEST_TABLE} WHERE table_name = ANY(%s) ORDER BY table_name",
+            (sources,),
+        )
+        found = cur.fetchall()
+        content_hash = hashlib.sha256(repr(found).encode()).hexdigest()
+        update = """UPDATE
+            SET source_path = EXCLUDED.source_path,
+                content_hash = EXCLUDED.content_hash,
+                size_bytes = EXCLUDED.size_bytes,
+                row_count = EXCLUDED.row_count,
+                loaded_at = EXCLUDED.loaded_at"""
+        cur.execute(
+            f"""
+            INSERT INTO {MANIFEST_TABLE} (table_name, source_path, content_hash, size_bytes, row_count, loaded_at)
+            VALUES (%s, %s, %s, 0, %s, now())
+            ON CONFLICT (table_name) DO {"NOTHING" if if_missing else update}
+            """,
+            (table, ", ".join(name for name, _ in found), content_hash, row_count),
+        )
@@ -0,0 +1,229 @@
+"""Per-stage load metrics: wall and CPU time, rows/sec, bytes read and peak RSS.
+
+Load stages run inside ``stage()``::
+
+    with stage('read', table, source=csv_path) as m:
+        df = pd.read_csv(csv_path)
+        m.rows = len(df)
+
+The shared stages (staged/streamed reads, type parsing, ``to_sql``/COPY
+writes, keys, rollups, cleaning) are already wrapped; loaders wrap their own
+writes and verification queries. A loader run collects every record and, at
+the end, prints a summary table. ``--metrics PATH`` (or ``LOAD_METRICS``)
+appends the records to PATH as JSON lines, one object per stage, so runs can
+be compared across data drops. ``--profile`` (or ``LOAD_PROFILE=1``) runs the
+stages under cProfile and prints the hottest functions of the slowest one.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+from .projects import project_at
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_ENV = "LOAD_METRICS"
+PROFILE_ENV = "LOAD_PROFILE"
+
+# Functions shown for the slowest stage with --profile
+PROFILE_TOP = 15
+
+_project: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("load_project", default=None)
+_records: List["StageRecord"] = []
+_lock = threading.Lock()
+_profiling = False
+_local = threading.local()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MiB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageRecord:
+    """Measurements of one stage; ``rows`` and ``bytes_read`` are filled in by the stage itself."""
+
+    def __init__(self, stage: str, table: Optional[str], project: Optional[str]):
+        self.stage = stage
+        self.table = table
+        self.project = project
+        self.started_at = datetime.now(timezone.utc)
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows: Optional[int] = None
+        self.bytes_read: Optional[int] = None
+        self.peak_rss_mb: Optional[float] = None
+        self.error: Optional[str] = None
+        self.profile: Optional[cProfile.Profile] = None
+
+    @property
+    def rows_per_sec(self) -> Optional[float]:
+        if self.rows is None:
+            return None
+        return self.rows / self.wall if self.wall > 0 else float(self.rows)
+
+    def as_dict(self) -> dict:
+        return {
+            "project": self.project,
+            "stage": self.stage,
+            "table": self.table,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "rows": self.rows,
+            "rows_per_sec": None if self.rows_per_sec is None else round(self.rows_per_sec, 1),
+            "bytes_read": self.bytes_read,
+            "peak_rss_mb": None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+            "error": self.error,
+        }
+
+
+@contextmanager
+def stage(name: str, table: Optional[str] = None, source: Optional[str] = None) -> Iterator[StageRecord]:
+    """Measure the block as one stage. ``source`` is a file the stage reads (its size is ``bytes_read``).
+
+    CPU time is that of the thread running the stage, so stages on the
+    loaders' worker threads don't count each other's work. Peak RSS is the
+    process's high-water mark when the stage ends.
+    """
+    record = StageRecord(name, table, _project.get())
+    if source is not None and os.path.exists(source):
+        record.bytes_read = os.path.getsize(source)
+    profile = _start_profile()
+    cpu, start = time.thread_time(), time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.error = f"{type(e).__name__}: {e}".splitlines()[0]
+        raise
+    finally:
+        record.wall = time.perf_counter() - start
+        record.cpu = time.thread_time() - cpu
+        record.peak_rss_mb = peak_rss_mb()
+        if profile is not None:
+            profile.disable()
+            _local.profiling = False
+            record.profile = profile
+        with _lock:
+            _records.append(record)
+
+
+def _start_profile() -> Optional[cProfile.Profile]:
+    # Only the outermost stage on a thread is profiled; nested profilers would replace it
+    if not _profiling or getattr(_local, "profiling", False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:  # another profiler is active (one per process on Python 3.12+)
+        return None
+    _local.profiling = True
+    return profile
+
+
+def records() -> List[StageRecord]:
+    with _lock:
+        return list(_records)
+
+
+@contextmanager
+def project_scope(project: str) -> Iterator[None]:
+    """Tag the stages run in the block (and on threads started by ``run_parallel``) with ``project``."""
+    token = _project.set(project)
+    try:
+        yield
+    finally:
+        _project.reset(token)
+
+
+def write_jsonl(path: str, run: List[StageRecord]) -> None:
+    """Append one JSON object per stage to ``path``, tagged with a shared run id."""
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in run:
+            f.write(json.dumps({"run": run_id, **record.as_dict()}) + "\n")
+
+
+def _fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_stage_summary(run: List[StageRecord]) -> None:
+    """Stages sorted by wall time, with their throughput and the process's peak RSS."""
+    if not run:
+        return
+    # load_all runs several projects at once; name them next to their tables
+    several = len({r.project for r in run}) > 1
+    print("\n📏 Stages")
+    print(f"   {'stage':<10} {'table':<22} {'wall s':>8} {'cpu s':>8} {'rows':>11} {'rows/s':>11} {'MiB read':>9} {'peak MiB':>9}")
+    for r in sorted(run, key=lambda r: -r.wall):
+        mib = None if r.bytes_read is None else r.bytes_read / (1024 * 1024)
+        table = r.table or "-"
+        if several:
+            table = f"{r.project}.{r.table}" if r.table else r.project
+        line = (f"   {r.stage:<10} {table[:22]:<22} {r.wall:8.3f} {r.cpu:8.3f} "
+                f"{_fmt(r.rows, ',d'):>11} {_fmt(r.rows_per_sec, ',.0f'):>11} "
+                f"{_fmt(mib, '.1f'):>9} {_fmt(r.peak_rss_mb, '.0f'):>9}")
+        print(line + (f"  ⚠️  {r.error}" if r.error else ""))
+
+
+def print_slowest_profile(run: List[StageRecord], top: int = PROFILE_TOP) -> None:
+    profiled = [r for r in run if r.profile is not None]
+    if not profiled:
+        return
+    slowest = max(profiled, key=lambda r: r.wall)
+    out = io.StringIO()
+    pstats.Stats(slowest.profile, stream=out).sort_stats("cumulative").print_stats(top)
+    print(f"\n🔬 Slowest stage: {slowest.stage} {slowest.table or ''} ({slowest.wall:.2f}s)")
+    print(out.getvalue().rstrip())
+
+
+@contextmanager
+def instrumented(args=None, project_dir: Optional[str] = None) -> Iterator[None]:
+    """Collect the stage metrics of one loader run and report them when it ends.
+
+    ``args`` are the parsed :func:`pgtools.cli.loader_parser` options
+    (``--metrics``, ``--profile``); the environment variables are the
+    fallback. Records are tagged with the project key of ``project_dir``.
+    The report is printed even if the load fails.
+    """
+    global _profiling
+    path = getattr(args, "metrics", None) or os.getenv(METRICS_ENV)
+    _profiling = bool(getattr(args, "profile", False)) or os.getenv(PROFILE_ENV, "0") not in ("", "0")
+    first = len(records())
+    token = None
+    if project_dir:
+        project = project_at(project_dir)
+        token = _project.set(project.key if project else os.path.basename(project_dir))
+    try:
+        yield
+    finally:
+        if token is not None:
+            _project.reset(token)
+        run = records()[first:]
+        print_stage_summary(run)
+        if _profiling:
+            print_slowest_profile(run)
+        _profiling = False
+        if path and run:
+            write_jsonl(path, run)
+            print(f"📏 {len(run)} stage records appended to {path}")
+        with _lock:
+            del _records[first:]
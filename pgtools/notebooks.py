@@ -0,0 +1,53 @@
+"""Pull the SQL out of a project's notebook (for the benchmarks and the offline compatibility report)."""
+import json
+import os
+import re
+from typing import List, NamedTuple
+
+from .projects import Project
+from .query import is_read
+
+# query = """...""", run_query("""...""") / run_query("..."), read_sql*("...", conn)
+_PATTERNS = [
+    re.compile(r'\b\w*query\w*\s*=\s*(?:f?)"""(.*?)"""', re.DOTALL),
+    re.compile(r'\b(?:run_query|read_sql(?:_query)?)\(\s*"""(.*?)"""', re.DOTALL),
+    re.compile(r'\b(?:run_query|read_sql(?:_query)?)\(\s*"([^"\n]+)"'),
+]
+
+
+class NotebookQuery(NamedTuple):
+    cell: int
+    label: str
+    sql: str
+
+
+def _label(cell_source: str, sql: str) -> str:
+    for line in cell_source.splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            return line.lstrip("# ")[:80]
+    return " ".join(sql.split())[:80]
+
+
+def notebook_queries(project: Project) -> List[NotebookQuery]:
+    path = os.path.join(project.path, "notebook.ipynb")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        cells = json.load(f)["cells"]
+
+    queries = []
+    for i, cell in enumerate(cells):
+        if cell["cell_type"] != "code":
+            continue
+        source = "".join(cell["source"])
+        seen = set()
+        for pattern in _PATTERNS:
+            for match in pattern.finditer(source):
+                sql = match.group(1).strip()
+                # Only read queries: the benchmark must not change the data it measures
+                if sql in seen or not is_read(sql) or "{" in sql:
+                    continue
+                seen.add(sql)
+                queries.append(NotebookQuery(i, _label(source, sql), sql))
+    return queries
@@ -0,0 +1,238 @@
+"""Run the notebooks' SQL in-process with DuckDB, straight from ``data/``, without PostgreSQL.
+
+In a notebook (``NOTEBOOK_BACKEND=duckdb``)::
+
+    conn = offline_connection()        # instead of psycopg2.connect(...)
+    run_query = QueryCache(conn)       # pd.read_sql_query(sql, conn) works too
+
+Which notebook queries still need the PostgreSQL container::
+
+    python -m pgtools.offline                  # every project
+    python -m pgtools.offline hotel --compare  # also diff the results against PostgreSQL
+"""
+import argparse
+import glob
+import os
+import sys
+import warnings
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import pandas as pd
+
+from .cleaning import CLEAN_SUFFIX, Cleaning, clean_frame
+from .projects import PROJECTS, Project, load_module, project_at, table_name
+from .query import normalize_sql
+
+BACKEND_ENV = "NOTEBOOK_BACKEND"
+
+
+def use_offline() -> bool:
+    """True when ``NOTEBOOK_BACKEND=duckdb``; the notebooks connect to PostgreSQL otherwise."""
+    return os.getenv(BACKEND_ENV, "postgres").lower() == "duckdb"
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("the offline backend needs DuckDB: pip install duckdb") from None
+    return duckdb
+
+
+def data_files(project_dir: str) -> Dict[str, str]:
+    """``{table: path}`` for every ``data/*.csv`` (and ``*.parquet``), named as the loaders name them."""
+    project = project_at(project_dir)
+    files = {}
+    for path in sorted(glob.glob(os.path.join(project_dir, "data", "*.csv"))
+                       + glob.glob(os.path.join(project_dir, "data", "*.parquet"))):
+        name = os.path.basename(path)
+        files.setdefault(project.table_for(name) if project else table_name(name), path)
+    return files
+
+
+class OfflineConnection:
+    """Enough of a psycopg2 connection for the notebooks, backed by an in-memory DuckDB.
+
+    Every data file becomes a table named and column-normalized the way the
+    loaders do it (lowercase, snake_case), with types detected from the whole
+    file, the loader's ``CLEANING`` rules produce the same ``<table>_clean``
+    tables, and its ``ROLLUPS`` become plain views computed on read.
+    ``pd.read_sql_query``, ``cursor()``, ``commit()``/``rollback()`` and
+    :class:`pgtools.query.QueryCache` work unchanged; the cache keys results on
+    the data files' size and modification time instead of the load manifest.
+    Queries are written for PostgreSQL, so params use ``%s`` there and ``?``
+    here; none of the notebooks pass any.
+    """
+
+    autocommit = True
+
+    def __init__(self, files: Mapping[str, str], rollups: Sequence = (), cleaning: Optional[Cleaning] = None):
+        self.files = dict(files)
+        self.db = _duckdb().connect()
+        for table, path in self.files.items():
+            reader = "read_parquet(?)" if path.endswith(".parquet") else "read_csv(?, sample_size = -1)"
+            columns = [row[0] for row in self.db.execute(f"DESCRIBE SELECT * FROM {reader}", [path]).fetchall()]
+            select = ", ".join(f'"{c}" AS "{c.strip().lower().replace(" ", "_")}"' for c in columns)
+            self.db.execute(f'CREATE TABLE "{table}" AS SELECT {select} FROM {reader}', [path])
+        for table, rules in (cleaning or {}).items():
+            if table in self.files:
+                self._clean(table, rules)
+        for rollup in rollups:
+            try:
+                self.db.execute(f'CREATE VIEW "{rollup.name}" AS {normalize_sql(rollup.sql)}')
+            except Exception as e:
+                print(f"⚠️  rollup {rollup.name} unavailable offline: {str(e).splitlines()[0]}")
+
+    def _clean(self, table: str, rules) -> None:
+        types = {row[0]: row[1] for row in self.db.execute(f'DESCRIBE "{table}"').fetchall()}
+        clean = clean_frame(self.db.execute(f'SELECT * FROM "{table}"').df(), rules)
+        # DuckDB scans categoricals as ENUMs; the PostgreSQL tables hold plain text
+        for c in clean.columns:
+            if isinstance(clean[c].dtype, pd.CategoricalDtype):
+                clean[c] = clean[c].astype("object")
+        # Columns without a rule keep their original type (DATE comes back from pandas as TIMESTAMP)
+        select = ", ".join(f'"{c}"' if c in rules else f'CAST("{c}" AS {types[c]}) AS "{c}"' for c in clean.columns)
+        target = f"{table}{CLEAN_SUFFIX}"
+        self.db.register("_clean_frame", clean)
+        self.db.execute(f'CREATE TABLE "{target}" AS SELECT {select} FROM _clean_frame')
+        self.db.unregister("_clean_frame")
+        self.files[target] = self.files[table]
+
+    def cursor(self, name: Optional[str] = None, withhold: bool = False):
+        # Named (server-side) cursors don't exist in-process; a plain cursor streams just the same
+        return self.db.cursor()
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.db.close()
+
+    def table_versions(self, names: List[str]) -> Optional[Dict[str, str]]:
+        """``{table: size:mtime}`` for the data files a query reads (see ``QueryCache.versions``)."""
+        versions = {}
+        for name in names:
+            path = self.files.get(name.strip('"').lower())
+            if path:
+                st = os.stat(path)
+                versions[name] = f"{st.st_size}:{st.st_mtime_ns}"
+        return versions or None
+
+
+def offline_connection(project_dir: str = ".") -> OfflineConnection:
+    """DuckDB connection over ``<project_dir>/data`` (a notebook's working directory by default)."""
+    files = data_files(project_dir)
+    if not files:
+        raise FileNotFoundError(f"no CSV or Parquet files under {os.path.join(os.path.abspath(project_dir), 'data')}")
+    project = project_at(project_dir)
+    module = load_module(project) if project else None
+    return OfflineConnection(files, getattr(module, "ROLLUPS", ()), getattr(module, "CLEANING", None))
+
+
+def _normalized(df: pd.DataFrame) -> pd.DataFrame:
+    """Positional columns, numbers as float (NUMERIC arrives as Decimal from psycopg2), rows sorted."""
+    df = df.copy()
+    df.columns = range(df.shape[1])
+    for c in df.columns:
+        converted = pd.to_numeric(df[c], errors="coerce")
+        if converted.notna().sum() == df[c].notna().sum():
+            df[c] = converted.astype("float64")
+        else:
+            df[c] = df[c].astype(str)
+    # Row order is only defined up to ties (or not at all without ORDER BY)
+    return df.sort_values(list(df.columns), na_position="first").reset_index(drop=True)
+
+
+def compare_results(offline: pd.DataFrame, online: pd.DataFrame) -> str:
+    """``ok``, ``rounding`` (numbers within 0.01, e.g. ROUND on DOUBLE vs NUMERIC) or ``differs``."""
+    if offline.shape != online.shape:
+        return "differs"
+    a, b = _normalized(offline), _normalized(online)
+    for status, tolerance in (("ok", 1e-9), ("rounding", 0.0101)):
+        try:
+            pd.testing.assert_frame_equal(a, b, check_dtype=False, check_exact=False, rtol=0, atol=tolerance)
+        except AssertionError:
+            continue
+        return status
+    return "differs"
+
+
+def compatibility_report(project: Project, compare: bool = False) -> List[dict]:
+    """Run every notebook query offline; with ``compare``, also on the project's PostgreSQL database."""
+    from .notebooks import notebook_queries
+
+    queries = notebook_queries(project)
+    if not queries:
+        return []
+    conn = offline_connection(project.path)
+    server = None
+    if compare:
+        from .db import raw_connection
+        from .projects import load_module
+        server = raw_connection(load_module(project).CONFIG)
+
+    report = []
+    try:
+        for q in queries:
+            record = {"project": project.key, "cell": q.cell, "label": q.label, "status": "ok"}
+            try:
+                offline = pd.read_sql_query(q.sql, conn)
+            except Exception as e:
+                record.update(status="postgres-only", error=str(e).strip().splitlines()[0])
+                report.append(record)
+                continue
+            if server is not None:
+                try:
+                    online = pd.read_sql_query(q.sql, server)
+                    server.rollback()
+                    record["status"] = compare_results(offline, online)
+                except Exception as e:
+                    server.rollback()
+                    record.update(status="unchecked", error=str(e).strip().splitlines()[0])
+            report.append(record)
+    finally:
+        conn.close()
+        if server is not None:
+            server.close()
+    return report
+
+
+_MARKS = {"ok": "✅", "rounding": "≈ ", "differs": "⚠️ ", "unchecked": "❔", "postgres-only": "❌"}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Report which notebook queries run offline on DuckDB.")
+    parser.add_argument("projects", nargs="*", metavar="PROJECT", help=f"default: all ({', '.join(PROJECTS)})")
+    parser.add_argument("--compare", action="store_true",
+                        help="also run each query on the project's PostgreSQL database and diff the results")
+    args = parser.parse_args(argv)
+
+    unknown = [p for p in args.projects if p not in PROJECTS]
+    if unknown:
+        parser.error(f"unknown project(s): {', '.join(unknown)}")
+
+    # The notebooks hand pandas plain DB-API connections; same here, without the warning
+    warnings.filterwarnings("ignore", message="pandas only supports SQLAlchemy")
+
+    totals: Dict[str, int] = {}
+    for key in args.projects or list(PROJECTS):
+        try:
+            report = compatibility_report(PROJECTS[key], args.compare)
+        except FileNotFoundError as e:
+            print(f"== {key}: skipped ({e})")
+            continue
+        print(f"== {key}")
+        for r in report:
+            totals[r["status"]] = totals.get(r["status"], 0) + 1
+            line = f"   {_MARKS[r['status']]} cell {r['cell']:>3}: {r['label'][:60]}"
+            print(line + (f"\n         {r['error'][:120]}" if "error" in r else ""))
+
+    print("\n" + ", ".join(f"{n} {status}" for status, n in sorted(totals.items())))
+    return 1 if totals.get("postgres-only") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Mapping, NamedTuple, Optional
+
+
+class TaskResult(NamedTuple):
+    name: str
+    value: Any
+    seconds: float
+
+
+def default_workers(n_tasks: int) -> int:
+    """Worker count from ``LOAD_WORKERS``, else one per table up to the CPU count."""
+    configured = os.getenv("LOAD_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    return max(1, min(n_tasks, os.cpu_count() or 1))
+
+
+def _timed(name: str, fn: Callable[[], Any]) -> TaskResult:
+    start = time.perf_counter()
+    value = fn()
+    return TaskResult(name, value, time.perf_counter() - start)
+
+
+def run_parallel(tasks: Mapping[str, Callable[[], Any]],
+                 depends_on: Optional[Mapping[str, Iterable[str]]] = None,
+                 max_workers: Optional[int] = None) -> Dict[str, TaskResult]:
+    """Run one callable per table on a thread pool, honouring dependencies.
+
+    Each task should open (or check out from a pool) its own connection. A task
+    listed in ``depends_on`` is only started once all of its parents have
+    finished, e.g. ``{"loan": ["client", "contract"]}``; independent tasks run
+    side by side, so wall-clock time tracks the slowest dependency chain rather
+    than the sum of all tables. The first failure cancels anything not yet
+    started and is re-raised.
+    """
+    depends_on = {name: set(parents) for name, parents in (depends_on or {}).items()}
+    unknown = {p for parents in depends_on.values() for p in parents} - set(tasks)
+    if unknown:
+        raise ValueError(f"Unknown dependencies: {', '.join(sorted(unknown))}")
+
+    workers = max_workers or default_workers(len(tasks))
+    pending = dict(tasks)
+    results: Dict[str, TaskResult] = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            ready = [name for name in pending
+                     if depends_on.get(name, set()) <= results.keys()]
+            if not ready and not running:
+                raise ValueError(f"Dependency cycle between: {', '.join(sorted(pending))}")
+            for name in ready:
+                # Each task runs in a copy of the caller's context (keeps the metrics project tag)
+                context = contextvars.copy_context()
+                running[pool.submit(context.run, _timed, name, pending.pop(name))] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    raise
+                results[result.name] = result
+
+    return results
+
+
+def print_timings(results: Mapping[str, TaskResult], wall_seconds: float) -> None:
+    """Print per-table times next to the overall wall-clock time."""
+    for name, result in sorted(results.items(), key=lambda item: -item[1].seconds):
+        print(f"   {name:<20} {result.seconds:6.2f}s")
+    total = sum(r.seconds for r in results.values())
+    print(f"   wall clock {wall_seconds:.2f}s (sum of tables {total:.2f}s)")
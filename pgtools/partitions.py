@@ -0,0 +1,306 @@
+"""Range-partition the time-series tables by month or year as they are loaded.
+
+A loader declares which of its tables are partitioned, and by what::
+
+    PARTITIONS = {'sales': Partitioning('date', 'month')}
+
+With ``LOAD_PARTITIONS=1`` the table's shadow (:mod:`pgtools.swap`) is
+created ``PARTITION BY RANGE`` on that column before any rows are written,
+with one partition per month or year between the first and last date
+(``sales__p2021_06``, ``contract__p2022``) and a default partition for NULLs::
+
+    write_shadow(engine, df, 'sales', PARTITIONS)                  # a whole frame
+    partitions = shadow_partitions(PARTITIONS, 'sales')            # or chunk by chunk
+    stream_csv_to_sql(path, shadow_name('sales'), engine, chunksize, prepare=partitions)
+
+The partitions a frame or chunk needs are added just before it is written,
+so every row is routed straight to its partition. Queries that filter on
+the column (``WHERE date >= '2021-06-01'``) only scan the partitions they
+need. Without the variable the tables stay plain; the next load turns a
+partitioned table back into one.
+
+A partitioned table's primary key must include the partition column, so
+``apply_keys`` widens it, and a foreign key can no longer reference it
+(Loan Insights' ``loan.contract_id`` is then only indexed).
+
+Single partitions can be taken out or replaced without touching the rest::
+
+    detach_partition(engine, 'sales', '2021-06')           # kept as sales__p2021_06__detached
+    reload_partition(engine, 'sales', '2021-06', june_df)  # swapped in one transaction
+
+``python -m pgtools.partitions motorcycle [--detach sales 2021-06]`` lists a
+project's partitions with their row counts.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+from typing import List, Mapping, NamedTuple, Optional, Set, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+from .bulk import copy_dataframe
+from .keys import keys_lock, partition_key
+from .manifest import MANIFEST_TABLE
+from .metrics import stage
+from .swap import shadow_name
+
+PARTITIONS_ENV = "LOAD_PARTITIONS"
+PARTITION_INFIX = "__p"
+DEFAULT_PARTITION = "default"
+DETACHED_SUFFIX = "__detached"
+PERIODS = ("month", "year")
+
+_DATE_TYPES = ("date", "timestamp without time zone", "timestamp with time zone")
+
+
+class Partitioning(NamedTuple):
+    """Range partitions of a table on a date or timestamp ``column``, one per ``period``."""
+    column: str
+    period: str = "month"
+
+
+def partitioning_enabled() -> bool:
+    return os.getenv(PARTITIONS_ENV, "").strip().lower() not in ("", "0", "false", "no")
+
+
+def _label(start: date, period: str) -> str:
+    return f"{start.year}" if period == "year" else f"{start.year}_{start.month:02d}"
+
+
+def partition_name(table: str, start: date, period: str) -> str:
+    return f"{table}{PARTITION_INFIX}{_label(start, period)}"
+
+
+def _next(start: date, period: str) -> date:
+    if period == "year":
+        return date(start.year + 1, 1, 1)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def period_bounds(period_label: str) -> Tuple[date, date, str]:
+    """``(start, end, period)`` of ``'2021'`` or ``'2021-06'``."""
+    parts = [int(p) for p in period_label.replace("_", "-").split("-")]
+    if len(parts) == 1:
+        start, period = date(parts[0], 1, 1), "year"
+    elif len(parts) == 2:
+        start, period = date(parts[0], parts[1], 1), "month"
+    else:
+        raise ValueError(f"{period_label!r} is not a year (2021) or a month (2021-06)")
+    return start, _next(start, period), period
+
+
+def _ranges(first: date, last: date, period: str) -> List[Tuple[date, date]]:
+    start = date(first.year, 1 if period == "year" else first.month, 1)
+    ranges = []
+    while start <= last:
+        ranges.append((start, _next(start, period)))
+        start = ranges[-1][1]
+    return ranges
+
+
+class ShadowPartitions:
+    """Range partitions of ``table``'s shadow, added as the rows to be written are seen.
+
+    Called with a connection and each frame (or chunk) just before the frame
+    is written to the shadow: the first call turns the empty shadow into a
+    partitioned table with a default partition, and every call adds the
+    ranges between the first and last ``spec.column`` value seen so far. A
+    column that isn't a date or timestamp is reported and the shadow left
+    plain. Inactive (every call a no-op) when ``spec`` is None.
+    """
+
+    def __init__(self, table: str, spec: Optional[Partitioning]):
+        if spec is not None and spec.period not in PERIODS:
+            raise ValueError(f"partition period must be one of {PERIODS}, not {spec.period!r}")
+        self.table, self.spec = table, spec
+        self.active: Optional[bool] = None if spec is not None else False
+        self.first: Optional[date] = None
+        self.last: Optional[date] = None
+        self.created: Set[date] = set()
+
+    def __bool__(self) -> bool:
+        return self.active is not False
+
+    def __call__(self, conn, df: pd.DataFrame) -> None:
+        if self.active is None:
+            self.active = self._partition(conn)
+        if not self.active:
+            return
+        values = pd.to_datetime(df[self.spec.column]).dropna()
+        if values.empty:
+            return
+        first, last = values.min().date(), values.max().date()
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+        shadow = shadow_name(self.table)
+        for start, end in _ranges(self.first, self.last, self.spec.period):
+            if start not in self.created:
+                conn.execute(text(f'CREATE TABLE "{partition_name(shadow, start, self.spec.period)}" '
+                                  f"PARTITION OF \"{shadow}\" FOR VALUES FROM ('{start}') TO ('{end}')"))
+                self.created.add(start)
+
+    def _partition(self, conn) -> bool:
+        """Recreate the empty shadow ``PARTITION BY RANGE``, with only its default partition."""
+        shadow = shadow_name(self.table)
+        building = f"{shadow}__partitioned"
+        with stage("partition", self.table):
+            column_type = conn.execute(text("""
+                SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                WHERE attrelid = to_regclass(:t) AND attname = :c AND NOT attisdropped
+            """), {"t": f'"{shadow}"', "c": self.spec.column}).scalar()
+            if column_type not in _DATE_TYPES:
+                print(f"   ⚠️  {self.table} not partitioned: {self.spec.column} is "
+                      f"{column_type or 'missing'}, not a date")
+                return False
+            if conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{shadow}")')).scalar():
+                raise ValueError(f"{shadow} already has rows; partition it before writing them")
+            conn.execute(text(f'DROP TABLE IF EXISTS "{building}"'))
+            conn.execute(text(f'CREATE TABLE "{building}" (LIKE "{shadow}" INCLUDING DEFAULTS) '
+                              f'PARTITION BY RANGE ("{self.spec.column}")'))
+            conn.execute(text(f'DROP TABLE "{shadow}"'))
+            conn.execute(text(f'ALTER TABLE "{building}" RENAME TO "{shadow}"'))
+            conn.execute(text(f'CREATE TABLE "{shadow}{PARTITION_INFIX}{DEFAULT_PARTITION}" '
+                              f'PARTITION OF "{shadow}" DEFAULT'))
+        return True
+
+    def report(self) -> None:
+        if self.active:
+            print(f"   🗂️  {self.table}: {len(self.created)} {self.spec.period}ly partitions "
+                  f"on {self.spec.column} (+ default)")
+
+
+def shadow_partitions(specs: Mapping[str, Partitioning], table: str) -> ShadowPartitions:
+    """The :class:`ShadowPartitions` of ``table``; inactive unless it is in ``specs`` and ``LOAD_PARTITIONS`` is set."""
+    return ShadowPartitions(table, specs.get(table) if partitioning_enabled() else None)
+
+
+def write_shadow(engine, df: pd.DataFrame, table: str, specs: Optional[Mapping[str, Partitioning]] = None,
+                 dtype=None) -> None:
+    """``df.to_sql`` to ``table``'s shadow, created range partitioned first if ``specs`` declares it."""
+    partitions = shadow_partitions(specs or {}, table)
+    if not partitions:
+        df.to_sql(shadow_name(table), engine, if_exists="replace", index=False, dtype=dtype)
+        return
+    with engine.begin() as conn:
+        df.head(0).to_sql(shadow_name(table), conn, if_exists="replace", index=False, dtype=dtype)
+        partitions(conn, df)
+        df.to_sql(shadow_name(table), conn, if_exists="append", index=False, dtype=dtype)
+    partitions.report()
+
+
+def partition_shadows(engine, specs: Mapping[str, Partitioning], frames: Mapping[str, pd.DataFrame]) -> None:
+    """Partition the empty shadows of ``frames`` declared in ``specs`` for the rows about to be written.
+
+    For loaders that create their shadows themselves (and COPY into them);
+    does nothing unless ``LOAD_PARTITIONS`` is set.
+    """
+    for table, df in frames.items():
+        partitions = shadow_partitions(specs, table)
+        if partitions:
+            with engine.begin() as conn:
+                partitions(conn, df)
+            partitions.report()
+
+
+def list_partitions(engine, table: str) -> List[Tuple[str, str, int]]:
+    """``(partition, bounds, rows)`` for each partition of ``table``, in bound order."""
+    with engine.connect() as conn:
+        partitions = conn.execute(text("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:t)
+            ORDER BY pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT', c.relname
+        """), {"t": f'"{table}"'}).fetchall()
+        return [(name, bounds, conn.execute(text(f'SELECT count(*) FROM "{name}"')).scalar())
+                for name, bounds in partitions]
+
+
+def _touch_manifest(cur, table: str) -> None:
+    # Cached notebook results are keyed by loaded_at, and the table's rows just changed
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (MANIFEST_TABLE,))
+    if cur.fetchone()[0]:
+        cur.execute(f"UPDATE {MANIFEST_TABLE} SET loaded_at = now() WHERE table_name = %s", (table,))
+
+
+def detach_partition(engine, table: str, period_label: str) -> str:
+    """Take one period out of ``table``; it is kept as ``<partition>__detached``, whose name is returned."""
+    start, _, period = period_bounds(period_label)
+    name = partition_name(table, start, period)
+    detached = f"{name}{DETACHED_SUFFIX}"
+    with engine.begin() as conn:
+        keys_lock(conn)
+        conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+        conn.execute(text(f'DROP TABLE IF EXISTS "{detached}"'))
+        conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{detached}"'))
+        _touch_manifest(conn.connection.cursor(), table)
+    print(f"   🗂️  {table}: {name} detached as {detached}")
+    return detached
+
+
+def reload_partition(engine, table: str, period_label: str, df: pd.DataFrame) -> int:
+    """Replace one period of ``table`` with the rows of ``df``; returns the row count.
+
+    The rows are copied into a new table beside the partition, which then
+    takes its place in one transaction (a period with no partition yet is
+    added). ``df`` must have the table's columns and only rows of that period;
+    a row outside it fails the attach and leaves the old partition in place.
+    Rollups over the table are not refreshed.
+    """
+    start, end, period = period_bounds(period_label)
+    name = partition_name(table, start, period)
+    staging = shadow_name(name)
+    conn = engine.raw_connection()
+    try:
+        with stage("partition", name) as m, conn.cursor() as cur:
+            cur.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            cur.execute(f'CREATE TABLE "{staging}" (LIKE "{table}" INCLUDING DEFAULTS)')
+            m.rows = copy_dataframe(cur, df, staging).rows
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('pgtools.keys'))")
+            cur.execute("SELECT 1 FROM pg_inherits WHERE inhparent = to_regclass(%s) AND inhrelid = to_regclass(%s)",
+                        (f'"{table}"', f'"{name}"'))
+            if cur.fetchone():
+                cur.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                cur.execute(f'DROP TABLE "{name}"')
+            cur.execute(f'ALTER TABLE "{staging}" RENAME TO "{name}"')
+            # The partition gets the table's indexes as it is attached
+            cur.execute(f"ALTER TABLE \"{table}\" ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{start}') TO ('{end}')")
+            _touch_manifest(cur, table)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"   🗂️  {table}: {name} reloaded with {m.rows:,} rows")
+    return m.rows
+
+
+def main(argv=None) -> int:
+    from .db import ensure_database
+    from .projects import PROJECTS, load_module
+
+    parser = argparse.ArgumentParser(description="List or detach the partitions of a project's tables.")
+    parser.add_argument("project", choices=sorted(PROJECTS))
+    parser.add_argument("--detach", nargs=2, metavar=("TABLE", "PERIOD"), help="e.g. sales 2021-06")
+    args = parser.parse_args(argv)
+
+    module = load_module(PROJECTS[args.project])
+    engine = ensure_database(module.CONFIG)
+    if args.detach:
+        detach_partition(engine, *args.detach)
+    for table in getattr(module, "PARTITIONS", {}):
+        with engine.connect() as conn:
+            columns = partition_key(conn, table)
+        if not columns:
+            print(f"{table}: not partitioned (load with {PARTITIONS_ENV}=1)")
+            continue
+        print(f"{table}: partitioned by {', '.join(columns)}")
+        for name, bounds, rows in list_partitions(engine, table):
+            print(f"   {name:<32} {rows:>9,} rows  {bounds}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import importlib.util
+import os
+from types import ModuleType
+from typing import Callable, Dict, Mapping, NamedTuple, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Project(NamedTuple):
+    key: str
+    folder: str
+    script: str
+    entry: str  # name of the loader function inside ``script``
+    tables: Mapping[str, str] = {}  # CSV file -> table, where the table isn't named after the file
+
+    @property
+    def path(self) -> str:
+        return os.path.join(REPO_ROOT, self.folder)
+
+    def table_for(self, csv_name: str) -> str:
+        """Table the loader writes ``data/<csv_name>`` to."""
+        return self.tables.get(csv_name, table_name(csv_name))
+
+
+def table_name(csv_name: str) -> str:
+    """Default table for a data file: its stem, snake_cased like the loaders' columns."""
+    return os.path.splitext(csv_name)[0].strip().lower().replace(" ", "_")
+
+
+PROJECTS: Dict[str, Project] = {p.key: p for p in [
+    Project("motorcycle", "Project Analyzing Motorcycle Part Sales", "load_data.py", "main"),
+    Project("mental_health", "Project Analyzing Students' Mental Health", "load_data.py", "load_csv_to_db"),
+    Project("unicorns", "Project Analyzing Unicorn Companies", "load_data.py", "load_csv_to_db"),
+    Project("superstore", "Project Analyzing and Formatting PostgreSQL Sales Data", "load_data.py", "main"),
+    Project("grocery", "Project Data Analyst Associate Practical Exam Grocery Store Sales", "load_data.py", "load_grocery_sales_data"),
+    Project("loans", "Project Data Engineer Associate Practical Exam Loan Insights", "load_data.py", "load_lending_data"),
+    Project("manufacturing", "Project Evaluate a Manufacturing Process", "load_data.py", "load_csv_to_db"),
+    Project("london", "Project Exploring London's Travel Network", "load_data.py", "main",
+            {"TFL.JOURNEYS.csv": "journeys"}),
+    Project("student_performance", "Project Factors that Fuel Student Performance", "load_data.py", "load_student_performance_data",
+            {"StudentPerformanceFactors.csv": "student_performance"}),
+    Project("ngo", "Project Impact Analysis of GoodThought NGO Initiatives", "load_data.py", "main"),
+    Project("hotel", "Project SQL Associate Practical Exam Hotel Operations", "load_data.py", "main"),
+    Project("oldest_businesses", "Project Uncovering the World's Oldest Businesses", "load_csvs_to_postgres.py", "main"),
+]}
+
+
+def project_at(path: str) -> Optional[Project]:
+    """The project whose folder is ``path``, if any."""
+    path = os.path.realpath(path)
+    return next((p for p in PROJECTS.values() if os.path.realpath(p.path) == path), None)
+
+
+_modules: Dict[str, ModuleType] = {}
+
+
+def load_module(project: Project) -> ModuleType:
+    """Import a project's loader script by path (folder names are not valid package names)."""
+    if project.key not in _modules:
+        spec = importlib.util.spec_from_file_location(
+            f"loader_{project.key}", os.path.join(project.path, project.script))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[project.key] = module
+    return _modules[project.key]
+
+
+def loader(project: Project) -> Callable[..., object]:
+    return getattr(load_module(project), project.entry)
@@ -0,0 +1,371 @@
+import hashlib
+import io
+import json
+import os
+import re
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import pandas as pd
+
+from .dtypes import compact_frame
+from .manifest import MANIFEST_TABLE
+
+DEFAULT_CACHE_DIR = ".query_cache"
+DEFAULT_FETCH_SIZE = 10_000
+
+T = TypeVar("T")
+
+# Relation names following FROM / JOIN, and names defined by WITH ... AS (
+_RELATION = re.compile(r'\b(?:from|join)\s+((?:"[^"]+"|\w+)(?:\.(?:"[^"]+"|\w+))?)', re.IGNORECASE)
+_CTE = re.compile(r'\b(\w+)\s+as\s*(?:not\s+)?(?:materialized\s+)?\(', re.IGNORECASE)
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_READ = re.compile(r"(select|with)\b", re.IGNORECASE)
+
+
+def cache_max_bytes() -> int:
+    """Size budget for the cache directory, from ``QUERY_CACHE_MB`` (default 256 MB)."""
+    return int(float(os.getenv("QUERY_CACHE_MB", "256")) * 1024 * 1024)
+
+
+def compact_results() -> bool:
+    """Whether ``run_query`` returns categoricals for repeated labels, from ``QUERY_COMPACT``."""
+    return os.getenv("QUERY_COMPACT", "").strip().lower() not in ("", "0", "false", "no")
+
+
+def copy_results() -> bool:
+    """Whether ``run_query`` fetches results with ``COPY ... TO STDOUT``, from ``QUERY_COPY``."""
+    return os.getenv("QUERY_COPY", "").strip().lower() not in ("", "0", "false", "no")
+
+
+def fetch_size() -> int:
+    """Rows per round trip for the server-side cursors, from ``QUERY_FETCH_SIZE``."""
+    return int(os.getenv("QUERY_FETCH_SIZE", DEFAULT_FETCH_SIZE))
+
+
+def iter_query(conn, sql: str, params=None, size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Yield a query's result as DataFrames of at most ``size`` rows.
+
+    Uses a named (server-side) psycopg2 cursor, so PostgreSQL keeps the result
+    and only one chunk at a time is held client-side. Each chunk infers its
+    dtypes independently, like ``pd.read_sql(chunksize=...)``. Stopping the
+    iteration early closes the cursor.
+    """
+    size = size or fetch_size()
+    # A named cursor lives in the current transaction; WITH HOLD keeps it open under autocommit
+    cur = conn.cursor(name=f"iter_query_{uuid.uuid4().hex[:12]}", withhold=conn.autocommit)
+    cur.itersize = size
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(size)
+            if not rows:
+                break
+            columns = [col[0] for col in cur.description]
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    finally:
+        cur.close()
+
+
+def fold_query(conn, sql: str, func: Callable[[T, pd.DataFrame], T], initial: T,
+               params=None, size: Optional[int] = None) -> T:
+    """Reduce a query's result chunk by chunk: ``acc = func(acc, chunk)`` for each chunk.
+
+    Memory is bounded by ``size`` rows plus whatever ``func`` keeps in ``acc``::
+
+        counts = fold_query(conn, "SELECT branch_id, rating FROM request",
+                            lambda acc, df: acc.add(df.groupby("branch_id").size(), fill_value=0),
+                            pd.Series(dtype="int64"))
+    """
+    acc = initial
+    for chunk in iter_query(conn, sql, params, size):
+        acc = func(acc, chunk)
+    return acc
+
+
+# Result types copy_query can parse, by type OID; anything else is fetched with pd.read_sql
+_COPY_TYPES = {
+    16: "bool", 20: "int", 21: "int", 23: "int", 26: "int",
+    700: "float", 701: "float", 1700: "float",
+    19: "text", 25: "text", 1042: "text", 1043: "text",
+    1082: "date", 1114: "timestamp", 1184: "timestamptz",
+}
+_COPY_NULL = r"\N"
+
+
+def _arrow_types(kinds: List[str]) -> list:
+    import pyarrow as pa
+
+    types = {"bool": pa.bool_(), "int": pa.int64(), "float": pa.float64(), "text": pa.string(),
+             "date": pa.date32(), "timestamp": pa.timestamp("us"), "timestamptz": pa.timestamp("us", tz="UTC")}
+    return [types[kind] for kind in kinds]
+
+
+def copy_query(conn, sql: str) -> pd.DataFrame:
+    """``pd.read_sql(sql, conn)`` through ``COPY (sql) TO STDOUT`` on a psycopg2 connection.
+
+    The server streams the result as CSV into one buffer, which
+    ``pyarrow.csv`` parses straight into typed columns, instead of psycopg2
+    building a Python object per value and pandas inferring types from them.
+    Column types come from the query's result description, and the DataFrame
+    has the dtypes and values ``read_sql`` gives: integers as ``int64``
+    (``float64`` with NULLs), numerics as ``float64``, dates as
+    ``datetime.date`` objects, all-NULL columns as ``None`` objects. It falls
+    back to ``read_sql`` without ``pyarrow``, for results with other types
+    (arrays, JSON, intervals, ...) and for dates Arrow can't parse
+    (``infinity``, BC).
+    """
+    if not _has_pyarrow():
+        return pd.read_sql(sql, conn)
+    import pyarrow as pa
+    from pyarrow import csv
+
+    body = sql.strip().rstrip(";")
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT * FROM (\n{body}\n) AS q LIMIT 0")
+        columns = [col.name for col in cur.description]
+        kinds = [_COPY_TYPES.get(col.type_code) for col in cur.description]
+        if None in kinds:
+            return pd.read_sql(sql, conn)
+        buf = io.BytesIO()
+        cur.copy_expert(f"COPY (\n{body}\n) TO STDOUT WITH (FORMAT csv, NULL '{_COPY_NULL}', ENCODING 'UTF8')", buf)
+    finally:
+        cur.close()
+    if not buf.tell():
+        return pd.DataFrame(columns=columns)
+
+    names = [f"c{i}" for i in range(len(columns))]  # result columns may share a name
+    try:
+        table = csv.read_csv(
+            pa.py_buffer(buf.getbuffer()),
+            read_options=csv.ReadOptions(column_names=names),
+            convert_options=csv.ConvertOptions(
+                column_types=dict(zip(names, _arrow_types(kinds))),
+                null_values=[_COPY_NULL], true_values=["t"], false_values=["f"],
+                # COPY quotes a text value that happens to read \N
+                strings_can_be_null=True, quoted_strings_can_be_null=False,
+            ),
+        )
+    except pa.ArrowInvalid:
+        return pd.read_sql(sql, conn)
+    df = table.to_pandas()
+    for name in names:
+        if table.column(name).null_count == len(df):
+            df[name] = pd.Series([None] * len(df), dtype=object)
+    df.columns = columns
+    return df
+
+
+def normalize_sql(sql: str) -> str:
+    """Drop comments, collapse whitespace and a trailing semicolon, so cosmetic edits still hit."""
+    return " ".join(_COMMENT.sub(" ", sql).split()).rstrip(";").strip()
+
+
+def is_read(sql: str) -> bool:
+    """Whether ``sql`` is a query (``SELECT`` or ``WITH``) rather than a command."""
+    return _READ.match(normalize_sql(sql)) is not None
+
+
+def referenced_relations(sql: str) -> List[str]:
+    """Names the query reads FROM or JOINs, minus its own CTE names.
+
+    This over-approximates (``EXTRACT(YEAR FROM date)`` yields ``date``); names
+    that aren't relations are dropped when the versions are looked up.
+    """
+    ctes = {name.lower() for name in _CTE.findall(sql)}
+    names = []
+    for name in _RELATION.findall(sql):
+        name = name if '"' in name else name.lower()
+        if name not in ctes and name not in names:
+            names.append(name)
+    return names
+
+
+def _opened_transaction(conn) -> bool:
+    """Whether ``conn`` is idle outside a transaction, so the next statement opens one of ours."""
+    info = getattr(conn, "info", None)  # psycopg2; DuckDB (pgtools.offline) has none
+    return info is not None and not conn.autocommit and info.transaction_status == 0  # TRANSACTION_STATUS_IDLE
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class QueryCache:
+    """Drop-in ``run_query(sql)`` that keeps results on disk between kernel restarts.
+
+    An entry is keyed by the normalized SQL plus the ``load_manifest.loaded_at``
+    of every table the query reads, so reloading a table with any of the
+    loaders invalidates the queries that read it. Rollups and ``_clean``
+    tables are in the manifest too, with the time they were last rebuilt.
+    Queries touching a relation with no manifest entry (``information_schema``,
+    tables and views created by hand) are always sent to the server. Results are stored as Parquet when ``pyarrow``
+    is installed and as pickles otherwise; the least recently used files are
+    evicted once the directory grows past ``max_bytes``.
+
+    With ``QUERY_PROFILE`` set (or a ``profiler``), every query sent to the
+    server is profiled first, see :mod:`pgtools.explain`. With
+    ``QUERY_COMPACT=1`` (or ``compact=True``) low-cardinality text columns of
+    every result come back as categoricals, see :mod:`pgtools.dtypes`; numbers
+    keep their types, since notebooks compute with them. With ``QUERY_COPY=1``
+    (or ``copy=True``) results are fetched with :func:`copy_query`, which
+    gives the same DataFrames faster for large results.
+
+    A connection without ``autocommit`` is left as it was found: the
+    transaction a query opens is rolled back once the result is read, so the
+    session doesn't sit idle in a transaction whose locks would block a
+    reload's swap (see :mod:`pgtools.swap`). A transaction the caller opened
+    is left alone.
+    """
+
+    def __init__(self, conn, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: Optional[int] = None,
+                 profiler=None, compact: Optional[bool] = None, copy: Optional[bool] = None):
+        self.conn = conn
+        self.compact = compact_results() if compact is None else compact
+        # DuckDB (pgtools.offline) has no COPY TO STDOUT
+        self.copy = (copy_results() if copy is None else copy) and not hasattr(conn, "table_versions")
+        if profiler is None and not hasattr(conn, "table_versions"):  # nothing to EXPLAIN offline
+            from .explain import QueryProfiler, profiling_mode
+            mode = profiling_mode()
+            profiler = QueryProfiler(conn, update_baseline=mode == "update") if mode else None
+        self.profiler = profiler
+        self.cache_dir = cache_dir
+        self.max_bytes = cache_max_bytes() if max_bytes is None else max_bytes
+        self.parquet = _has_pyarrow()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __call__(self, sql: str, cache: bool = True) -> pd.DataFrame:
+        opened = _opened_transaction(self.conn)
+        try:
+            df = self._fetch(sql, cache)
+        finally:
+            if opened:
+                self.conn.rollback()
+        return compact_frame(df, numbers=False) if self.compact else df
+
+    def _fetch(self, sql: str, cache: bool) -> pd.DataFrame:
+        normalized = normalize_sql(sql)
+        versions = self.versions(normalized) if cache else None
+        if versions is None:
+            return self._run(sql)
+
+        key = self._key(normalized)
+        path = os.path.join(self.cache_dir, f"{key}-{self._key(json.dumps(versions, sort_keys=True))}")
+        for ext in (".parquet", ".pkl"):
+            if os.path.exists(path + ext):
+                self.hits += 1
+                os.utime(path + ext)  # mark as recently used
+                return self._read(path + ext)
+
+        self.misses += 1
+        df = self._run(sql)
+        self._write(df, path)
+        self._drop_stale(key, path)
+        self.evict()
+        return df
+
+    def _run(self, sql: str) -> pd.DataFrame:
+        if self.profiler is not None:
+            self.profiler(sql)
+        if self.copy:
+            return copy_query(self.conn, sql)
+        return pd.read_sql(sql, self.conn)
+
+    def chunks(self, sql: str, size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Stream a large result through a server-side cursor instead of caching it."""
+        return iter_query(self.conn, sql, size=size)
+
+    def fold(self, sql: str, func: Callable[[Any, pd.DataFrame], Any], initial: Any,
+             size: Optional[int] = None) -> Any:
+        return fold_query(self.conn, sql, func, initial, size=size)
+
+    def versions(self, normalized_sql: str) -> Optional[Dict[str, str]]:
+        """``{relation: loaded_at}`` for the tables a query reads, or None if it can't be cached."""
+        if not is_read(normalized_sql):
+            return None
+        names = referenced_relations(normalized_sql)
+        if not names:
+            return None
+        if hasattr(self.conn, "table_versions"):  # pgtools.offline: no server, no manifest
+            return self.conn.table_versions(names)
+        cur = self.conn.cursor()
+        try:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (MANIFEST_TABLE,))
+            if not cur.fetchone()[0]:
+                return None
+            cur.execute(
+                f"""
+                SELECT r.oid::regclass::text, m.loaded_at::text
+                FROM unnest(%s::text[]) AS c(name)
+                JOIN pg_class r ON r.oid = to_regclass(c.name)
+                LEFT JOIN {MANIFEST_TABLE} m ON to_regclass(quote_ident(m.table_name)) = r.oid
+                """,
+                (names,),
+            )
+            rows = cur.fetchall()
+        except Exception:
+            self.conn.rollback()
+            return None
+        finally:
+            cur.close()
+        if not rows or any(loaded_at is None for _, loaded_at in rows):
+            return None
+        return dict(rows)
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith((".parquet", ".pkl")):
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".parquet", ".pkl")):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+    @staticmethod
+    def _read(path: str) -> pd.DataFrame:
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+    def _write(self, df: pd.DataFrame, path: str) -> None:
+        # Write under a temporary name so a crash never leaves a truncated entry behind
+        if self.parquet:
+            try:
+                df.to_parquet(path + ".parquet.tmp", index=False)
+                os.replace(path + ".parquet.tmp", path + ".parquet")
+                return
+            except Exception:
+                # Column types Arrow can't round-trip (e.g. mixed objects) fall back to pickle
+                if os.path.exists(path + ".parquet.tmp"):
+                    os.remove(path + ".parquet.tmp")
+        df.to_pickle(path + ".pkl.tmp")
+        os.replace(path + ".pkl.tmp", path + ".pkl")
+
+    def _drop_stale(self, key: str, current: str) -> None:
+        """Remove entries for the same SQL cached against older table versions."""
+        keep = os.path.basename(current)
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(key + "-") and not name.startswith(keep):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,211 @@
+"""Load one large CSV over several connections at once.
+
+The file is cut into byte ranges at line boundaries. Each range is parsed
+with pandas on its own thread and COPYed straight into the table on its own
+connection; PostgreSQL accepts concurrent COPY into one table and parses the
+streams in parallel backends, so nothing is copied a second time. The table
+is a loader's shadow (:mod:`pgtools.swap`), so readers never see it filling
+up. Rows from different ranges interleave in the table's pages, so its
+physical order is not the file's (queries that need an order say so).
+
+    rows = copy_csv_ranges(engine, 'data/request.csv', 'request__shadow', transform=norm_cols, parts=4)
+
+``load_csv_table`` does this by itself for CSVs of at least ``LOAD_COPY_MIN_MB``
+(default 64) MiB, using ``LOAD_COPY_PARTS`` ranges (default: one per CPU, at
+most ``MAX_PARTS``).
+"""
+import io
+import os
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+from .bulk import copy_dataframe
+from .metrics import stage
+from .parallel import run_parallel
+from .streaming import Transform, _kind, pinned_dtypes, update_kinds
+
+PARTS_ENV = "LOAD_COPY_PARTS"
+MIN_MB_ENV = "LOAD_COPY_MIN_MB"
+DEFAULT_MIN_MB = 64
+# Each part holds a pooled connection while it copies (the pool allows 15)
+MAX_PARTS = 8
+
+
+def copy_parts(csv_path: str) -> int:
+    """How many ranges to load ``csv_path`` in; 1 means load it whole."""
+    configured = os.getenv(PARTS_ENV)
+    parts = int(configured) if configured else (os.cpu_count() or 1)
+    if parts <= 1:
+        return 1
+    min_bytes = float(os.getenv(MIN_MB_ENV, DEFAULT_MIN_MB)) * 1024 * 1024
+    if os.path.getsize(csv_path) < min_bytes:
+        return 1
+    return min(parts, MAX_PARTS)
+
+
+def csv_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """``[start, end)`` byte ranges of the rows after the header, each starting on a new line."""
+    with open(path, "rb") as f:
+        f.readline()
+        body = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        bounds = [body]
+        for i in range(1, parts):
+            # Back up one byte so a target that is already a line start stays one
+            f.seek(max(body + (size - body) * i // parts - 1, bounds[-1]))
+            f.readline()
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+    return [(start, end) for start, end in zip(bounds, bounds[1:] + [size]) if end > start]
+
+
+class _Range:
+    """One parsed byte range, and the number of quote characters in it."""
+
+    def __init__(self, path: str, start: int, end: int, columns: List[str], dtype=None):
+        with stage("read", f"{os.path.basename(path)}@{start}") as m:
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+            self.quotes = data.count(b'"')
+            self.error: Optional[Exception] = None
+            self.frame: Optional[pd.DataFrame] = None
+            try:
+                self.frame = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=dtype)
+                m.rows = len(self.frame)
+            except (ValueError, pd.errors.ParserError) as e:
+                self.error = e
+            m.bytes_read = end - start
+
+
+def _aligned(path: str, ranges: List[Tuple[int, int]], parsed: List[_Range]) -> None:
+    """Fail if a range starts inside a quoted field (a value with a line break in it)."""
+    with open(path, "rb") as f:
+        quotes = f.read(ranges[0][0]).count(b'"')
+    for (start, _), part in zip(ranges, parsed):
+        if quotes % 2:
+            raise ValueError(f"{os.path.basename(path)}: a quoted value spans the line break at byte {start:,}")
+        quotes += part.quotes
+    for part in parsed:
+        if part.error is not None:
+            raise part.error
+
+
+def copy_csv_ranges(engine, csv_path: str, table: str, transform: Optional[Transform] = None,
+                    parts: Optional[int] = None, validate: Optional[Transform] = None) -> int:
+    """Replace ``table`` with ``csv_path``, parsed and copied in ``parts`` ranges at once.
+
+    The result matches ``pd.read_csv(csv_path)`` plus ``transform`` written with
+    ``to_sql``, in another row order: the ranges' dtypes are reconciled as a
+    whole-file read would (a range whose integers have a gap elsewhere is
+    read as float, one that disagrees harder is parsed again with the
+    resolved dtypes), and the table gets ``to_sql``'s column types.
+    ``transform`` runs on the first range before the others, so stateful
+    transforms such as ``DateCoercer`` settle on one date format for the
+    whole file.
+
+    ``validate`` (e.g. :class:`pgtools.validation.ChunkValidator`) gets every
+    transformed range in file order, before any is copied, and returns the
+    rows to copy.
+
+    Raises ``ValueError`` when the file can't be split, e.g. a quoted value
+    contains a line break; the caller can then load it whole.
+    """
+    parts = parts or copy_parts(csv_path)
+    ranges = csv_ranges(csv_path, parts)
+    if not ranges:
+        raise ValueError(f"{os.path.basename(csv_path)} has no rows to split")
+    columns = pd.read_csv(csv_path, nrows=0).columns.tolist()
+
+    parsed = run_parallel({i: (lambda r=r: _Range(csv_path, *r, columns)) for i, r in enumerate(ranges)},
+                          max_workers=len(ranges))
+    parsed = [parsed[i].value for i in range(len(ranges))]
+    _aligned(csv_path, ranges, parsed)
+    frames = _reconcile(csv_path, ranges, parsed, columns)
+    del parsed
+    # Rows numbered as in the whole file, as a validator's rejects report them
+    offset = 0
+    for df in frames:
+        df.index = pd.RangeIndex(offset, offset + len(df))
+        offset += len(df)
+
+    frames[0] = transform(frames[0]) if transform else frames[0]
+    if validate is not None:
+        # One range after the other, so Unique keeps a value's first row as on the whole file
+        if transform and len(frames) > 1:
+            done = run_parallel({i: (lambda i=i: transform(frames[i])) for i in range(1, len(frames))},
+                                max_workers=len(frames))
+            frames[1:] = [done[i].value for i in range(1, len(frames))]
+        frames = [validate(df) for df in frames]
+        transform = None
+    # to_sql's column types
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{table}"'))
+        conn.execute(text(pd.io.sql.get_schema(frames[0].head(0), table, con=engine)))
+    return _copy_parts(engine, frames, table, transform)
+
+
+def copy_frame_ranges(engine, df: pd.DataFrame, table: str, parts: int) -> int:
+    """COPY ``df`` into the existing (empty) ``table`` as ``parts`` row slices at once.
+
+    For loaders that already hold a typed frame and created the table
+    themselves.
+    """
+    bounds = [len(df) * i // parts for i in range(parts + 1)]
+    frames = [df.iloc[start:end] for start, end in zip(bounds, bounds[1:]) if end > start]
+    return _copy_parts(engine, frames, table)
+
+
+def _copy_parts(engine, frames: List[pd.DataFrame], table: str, transform: Optional[Transform] = None) -> int:
+    """COPY every frame into ``table``, each on its own connection; ``frames[0]`` is already transformed.
+
+    A part that fails leaves the others' rows in the table; the caller
+    discards it, as it would any shadow of a failed load.
+    """
+
+    def copy_part(i: int) -> int:
+        df = frames[i] if i == 0 or not transform else transform(frames[i])
+        frames[i] = None  # the rows are in PostgreSQL once copied; free them as the parts finish
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                rows = copy_dataframe(cur, df, table).rows
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    copied = run_parallel({i: (lambda i=i: copy_part(i)) for i in range(len(frames))}, max_workers=len(frames))
+    return sum(r.value for r in copied.values())
+
+
+def _reconcile(csv_path: str, ranges: List[Tuple[int, int]], parsed: List[_Range],
+               columns: List[str]) -> List[pd.DataFrame]:
+    """Give every range the dtypes a whole-file ``read_csv`` would have picked."""
+    kinds: Dict[str, str] = {}
+    text_dtypes: Dict[str, object] = {}
+    for part in parsed:
+        update_kinds(kinds, text_dtypes, part.frame)
+    dtypes = pinned_dtypes(kinds, text_dtypes)
+
+    frames = []
+    for (start, end), part in zip(ranges, parsed):
+        df = part.frame
+        widen = [c for c in columns if _kind(df[c]) != kinds[c] and dtypes[c] == "float64"
+                 and _kind(df[c]) in ("int", "empty")]
+        other = [c for c in columns if _kind(df[c]) != kinds[c] and c not in widen]
+        if other:
+            # The original text is gone once a value is parsed as a number; read the range again
+            again = _Range(csv_path, start, end, columns, dtype=dtypes)
+            if again.error is not None:
+                raise again.error
+            df = again.frame
+        elif widen:
+            df = df.astype({c: "float64" for c in widen})
+        frames.append(df)
+    return frames
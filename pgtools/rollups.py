@@ -0,0 +1,125 @@
+import hashlib
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import text
+
+from .keys import Columns, _ident_list, _run, as_columns
+from .manifest import record_derived
+from .metrics import stage
+from .query import normalize_sql, referenced_relations
+from .swap import ROLLUP_COMMENT_PREFIX as _COMMENT_PREFIX
+from .swap import drop_retired, reads_retired, shadow_name, swap_in
+
+
+class Rollup(NamedTuple):
+    """A notebook aggregate kept as a materialized view and refreshed by the loader.
+
+    ``unique`` names the columns that identify a row of the result; with a
+    unique index on them PostgreSQL can ``REFRESH ... CONCURRENTLY``, so
+    readers are never blocked while a refresh runs.
+    """
+    name: str
+    sql: str
+    unique: Columns = ()
+
+    def tables(self) -> List[str]:
+        return referenced_relations(self.sql)
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(normalize_sql(self.sql).encode()).hexdigest()[:16]
+
+
+def _state(engine, rollup: Rollup) -> Optional[str]:
+    """The definition digest the view was built from, '' for a foreign view, None if missing."""
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT coalesce(obj_description(c.oid, 'pg_class'), '')
+            FROM pg_class c WHERE c.oid = to_regclass(:v) AND c.relkind = 'm'
+        """), {"v": f'"{rollup.name}"'}).fetchone()
+    if row is None:
+        return None
+    comment = row[0]
+    return comment[len(_COMMENT_PREFIX):] if comment.startswith(_COMMENT_PREFIX) else ""
+
+
+def _create(engine, rollup: Rollup) -> None:
+    # Built beside the current view and swapped in, so readers never find it missing
+    shadow = shadow_name(rollup.name)
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP MATERIALIZED VIEW IF EXISTS "{shadow}"'))
+        conn.execute(text(f'CREATE MATERIALIZED VIEW "{shadow}" AS {normalize_sql(rollup.sql)}'))
+        conn.execute(text(f"""COMMENT ON MATERIALIZED VIEW "{shadow}" IS '{_COMMENT_PREFIX}{rollup.digest}'"""))
+    if rollup.unique:
+        columns = as_columns(rollup.unique)
+        _run(engine, f'CREATE UNIQUE INDEX "{shadow}_key" ON "{shadow}" ({_ident_list(columns)})',
+             f"{rollup.name} will be refreshed without CONCURRENTLY, ({', '.join(columns)}) is not unique")
+    swap_in(engine, rollup.name, copy_indexes=False)
+
+
+def _concurrent(engine, rollup: Rollup) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indrelid
+            WHERE i.indrelid = to_regclass(:v) AND i.indisunique AND i.indpred IS NULL AND c.relispopulated
+        """), {"v": f'"{rollup.name}"'}).scalar() is not None
+
+
+@stage("rollups")
+def refresh_rollups(engine, rollups: Sequence[Rollup], changed: Optional[Iterable[str]] = None) -> None:
+    """Create missing or redefined rollups and bring the others up to date with their tables.
+
+    Meant as the last stage of a load. A rollup over a table the load swapped
+    in still reads the retired one (see :mod:`pgtools.swap`), so it is built
+    again under a shadow name and swapped in, like a table; readers keep the
+    old rows until then. ``changed`` lists the tables that were just
+    reloaded (default: all); rollups over those that changed in place
+    (partitions attached or detached) are refreshed, concurrently when the
+    view has its ``unique`` index. Views over unchanged tables are left
+    alone. Views are processed in order, so a rollup may read an earlier one.
+    The retired tables are dropped at the end.
+    """
+    changed = None if changed is None else {t.lower() for t in changed}
+    refreshed = set()
+    for rollup in rollups:
+        state = _state(engine, rollup)
+        if state == "":
+            print(f"   ⚠️  {rollup.name} exists and wasn't created by a loader, left alone")
+            continue
+        if state != rollup.digest:
+            if not _build(engine, rollup, "created" if state is None else "redefined"):
+                continue
+        elif reads_retired(engine, rollup.name):
+            if not _build(engine, rollup, "rebuilt"):
+                continue
+        elif changed is None or (changed | refreshed) & set(rollup.tables()):
+            concurrently = _concurrent(engine, rollup)
+            if not _run(engine, f'REFRESH MATERIALIZED VIEW {"CONCURRENTLY " if concurrently else ""}"{rollup.name}"',
+                        f"{rollup.name} not refreshed"):
+                continue
+            _report(engine, rollup, "refreshed concurrently" if concurrently else "refreshed")
+        else:
+            # Up to date; only built before rollups were in the manifest
+            record_derived(engine, rollup.name, rollup.tables(), None, if_missing=True)
+            continue
+        refreshed.add(rollup.name.lower())
+    drop_retired(engine)
+
+
+def _build(engine, rollup: Rollup, verb: str) -> bool:
+    try:
+        _create(engine, rollup)
+    except Exception as e:
+        print(f"   ⚠️  {rollup.name} not created: {str(getattr(e, 'orig', e)).splitlines()[0]}")
+        return False
+    _report(engine, rollup, verb)
+    return True
+
+
+def _report(engine, rollup: Rollup, verb: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f'ANALYZE "{rollup.name}"'))
+        rows = conn.execute(text(f'SELECT count(*) FROM "{rollup.name}"')).scalar()
+    # Queries on the view are cached against this version (see QueryCache)
+    record_derived(engine, rollup.name, rollup.tables(), rows)
+    print(f"   🧮 {rollup.name}: {verb} ({rows:,} rows)")
@@ -0,0 +1,278 @@
+import os
+import re
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import types as sa_types
+
+from .metrics import stage
+from .streaming import guess_datetime_format
+
+# A column becomes numeric/date when at least this share of its non-null values
+# parse; the rest are set to NULL and written to the rejects report.
+MIN_PARSE_RATIO = 0.95
+MAX_SCALE = 6
+
+_DATE_LIKE = re.compile(r"^\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?\s*$")
+_LEADING_ZERO = re.compile(r"^\s*-?0\d")
+_BOOL_TOKENS = {"true": True, "false": False}
+
+
+class SqlType(NamedTuple):
+    """A column type; ``fits`` is the tightest type the profiled values fit, reported as a hint only."""
+    name: str
+    precision: Optional[int] = None
+    scale: Optional[int] = None
+    fits: Optional["SqlType"] = None
+
+    def __str__(self) -> str:
+        if self.name == "NUMERIC" and self.precision is not None:
+            return f"NUMERIC({self.precision},{self.scale})"
+        return self.name
+
+    @property
+    def sqlalchemy(self):
+        return {
+            "SMALLINT": sa_types.SmallInteger,
+            "INTEGER": sa_types.Integer,
+            "BIGINT": sa_types.BigInteger,
+            "DOUBLE PRECISION": sa_types.Float,
+            "DATE": sa_types.Date,
+            "TIMESTAMP": sa_types.DateTime,
+            "BOOLEAN": sa_types.Boolean,
+            "TEXT": sa_types.Text,
+        }.get(self.name) or sa_types.Numeric(self.precision, self.scale)
+
+
+TEXT = SqlType("TEXT")
+Schema = Dict[str, SqlType]
+
+
+def _int_type(lo: float, hi: float) -> SqlType:
+    # INTEGER at least: ids and counts outgrow SMALLINT as data is added
+    tight = SqlType("SMALLINT") if -2 ** 15 <= lo and hi < 2 ** 15 else None
+    if -2 ** 31 <= lo and hi < 2 ** 31:
+        return SqlType("INTEGER", fits=tight)
+    return SqlType("BIGINT")
+
+
+def _scale(values: np.ndarray) -> int:
+    """Smallest number of decimals that represents every value (MAX_SCALE + 1 if none)."""
+    for s in range(MAX_SCALE + 1):
+        if np.allclose(np.round(values, s), values, rtol=0, atol=1e-9):
+            return s
+    return MAX_SCALE + 1
+
+
+def _is_text(s: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)
+
+
+class ColumnProfile:
+    """What one column's values would parse as, accumulated chunk by chunk."""
+
+    def __init__(self):
+        self.nonnull = 0
+        self.numeric = 0
+        self.dates = 0
+        self.bools = 0
+        self.integral = True
+        self.lo = np.inf
+        self.hi = -np.inf
+        self.scale = 0
+        self.leading_zero = False
+        self.has_time = False
+        self.date_format: Optional[str] = None
+
+    def update(self, s: pd.Series) -> None:
+        s = s.dropna()
+        if s.empty:
+            return
+        self.nonnull += len(s)
+
+        if pd.api.types.is_bool_dtype(s):
+            self.bools += len(s)
+            return
+        if pd.api.types.is_datetime64_any_dtype(s):
+            self.dates += len(s)
+            self.has_time |= bool((s != s.dt.normalize()).any())
+            return
+
+        if _is_text(s):
+            text = s.astype(str)
+            self.bools += int(text.str.strip().str.lower().isin(_BOOL_TOKENS).sum())
+            self.leading_zero |= bool(text.str.match(_LEADING_ZERO).any())
+            self._update_dates(text)
+            numbers = pd.to_numeric(text, errors="coerce").dropna()
+        else:
+            numbers = s
+        if numbers.empty:
+            return
+        values = numbers.to_numpy(dtype="float64")
+        self.numeric += len(values)
+        self.lo = min(self.lo, values.min())
+        self.hi = max(self.hi, values.max())
+        self.integral &= bool((values == np.round(values)).all())
+        self.scale = max(self.scale, _scale(values))
+
+    def _update_dates(self, text: pd.Series) -> None:
+        datey = text[text.str.match(_DATE_LIKE)]
+        if datey.empty:
+            return
+        if self.date_format is None:
+            # Fixed from the first date seen, like DateCoercer, so chunks agree
+            self.date_format = guess_datetime_format(datey.iloc[0].strip())
+            if self.date_format is None:
+                return
+        parsed = pd.to_datetime(datey.str.strip(), format=self.date_format, errors="coerce").dropna()
+        self.dates += len(parsed)
+        self.has_time |= bool((parsed != parsed.dt.normalize()).any())
+
+    def sql_type(self, min_ratio: float = MIN_PARSE_RATIO) -> SqlType:
+        if self.nonnull == 0:
+            return TEXT
+        if self.bools == self.nonnull:
+            return SqlType("BOOLEAN")
+        # Leading zeros (zip codes, padded ids) are identifiers, not numbers
+        if self.numeric and self.numeric >= min_ratio * self.nonnull and not self.leading_zero:
+            if self.integral:
+                return _int_type(self.lo, self.hi)
+            if self.scale <= MAX_SCALE:
+                # Unconstrained, so larger amounts or more decimals later don't overflow
+                digits = len(str(int(max(abs(self.lo), abs(self.hi)))))
+                return SqlType("NUMERIC", fits=SqlType("NUMERIC", digits + self.scale, self.scale))
+            return SqlType("DOUBLE PRECISION")
+        if self.dates and self.dates >= min_ratio * self.nonnull:
+            return SqlType("TIMESTAMP" if self.has_time else "DATE")
+        return TEXT
+
+
+class SchemaProfiler:
+    """Profile a table from one DataFrame or a stream of chunks, then pick column types."""
+
+    def __init__(self):
+        self.columns: Dict[str, ColumnProfile] = {}
+
+    def update(self, df: pd.DataFrame) -> "SchemaProfiler":
+        for col in df.columns:
+            self.columns.setdefault(col, ColumnProfile()).update(df[col])
+        return self
+
+    def schema(self, overrides: Optional[Mapping[str, SqlType]] = None) -> Schema:
+        overrides = overrides or {}
+        return {col: overrides.get(col) or p.sql_type() for col, p in self.columns.items()}
+
+    def date_formats(self) -> Dict[str, Optional[str]]:
+        return {col: p.date_format for col, p in self.columns.items()}
+
+
+def infer_schema(df: pd.DataFrame, overrides: Optional[Mapping[str, SqlType]] = None) -> Schema:
+    """Compact native types for every column of ``df`` (``overrides`` pins specific columns)."""
+    return SchemaProfiler().update(df).schema(overrides)
+
+
+class SchemaCoercer:
+    """Parse each column into its inferred type, vectorized, collecting what doesn't fit.
+
+    Values that don't parse (or, for integer types, aren't whole numbers) become
+    NULL and are kept in :attr:`rejects` with their 1-based CSV row, so it can
+    be used as a per-chunk transform.
+    """
+
+    def __init__(self, schema: Schema, date_formats: Optional[Mapping[str, Optional[str]]] = None):
+        self.schema = schema
+        self.date_formats = dict(date_formats or {})
+        self.rejects: List[pd.DataFrame] = []
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        for col, sql_type in self.schema.items():
+            if col not in df.columns or sql_type.name == "TEXT":
+                continue
+            s = df[col]
+            if sql_type.name == "BOOLEAN":
+                parsed = s if pd.api.types.is_bool_dtype(s) else \
+                    s.astype("string").str.strip().str.lower().map(_BOOL_TOKENS).astype("boolean")
+                ok = parsed.notna()
+            elif sql_type.name in ("DATE", "TIMESTAMP"):
+                if pd.api.types.is_datetime64_any_dtype(s):
+                    parsed = s
+                else:
+                    text = s.astype("string").str.strip()
+                    parsed = pd.to_datetime(text, format=self.date_formats.get(col), errors="coerce")
+                if sql_type.name == "DATE":
+                    parsed = parsed.dt.normalize()
+                ok = parsed.notna()
+            else:
+                parsed = pd.to_numeric(s, errors="coerce") if _is_text(s) else s
+                ok = parsed.notna()
+                if sql_type.name in ("SMALLINT", "INTEGER", "BIGINT"):
+                    ok &= parsed == parsed.round()
+                    parsed = parsed.where(ok).astype("Int64")
+                    ok = ok.fillna(False)
+            self._reject(df, col, s, ok, sql_type)
+            df[col] = parsed.where(ok)
+        return df
+
+    def _reject(self, df: pd.DataFrame, col: str, raw: pd.Series, ok: pd.Series, sql_type: SqlType) -> None:
+        bad = raw.notna() & ~ok.fillna(False).astype(bool)
+        if bad.any():
+            self.rejects.append(pd.DataFrame({
+                "row": df.index[bad] + 1,
+                "column": col,
+                "value": raw[bad].astype(str).to_numpy(),
+                "expected": str(sql_type),
+            }))
+
+    def report(self) -> pd.DataFrame:
+        if not self.rejects:
+            return pd.DataFrame(columns=["row", "column", "value", "expected"])
+        return pd.concat(self.rejects, ignore_index=True)
+
+
+def write_rejects(coercer: SchemaCoercer, csv_path: str, table: str) -> Optional[str]:
+    """Write the rejected values next to the CSV (``data/rejects/<table>_types.csv``) and summarise them."""
+    report = coercer.report()
+    path = os.path.join(os.path.dirname(os.path.abspath(csv_path)), "rejects", f"{table}_types.csv")
+    if report.empty:
+        if os.path.exists(path):
+            os.remove(path)  # stale report from an earlier load
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    report.to_csv(path, index=False)
+    counts = report.groupby("column").size()
+    print(f"   ⚠️  {len(report)} unparseable values set to NULL in {table} "
+          f"({', '.join(f'{c}: {n}' for c, n in counts.items())}); see {path}")
+    return path
+
+
+def describe_schema(schema: Schema) -> str:
+    """``col TYPE`` for every column, with the tighter type the current values fit (``INTEGER (fits SMALLINT)``)."""
+    return ", ".join(f"{col} {sql_type}" + (f" (fits {sql_type.fits})" if sql_type.fits else "")
+                     for col, sql_type in schema.items())
+
+
+def create_table_sql(table: str, schema: Schema, primary_key: Iterable[str] = ()) -> str:
+    columns = [f'"{col}" {sql_type}' for col, sql_type in schema.items()]
+    key = [f'"{c}"' for c in primary_key]
+    if key:
+        columns.append(f"PRIMARY KEY ({', '.join(key)})")
+    return f'CREATE TABLE "{table}" (\n    ' + ",\n    ".join(columns) + "\n);"
+
+
+def sqlalchemy_dtypes(schema: Schema) -> Dict[str, object]:
+    """``dtype=`` mapping for ``DataFrame.to_sql``."""
+    return {col: sql_type.sqlalchemy for col, sql_type in schema.items()}
+
+
+def typed_frame(df: pd.DataFrame, csv_path: str, table: str,
+                overrides: Optional[Mapping[str, SqlType]] = None) -> Tuple[pd.DataFrame, Schema]:
+    """Infer, parse and report in one step for the whole-file loaders."""
+    with stage("types", table) as m:
+        profiler = SchemaProfiler().update(df)
+        schema = profiler.schema(overrides)
+        coercer = SchemaCoercer(schema, profiler.date_formats())
+        df = coercer(df)
+        write_rejects(coercer, csv_path, table)
+        m.rows = len(df)
+    return df, schema
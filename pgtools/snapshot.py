@@ -0,0 +1,189 @@
+"""Start a project from a database snapshot instead of re-parsing its CSVs.
+
+After a successful load the project database is dumped with ``pg_dump``
+(directory format, compressed, one job per CPU) to
+``data/.snapshot/<dbname>/``, next to a copy of its load manifest. When a
+loader then finds its database empty, e.g. a fresh container on a new
+``postgres_data`` volume, it restores the snapshot with parallel
+``pg_restore`` jobs first. The usual manifest check follows, so only tables
+whose CSV changed since the snapshot are loaded from CSV::
+
+    with instrumented(args, PROJECT_DIR), snapshots(CONFIG, PROJECT_DIR, args.force):
+        main(force=args.force)
+
+``pg_dump``/``pg_restore`` are taken from ``PG_BIN`` or the ``PATH`` and must
+be at least as new as the server; without them loads run as before.
+``LOAD_SNAPSHOT=0`` turns snapshots off, ``LOAD_SNAPSHOT_JOBS`` sets the
+number of parallel jobs, and ``--force`` skips the restore.
+"""
+import json
+import os
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import text
+
+from .db import DBConfig, ensure_database
+from .manifest import MANIFEST_TABLE
+from .metrics import stage
+from .swap import RETIRED_SUFFIX, SHADOW_SUFFIX
+
+SNAPSHOT_ENV = "LOAD_SNAPSHOT"
+JOBS_ENV = "LOAD_SNAPSHOT_JOBS"
+BIN_ENV = "PG_BIN"
+SNAPSHOT_DIR = os.path.join("data", ".snapshot")
+COMPRESSION = 6
+
+# Leftovers of an interrupted load never belong in a snapshot (``__p*``: their
+# range-copy parts and partitions)
+_EXCLUDE = [f"*{SHADOW_SUFFIX}", f"*{SHADOW_SUFFIX}__p*", f"*{RETIRED_SUFFIX}", f"*{RETIRED_SUFFIX}__p*"]
+
+
+def snapshot_path(config: DBConfig, project_dir: str) -> str:
+    return os.path.join(project_dir, SNAPSHOT_DIR, config.dbname)
+
+
+def _tool(name: str) -> Optional[str]:
+    directory = os.getenv(BIN_ENV)
+    if directory:
+        path = os.path.join(directory, name)
+        return path if os.path.exists(path) else None
+    return shutil.which(name)
+
+
+def _size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def _jobs() -> int:
+    return max(1, int(os.getenv(JOBS_ENV) or os.cpu_count() or 1))
+
+
+def _run(command: List[str], config: DBConfig) -> None:
+    env = dict(os.environ)
+    if config.password:
+        env["PGPASSWORD"] = config.password
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        message = (result.stderr.strip() or f"exit status {result.returncode}").splitlines()
+        raise RuntimeError(message[0])
+
+
+def _connection_args(config: DBConfig) -> List[str]:
+    return ["-h", config.host, "-p", str(config.port), "-U", config.user, "-d", config.dbname]
+
+
+def _manifest_state(engine) -> Dict[str, List[str]]:
+    """``{table: [content_hash, loaded_at]}`` from the load manifest (empty if there is none)."""
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass(:t)"), {"t": MANIFEST_TABLE}).scalar() is None:
+            return {}
+        rows = conn.execute(text(f"SELECT table_name, content_hash, loaded_at::text FROM {MANIFEST_TABLE}"))
+        return {table: [content_hash, loaded_at] for table, content_hash, loaded_at in rows}
+
+
+def _is_empty(engine) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT 1 FROM pg_class
+            WHERE relnamespace = 'public'::regnamespace AND relkind IN ('r', 'p', 'm', 'v')
+            LIMIT 1
+        """)).scalar() is None
+
+
+def restore_snapshot(config: DBConfig, project_dir: str) -> bool:
+    """Restore the project's snapshot if its database is empty; True when it was restored.
+
+    A restore that fails is undone (the ``public`` schema is emptied again)
+    and the loader carries on from the CSVs.
+    """
+    path = snapshot_path(config, project_dir)
+    if not os.path.isdir(path):
+        return False
+    engine = ensure_database(config)
+    if not _is_empty(engine):
+        return False
+    pg_restore = _tool("pg_restore")
+    if pg_restore is None:
+        print(f"   ⚠️  pg_restore not found (set {BIN_ENV}), loading {config.dbname} from the CSVs")
+        return False
+
+    start = time.perf_counter()
+    jobs = _jobs()
+    try:
+        with stage("restore", config.dbname) as m:
+            m.bytes_read = _size(path)
+            _run([pg_restore, *_connection_args(config), "--no-owner", "--no-privileges",
+                  "--exit-on-error", "-j", str(jobs), path], config)
+    except RuntimeError as e:
+        print(f"   ⚠️  snapshot not restored: {e}; loading {config.dbname} from the CSVs")
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+        return False
+    print(f"📦 Restored {config.dbname} from {os.path.relpath(path, project_dir)} "
+          f"in {time.perf_counter() - start:.2f}s ({jobs} jobs)")
+    return True
+
+
+def write_snapshot(config: DBConfig, project_dir: str) -> bool:
+    """Dump the project database unless the snapshot already holds this load; True when written.
+
+    The dump goes to a temporary directory that replaces the old snapshot
+    only once it is complete.
+    """
+    path = snapshot_path(config, project_dir)
+    engine = ensure_database(config)
+    state = _manifest_state(engine)
+    if not state:
+        return False
+    state_file = f"{path}.json"
+    if os.path.isdir(path) and os.path.exists(state_file):
+        with open(state_file, encoding="utf-8") as f:
+            if json.load(f) == state:
+                return False
+    pg_dump = _tool("pg_dump")
+    if pg_dump is None:
+        print(f"   ⚠️  pg_dump not found (set {BIN_ENV}), no snapshot of {config.dbname} written")
+        return False
+
+    start = time.perf_counter()
+    partial, old = f"{path}.partial", f"{path}.old"
+    for leftover in (partial, old):
+        shutil.rmtree(leftover, ignore_errors=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    excludes = [arg for pattern in _EXCLUDE for arg in ("--exclude-table", pattern)]
+    try:
+        with stage("dump", config.dbname):
+            _run([pg_dump, *_connection_args(config), "-Fd", "-j", str(_jobs()), "-Z", str(COMPRESSION),
+                  "--no-owner", "--no-privileges", *excludes, "-f", partial], config)
+    except RuntimeError as e:
+        shutil.rmtree(partial, ignore_errors=True)
+        print(f"   ⚠️  no snapshot of {config.dbname} written: {e}")
+        return False
+    if os.path.isdir(path):
+        os.rename(path, old)
+    os.rename(partial, path)
+    shutil.rmtree(old, ignore_errors=True)
+    with open(state_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    print(f"📦 Snapshot of {config.dbname} written to {os.path.relpath(path, project_dir)} "
+          f"({_size(path) / (1024 * 1024):.1f} MiB in {time.perf_counter() - start:.2f}s)")
+    return True
+
+
+@contextmanager
+def snapshots(config: DBConfig, project_dir: str, force: bool = False) -> Iterator[None]:
+    """Restore the snapshot into an empty database before the load, and snapshot the result after it.
+
+    Nothing is written when the load fails.
+    """
+    enabled = os.getenv(SNAPSHOT_ENV, "1") not in ("", "0")
+    if enabled and not force:
+        restore_snapshot(config, project_dir)
+    yield
+    if enabled:
+        write_snapshot(config, project_dir)
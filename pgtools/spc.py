@@ -0,0 +1,285 @@
+"""Statistical process control over a growing table, one new row at a time.
+
+A loader declares its control charts next to its tables::
+
+    CONTROL_CHARTS = [ControlChart('manufacturing_parts', value='height', group='operator', order='item_no')]
+
+For every ``group`` (operator) the chart keeps the last ``window`` values in
+``order``; each new value gets the window's mean and sample standard
+deviation, the control limits ``mean ± sigmas * stddev`` and an alert when it
+falls outside them. This is the Manufacturing notebook's query::
+
+    AVG(height)    OVER (PARTITION BY operator ORDER BY item_no ROWS BETWEEN 4 PRECEDING AND CURRENT ROW)
+    STDDEV(height) OVER (...same window...)   -- rows with a full window of 5 only
+
+:class:`SPCMonitor` does the same work per row: it holds each group's last
+values and row count, so a new part costs one pass over a 5-value window
+whatever the table size. The sums follow PostgreSQL's float8 aggregates
+(Youngs-Cramer, oldest row first), so the limits and alerts are bit-for-bit
+those of the SQL; :func:`control_limits` is the batch form over a DataFrame.
+
+``update_control_charts`` runs after each load. The monitor's state lives in
+``spc_state`` and its alerts in ``spc_alerts``; only rows past the last
+``order`` seen are read, and a table whose earlier rows changed (or a chart
+whose window or sigmas changed) is replayed from the start.
+``python -m pgtools.spc manufacturing`` does the same for rows appended by
+other writers.
+"""
+import argparse
+import json
+import math
+import sys
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+from .metrics import stage
+from .query import iter_query
+
+SPC_STATE_TABLE = "spc_state"
+SPC_ALERTS_TABLE = "spc_alerts"
+# Alerts printed per update; the rest are only counted (all are in spc_alerts)
+MAX_PRINTED_ALERTS = 5
+
+_CREATE = f"""
+CREATE TABLE IF NOT EXISTS {SPC_STATE_TABLE} (
+    chart      TEXT PRIMARY KEY,
+    state      JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS {SPC_ALERTS_TABLE} (
+    chart       TEXT NOT NULL,
+    grp         TEXT,
+    order_value TEXT NOT NULL,
+    row_number  BIGINT NOT NULL,
+    value       DOUBLE PRECISION,
+    avg_value   DOUBLE PRECISION,
+    stddev      DOUBLE PRECISION,
+    ucl         DOUBLE PRECISION,
+    lcl         DOUBLE PRECISION,
+    detected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+class ControlChart(NamedTuple):
+    """A rolling control chart of ``value`` per ``group``, in ``order``."""
+    table: str
+    value: str
+    group: str
+    order: str
+    window: int = 5
+    sigmas: float = 3.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.table}.{self.value}"
+
+
+class ControlPoint(NamedTuple):
+    group: object
+    order: object
+    row_number: int
+    value: Optional[float]
+    avg: Optional[float]
+    stddev: Optional[float]
+    ucl: Optional[float]
+    lcl: Optional[float]
+    alert: bool
+
+
+def _missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def window_stats(values: Iterable[Optional[float]]) -> Tuple[Optional[float], Optional[float]]:
+    """``(AVG, STDDEV)`` of ``values`` as PostgreSQL's float8 aggregates compute them (NULLs skipped)."""
+    n = sx = sxx = 0.0
+    for x in values:
+        if _missing(x):
+            continue
+        previous = n
+        n += 1.0
+        sx += x
+        if previous > 0.0:
+            tmp = x * n - sx
+            sxx += tmp * tmp / (n * previous)
+        elif math.isinf(x):
+            sxx = math.nan
+    if n == 0.0:
+        return None, None
+    return sx / n, (math.sqrt(sxx / (n - 1.0)) if n > 1.0 else None)
+
+
+class SPCMonitor:
+    """Per-group rolling state of one chart; :meth:`update` takes one row in constant time."""
+
+    def __init__(self, chart: ControlChart):
+        self.chart = chart
+        self.windows: Dict[object, Deque[Tuple[object, Optional[float]]]] = {}
+        self.counts: Dict[object, int] = {}
+        self.watermark = None
+        self.rows = 0
+
+    def update(self, group, order, value) -> Optional[ControlPoint]:
+        """Add one row; its point once the group's window is full, else None."""
+        value = None if _missing(value) else float(value)
+        window = self.windows.setdefault(group, deque(maxlen=self.chart.window))
+        window.append((order, value))
+        self.counts[group] = self.counts.get(group, 0) + 1
+        self.rows += 1
+        if self.watermark is None or order > self.watermark:
+            self.watermark = order
+        if len(window) < self.chart.window:
+            return None
+
+        avg, stddev = window_stats(v for _, v in window)
+        ucl = lcl = None
+        if avg is not None and stddev is not None:
+            ucl, lcl = avg + self.chart.sigmas * stddev, avg - self.chart.sigmas * stddev
+        alert = value is not None and ucl is not None and (value > ucl or value < lcl)
+        return ControlPoint(group, order, self.counts[group], value, avg, stddev, ucl, lcl, alert)
+
+    def state(self) -> dict:
+        return {"window": self.chart.window, "sigmas": self.chart.sigmas,
+                "watermark": self.watermark, "rows": self.rows,
+                "groups": [[g, self.counts[g], [list(r) for r in w]] for g, w in self.windows.items()]}
+
+    @classmethod
+    def from_state(cls, chart: ControlChart, state: dict) -> "SPCMonitor":
+        monitor = cls(chart)
+        monitor.watermark, monitor.rows = state["watermark"], state["rows"]
+        for group, count, window in state["groups"]:
+            monitor.counts[group] = count
+            monitor.windows[group] = deque((tuple(r) for r in window), maxlen=chart.window)
+        return monitor
+
+
+def control_limits(df: pd.DataFrame, chart: ControlChart) -> pd.DataFrame:
+    """Batch mode: the notebook query's result for the rows of ``df``, in ``order``.
+
+    Columns are ``<group>, row_number, <value>, avg_<value>, stddev_<value>,
+    ucl, lcl, alert``, one row per value with a full window.
+    """
+    monitor = SPCMonitor(chart)
+    ordered = df.sort_values(chart.order, kind="stable")
+    points = [p for p in map(monitor.update, ordered[chart.group], ordered[chart.order], ordered[chart.value])
+              if p is not None]
+    return pd.DataFrame({
+        chart.group: [p.group for p in points],
+        "row_number": pd.array([p.row_number for p in points], dtype="int64"),
+        chart.value: [p.value for p in points],
+        f"avg_{chart.value}": [p.avg for p in points],
+        f"stddev_{chart.value}": [p.stddev for p in points],
+        "ucl": [p.ucl for p in points],
+        "lcl": [p.lcl for p in points],
+        "alert": pd.array([p.alert for p in points], dtype="bool"),
+    }).astype({c: "float64" for c in (chart.value, f"avg_{chart.value}", f"stddev_{chart.value}", "ucl", "lcl")})
+
+
+def _load_state(conn, chart: ControlChart) -> Optional[SPCMonitor]:
+    row = conn.execute(text(f"SELECT state FROM {SPC_STATE_TABLE} WHERE chart = :c"), {"c": chart.name}).fetchone()
+    if row is None or [row[0].get("window"), row[0].get("sigmas")] != [chart.window, chart.sigmas]:
+        return None  # a redefined chart starts over
+    return SPCMonitor.from_state(chart, row[0])
+
+
+def _still_valid(conn, monitor: SPCMonitor) -> bool:
+    """Whether the rows the state was built from are still in the table, unchanged."""
+    c = monitor.chart
+    seen = conn.execute(text(f'SELECT count(*) FROM "{c.table}" WHERE "{c.order}" <= :w'),
+                        {"w": monitor.watermark}).scalar()
+    if seen != monitor.rows:
+        return False
+    kept = [(group, order, value) for group, window in monitor.windows.items() for order, value in window]
+    rows = conn.execute(text(f'SELECT "{c.group}", "{c.order}", "{c.value}" FROM "{c.table}" '
+                             f'WHERE "{c.order}" = ANY(:orders)'), {"orders": [o for _, o, _ in kept]}).fetchall()
+    current = {(g, o, None if _missing(v) else float(v)) for g, o, v in rows}
+    return len(rows) == len(kept) and current == set(kept)
+
+
+def _new_rows(engine, chart: ControlChart, after) -> Iterator[Tuple]:
+    where = "" if after is None else f' WHERE "{chart.order}" > %(after)s'
+    sql = (f'SELECT "{chart.group}", "{chart.order}", "{chart.value}" FROM "{chart.table}"{where} '
+           f'ORDER BY "{chart.order}"')
+    conn = engine.raw_connection()
+    try:
+        for chunk in iter_query(conn, sql, {"after": after}):
+            yield from chunk.itertuples(index=False, name=None)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def update_control_chart(engine, chart: ControlChart) -> List[ControlPoint]:
+    """Feed the rows added since the last update through the chart; returns the new alerts."""
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:t))"), {"t": SPC_STATE_TABLE})
+        conn.execute(text(_CREATE))
+        if conn.execute(text("SELECT to_regclass(:t)"), {"t": f'"{chart.table}"'}).scalar() is None:
+            return []
+        monitor = _load_state(conn, chart)
+        replay = monitor is None or not _still_valid(conn, monitor)
+    if replay:
+        monitor = SPCMonitor(chart)
+
+    before = monitor.rows
+    alerts = []
+    with stage("spc", chart.name) as m:
+        for group, order, value in _new_rows(engine, chart, None if replay else monitor.watermark):
+            point = monitor.update(group, order, value)
+            if point is not None and point.alert:
+                alerts.append(point)
+        m.rows = monitor.rows - before
+
+        with engine.begin() as conn:
+            if replay:
+                conn.execute(text(f"DELETE FROM {SPC_ALERTS_TABLE} WHERE chart = :c"), {"c": chart.name})
+            if alerts:
+                conn.execute(text(f"""
+                    INSERT INTO {SPC_ALERTS_TABLE} (chart, grp, order_value, row_number, value, avg_value, stddev, ucl, lcl)
+                    VALUES (:chart, :grp, :order_value, :row_number, :value, :avg, :stddev, :ucl, :lcl)
+                """), [{"chart": chart.name, "grp": str(p.group), "order_value": str(p.order),
+                        "row_number": p.row_number, "value": p.value, "avg": p.avg, "stddev": p.stddev,
+                        "ucl": p.ucl, "lcl": p.lcl} for p in alerts])
+            conn.execute(text(f"""
+                INSERT INTO {SPC_STATE_TABLE} (chart, state, updated_at) VALUES (:c, CAST(:s AS JSONB), now())
+                ON CONFLICT (chart) DO UPDATE SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+            """), {"c": chart.name, "s": json.dumps(monitor.state(), default=str)})
+
+    how = "replayed" if replay else "new"
+    print(f"📉 SPC {chart.name}: {monitor.rows - before:,} {how} rows, {len(alerts)} alert(s)")
+    for p in alerts[:MAX_PRINTED_ALERTS]:
+        print(f"   🚨 {chart.group} {p.group}, {chart.order} {p.order}: {chart.value} {p.value} "
+              f"outside [{p.lcl:.2f}, {p.ucl:.2f}]")
+    if len(alerts) > MAX_PRINTED_ALERTS:
+        print(f"   ... {len(alerts) - MAX_PRINTED_ALERTS} more in {SPC_ALERTS_TABLE}")
+    return alerts
+
+
+def update_control_charts(engine, charts: Sequence[ControlChart]) -> Dict[str, List[ControlPoint]]:
+    return {chart.name: update_control_chart(engine, chart) for chart in charts}
+
+
+def main(argv=None) -> int:
+    from .db import ensure_database
+    from .projects import PROJECTS, load_module
+
+    charted = [key for key, p in PROJECTS.items() if getattr(load_module(p), "CONTROL_CHARTS", None)]
+    parser = argparse.ArgumentParser(description="Feed new rows through the projects' control charts.")
+    parser.add_argument("projects", nargs="*", metavar="PROJECT", help=f"default: all ({', '.join(charted)})")
+    args = parser.parse_args(argv)
+
+    unknown = [p for p in args.projects if p not in charted]
+    if unknown:
+        parser.error(f"no control charts in: {', '.join(unknown)}")
+    for key in args.projects or charted:
+        module = load_module(PROJECTS[key])
+        update_control_charts(ensure_database(module.CONFIG), module.CONTROL_CHARTS)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
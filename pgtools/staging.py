@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from .manifest import Fingerprint, fingerprint
+from .metrics import stage
+from .query import _has_pyarrow
+from .streaming import Transform
+
+STAGE_DIR = ".staged"
+# Bump to invalidate every staged file after a change in how frames are written
+# or in a shared transform (norm_cols, DateCoercer)
+STAGE_VERSION = 1
+
+
+def staging_enabled() -> bool:
+    """Staging is on unless ``LOAD_STAGING=0``."""
+    return os.getenv("LOAD_STAGING", "1") != "0"
+
+
+def stage_path(csv_path: str, transform: Optional[Transform] = None) -> str:
+    """``data/orders.csv`` is staged as ``data/.staged/orders`` (+ ``.parquet``/``.pkl``/``.json``).
+
+    Each transform gets its own stage, so a notebook reading the raw CSV and a
+    loader normalizing it don't keep overwriting each other's file.
+    """
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    base = os.path.join(directory, STAGE_DIR, os.path.splitext(name)[0])
+    if transform is None:
+        return base
+    # Qualified name only: the loaders run both as scripts and as load_all modules
+    name = getattr(transform, "__qualname__", type(transform).__qualname__)
+    return f"{base}.{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+
+
+def _transform_tag(transform: Optional[Transform], key: Optional[str]) -> Optional[str]:
+    """``<qualname>:<key>``; the stage is rebuilt when either changes."""
+    if transform is None and key is None:
+        return None
+    name = "" if transform is None else getattr(transform, "__qualname__", type(transform).__qualname__)
+    return f"{name}:{key or ''}"
+
+
+def _write_meta(base: str, meta: dict) -> None:
+    with open(base + ".json", "w") as f:
+        json.dump(meta, f)
+
+
+def _is_current(base: str, csv_path: str, meta: dict, tag: Optional[str], source: Optional[Fingerprint]) -> bool:
+    if meta.get("version") != STAGE_VERSION or meta.get("transform") != tag:
+        return False
+    st = os.stat(csv_path)
+    if (meta["size_bytes"], meta["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+        return True
+    # Touched but maybe not changed (e.g. re-downloaded): compare contents once,
+    # then remember the new mtime so the next read doesn't hash it again
+    if (source or fingerprint(csv_path)).content_hash != meta["content_hash"]:
+        return False
+    meta.update(size_bytes=st.st_size, mtime_ns=st.st_mtime_ns)
+    _write_meta(base, meta)
+    return True
+
+
+def read_staged(csv_path: str, transform: Optional[Transform] = None,
+                source: Optional[Fingerprint] = None, key: Optional[str] = None) -> pd.DataFrame:
+    """``pd.read_csv(csv_path)`` (plus ``transform``), parsed once and reused.
+
+    The first call parses the CSV, applies ``transform`` (column normalization,
+    date coercion, ...) and writes the typed result to ``data/.staged/`` as
+    Parquet (pickle when ``pyarrow`` is missing or can't represent a column).
+    Later calls read that file instead, until the CSV's contents change.
+    Works the same from a notebook.
+
+    The stage doesn't look inside ``transform``, only at its name: a loader
+    whose transform is its own passes a ``key`` (e.g. ``'2'``) and changes it
+    whenever the transform's output would, so the stage is rebuilt.
+
+    Pass ``source`` when the caller has already fingerprinted the CSV (for the
+    load manifest) so it isn't hashed twice.
+    """
+    with stage("read", os.path.basename(csv_path)) as m:
+        df, path = _read_staged(csv_path, transform, source, key)
+        m.rows, m.bytes_read = len(df), os.path.getsize(path)
+    return df
+
+
+def _read_staged(csv_path: str, transform: Optional[Transform], source: Optional[Fingerprint],
+                 key: Optional[str]) -> Tuple[pd.DataFrame, str]:
+    """The frame and the file it was read from (the stage or the CSV)."""
+    if not staging_enabled():
+        df = pd.read_csv(csv_path)
+        return (transform(df) if transform else df), csv_path
+
+    tag = _transform_tag(transform, key)
+    base = stage_path(csv_path, transform)
+    meta = {}
+    if os.path.exists(base + ".json"):
+        with open(base + ".json") as f:
+            meta = json.load(f)
+    staged = base + meta.get("format", "")
+    if meta and os.path.exists(staged) and _is_current(base, csv_path, meta, tag, source):
+        return (pd.read_parquet(staged) if staged.endswith(".parquet") else pd.read_pickle(staged)), staged
+
+    st = os.stat(csv_path)
+    source = source or fingerprint(csv_path)
+    df = pd.read_csv(csv_path)
+    if transform:
+        df = transform(df)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    ext = _write(df, base)
+    for old in (".parquet", ".pkl"):
+        if old != ext and os.path.exists(base + old):
+            os.remove(base + old)
+    _write_meta(base, {"version": STAGE_VERSION, "transform": tag, "format": ext,
+                       "content_hash": source.content_hash, "size_bytes": st.st_size,
+                       "mtime_ns": st.st_mtime_ns, "rows": len(df)})
+    print(f"   Staged {os.path.basename(csv_path)} -> {os.path.relpath(base + ext, os.path.dirname(csv_path))}")
+    return df, csv_path
+
+
+def _write(df: pd.DataFrame, base: str) -> str:
+    # Written under a temporary name so an interrupted run never leaves a torn file
+    if _has_pyarrow():
+        try:
+            df.to_parquet(base + ".parquet.tmp", index=False, compression="zstd")
+            os.replace(base + ".parquet.tmp", base + ".parquet")
+            return ".parquet"
+        except Exception:
+            if os.path.exists(base + ".parquet.tmp"):
+                os.remove(base + ".parquet.tmp")
+    df.to_pickle(base + ".pkl.tmp")
+    os.replace(base + ".pkl.tmp", base + ".pkl")
+    return ".pkl"
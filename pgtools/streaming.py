@@ -0,0 +1,158 @@
+import os
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from .metrics import stage
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+Transform = Callable[[pd.DataFrame], pd.DataFrame]
+
+
+def stream_chunksize() -> Optional[int]:
+    """Rows per chunk from ``LOAD_CHUNKSIZE``; ``None`` keeps whole-file loading."""
+    value = os.getenv("LOAD_CHUNKSIZE")
+    return int(value) if value and int(value) > 0 else None
+
+
+def norm_cols(df: pd.DataFrame) -> pd.DataFrame:
+    """Lowercase, strip and snake_case column names (the loaders' shared convention)."""
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    return df
+
+
+def _kind(s: pd.Series) -> str:
+    if s.isna().all():
+        return "empty"
+    if pd.api.types.is_bool_dtype(s):
+        return "bool"
+    if pd.api.types.is_object_dtype(s) and pd.api.types.infer_dtype(s, skipna=True) == "boolean":
+        return "boolean"  # True/False with blanks
+    if pd.api.types.is_integer_dtype(s):
+        return "int"
+    if pd.api.types.is_float_dtype(s):
+        return "float"
+    return "text"
+
+
+# How read_csv resolves a column whose chunks disagree: an int column with a
+# gap becomes float, a bool column with a gap holds bools and NaN, anything
+# else mixed with text or booleans becomes text.
+_PROMOTE = {
+    frozenset({"int", "float"}): "float",
+    frozenset({"int", "empty"}): "float",
+    frozenset({"float", "empty"}): "float",
+    frozenset({"bool", "boolean"}): "boolean",
+    frozenset({"bool", "empty"}): "boolean",
+    frozenset({"boolean", "empty"}): "boolean",
+}
+
+
+def _merge(a: str, b: str) -> str:
+    if a == b:
+        return a
+    return _PROMOTE.get(frozenset({a, b}), "text")
+
+
+def update_kinds(kinds: Dict[str, str], text_dtypes: Dict[str, object], df: pd.DataFrame) -> None:
+    """Fold one chunk's column kinds into ``kinds`` (see :func:`pinned_dtypes`)."""
+    for col in df.columns:
+        kind = _kind(df[col])
+        kinds[col] = _merge(kinds[col], kind) if col in kinds else kind
+        if kind == "text":
+            text_dtypes.setdefault(col, df[col].dtype)
+
+
+def pinned_dtypes(kinds: Dict[str, str], text_dtypes: Dict[str, object]) -> Dict[str, object]:
+    """The ``read_csv`` dtypes that give every chunk the schema a whole-file read would have."""
+    dtypes: Dict[str, object] = {}
+    for col, kind in kinds.items():
+        if kind == "int":
+            dtypes[col] = "int64"
+        elif kind in ("float", "empty"):
+            dtypes[col] = "float64"
+        elif kind == "bool":
+            dtypes[col] = "bool"
+        elif kind == "boolean":
+            # Nullable, so every chunk holds booleans (BOOLEAN in to_sql), not 'True'/'False' text
+            dtypes[col] = "boolean"
+        else:
+            dtypes[col] = text_dtypes.get(col, object)
+    return dtypes
+
+
+def infer_csv_dtypes(path: str, chunksize: int, **read_kw) -> Dict[str, object]:
+    """Scan ``path`` chunk by chunk and return the dtypes a whole-file read would pick.
+
+    Pinning these dtypes on the second pass keeps every chunk's schema identical,
+    so a column that is all integers in the first chunk but has a blank in the
+    last one is float64 throughout, exactly as ``pd.read_csv(path)`` would give.
+    """
+    kinds: Dict[str, str] = {}
+    text_dtypes: Dict[str, object] = {}
+    for chunk in pd.read_csv(path, chunksize=chunksize, **read_kw):
+        update_kinds(kinds, text_dtypes, chunk)
+    return pinned_dtypes(kinds, text_dtypes)
+
+
+class DateCoercer:
+    """Chunk-stable ``pd.to_datetime(..., errors='coerce')``.
+
+    A whole-column call infers the date format from the first non-null value;
+    per chunk that inference could differ, so the format seen first is reused
+    for every later chunk.
+    """
+
+    def __init__(self, columns: Iterable[str]):
+        self.columns = list(columns)
+        self.formats: Dict[str, Optional[str]] = {}
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        for col in self.columns:
+            if col not in df.columns:
+                continue
+            if col not in self.formats:
+                sample = df[col].dropna()
+                if sample.empty:
+                    df[col] = pd.to_datetime(df[col], errors="coerce")
+                    continue
+                self.formats[col] = guess_datetime_format(str(sample.iloc[0]))
+            df[col] = pd.to_datetime(df[col], format=self.formats[col], errors="coerce")
+        return df
+
+
+def read_csv_stream(path: str, chunksize: int, transform: Optional[Transform] = None,
+                    **read_kw) -> Iterator[pd.DataFrame]:
+    """Yield transformed chunks of ``path`` with dtypes pinned across chunks."""
+    dtypes = infer_csv_dtypes(path, chunksize, **read_kw)
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=dtypes, **read_kw):
+        yield transform(chunk) if transform else chunk
+
+
+def stream_csv_to_sql(path: str, table: str, engine, chunksize: int,
+                      transform: Optional[Transform] = None, sql_dtype=None,
+                      prepare: Optional[Callable] = None, **read_kw) -> int:
+    """Replace ``table`` with the contents of ``path`` one chunk at a time.
+
+    Peak memory is bounded by ``chunksize`` rather than the file size. The first
+    chunk creates the table, the rest are appended, all in one transaction so a
+    failure never leaves a half-written table behind. ``sql_dtype`` is passed
+    to ``to_sql`` as its ``dtype`` to pin the column types. ``prepare(conn,
+    chunk)`` runs before each chunk is written, the table already created
+    (e.g. :class:`pgtools.partitions.ShadowPartitions`).
+    """
+    with stage("stream", table, source=path) as m, engine.begin() as conn:
+        m.rows = 0
+        for i, chunk in enumerate(read_csv_stream(path, chunksize, transform, **read_kw)):
+            if prepare:
+                if i == 0:
+                    chunk.head(0).to_sql(table, conn, if_exists="replace", index=False, dtype=sql_dtype)
+                prepare(conn, chunk)
+            chunk.to_sql(table, conn, if_exists="replace" if i == 0 and not prepare else "append", index=False,
+                         dtype=sql_dtype)
+            m.rows += len(chunk)
+    return m.rows
@@ -0,0 +1,335 @@
+"""Reload tables without taking them away: build under a shadow name, then swap.
+
+A loader writes the new rows to ``<table>__shadow`` while readers keep
+querying ``<table>``::
+
+    df.to_sql(shadow_name('journeys'), engine, if_exists='replace', index=False)
+    swap_in(engine, 'journeys')
+
+``swap_in`` gives the shadow the live table's indexes and fresh statistics,
+then renames it into place in one short transaction. Readers see the old
+rows until that transaction commits and the new ones after it; a failed load
+leaves the live table as it was. Several tables passed together are swapped
+in the same transaction, so linked tables change at once.
+
+The rename needs an exclusive lock on the live table, i.e. it waits for
+running queries on it. ``LOAD_SWAP_LOCK_TIMEOUT`` (default ``5s``) bounds
+that wait, so queries arriving meanwhile are held up at most that long; the
+swap is then retried a few times before the load fails.
+
+A session sitting idle in a transaction that read the table holds its lock
+until the transaction ends, so every retry times out. Long-lived sessions
+must not do that: the notebooks connect with ``autocommit``, and
+``QueryCache`` rolls back the transactions its reads open.
+
+Views over a swapped table (analysts' own included) are recreated over the
+new one in the same transaction, with their comments, grants and, for
+materialized views, indexes, so readers see the new rows as soon as it
+commits. Rollups (:mod:`pgtools.rollups`) are the exception: a table they
+read is renamed to ``<table>__retired`` instead of dropped, so they keep
+answering with the old rows while ``refresh_rollups`` builds their
+replacements, and :func:`drop_retired` then drops the retired tables nothing
+reads any more. Nothing is dropped with ``CASCADE``: a swap that would take
+other objects with it fails and names them.
+"""
+import os
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from .keys import _run, drop_foreign_keys, keys_lock, partition_key
+from .metrics import stage
+
+SHADOW_SUFFIX = "__shadow"
+RETIRED_SUFFIX = "__retired"
+# Comment that marks the materialized views pgtools.rollups owns and rebuilds itself
+ROLLUP_COMMENT_PREFIX = "pgtools.rollups "
+LOCK_TIMEOUT_ENV = "LOAD_SWAP_LOCK_TIMEOUT"
+DEFAULT_LOCK_TIMEOUT = "5s"
+SWAP_ATTEMPTS = 5
+
+# SQLSTATE lock_not_available, raised when lock_timeout expires
+_LOCK_NOT_AVAILABLE = "55P03"
+_KINDS = {"r": "TABLE", "p": "TABLE", "m": "MATERIALIZED VIEW"}
+
+
+def shadow_name(table: str) -> str:
+    return f"{table}{SHADOW_SUFFIX}"
+
+
+def retired_name(table: str) -> str:
+    return f"{table}{RETIRED_SUFFIX}"
+
+
+def discard_shadows(engine, *tables: str) -> None:
+    """Drop the shadows of ``tables`` left behind by a failed load."""
+    with engine.begin() as conn:
+        for table in tables:
+            kind = _kind(conn, shadow_name(table))
+            if kind:
+                conn.execute(text(f'DROP {kind} "{shadow_name(table)}" CASCADE'))
+
+
+def swap_in(engine, *tables: str, copy_indexes: bool = True) -> None:
+    """Replace each of ``tables`` with its shadow, all in one short transaction.
+
+    Before the swap every shadow gets the indexes and primary/unique keys its
+    live table has (``copy_indexes``), under names the swap turns into the
+    live ones, and is analyzed. Foreign keys into or out of the live tables
+    are dropped with them; ``apply_keys`` adds them back over the new tables.
+    """
+    for table in tables:
+        with stage("index", table):
+            if copy_indexes:
+                _copy_indexes(engine, table, shadow_name(table))
+            with engine.begin() as conn:
+                conn.execute(text(f'ANALYZE "{shadow_name(table)}"'))
+
+    timeout = os.getenv(LOCK_TIMEOUT_ENV, DEFAULT_LOCK_TIMEOUT)
+    with stage("swap", ", ".join(tables)):
+        for attempt in range(1, SWAP_ATTEMPTS + 1):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text("SELECT set_config('lock_timeout', :t, true)"), {"t": timeout})
+                    keys_lock(conn)
+                    for table in tables:
+                        _swap(conn, table)
+                return
+            except OperationalError as e:
+                if getattr(e.orig, "pgcode", None) != _LOCK_NOT_AVAILABLE or attempt == SWAP_ATTEMPTS:
+                    raise
+                print(f"   ⚠️  {', '.join(tables)} busy, swap retried ({attempt}/{SWAP_ATTEMPTS - 1})")
+                time.sleep(attempt)
+
+
+class _Reader(NamedTuple):
+    """A view reading a swapped table, as needed to create it again over the new one."""
+    name: str
+    kind: str
+    definition: str
+    options: List[str]
+    populated: bool
+    comment: Optional[str]
+    indexes: List[str]
+    grants: List[Tuple[str, str, bool]]
+
+
+def _swap(conn, table: str) -> None:
+    shadow = shadow_name(table)
+    kind = _kind(conn, shadow)
+    if kind is None:
+        raise ValueError(f"no {shadow} to swap in")
+    live = _kind(conn, table)
+    readers: List[_Reader] = []
+    if live:
+        drop_foreign_keys(conn, table)
+        readers = _readers(conn, table)
+        for reader in reversed(readers):
+            conn.execute(text(f'DROP {reader.kind} "{reader.name}"'))
+        if _dependents(conn, table):
+            # Only rollups are left; they read the old rows until refresh_rollups replaces them
+            retired = retired_name(table)
+            old = _kind(conn, retired)
+            if old:
+                still = _reader_names(conn, retired)
+                if still:
+                    raise ValueError(f"{retired} is still read by {', '.join(still)}; "
+                                     f"rebuild or drop them before {table} is reloaded")
+                conn.execute(text(f'DROP {old} "{retired}"'))
+            conn.execute(text(f'ALTER {live} "{table}" RENAME TO "{retired}"'))
+            _rename_children(conn, retired, table, retired)
+        else:
+            conn.execute(text(f'DROP {live} "{table}"'))
+    conn.execute(text(f'ALTER {kind} "{shadow}" RENAME TO "{table}"'))
+    _rename_children(conn, table, shadow, table)
+    for reader in readers:
+        _recreate(conn, reader)
+
+
+def _readers(conn, table: str) -> List[_Reader]:
+    """Views reading ``table``, directly or through each other, in an order they can be created in.
+
+    Rollups reading ``table`` directly are left out (they are retired with
+    it), but not those reading it through another view, which must be
+    recreated with that view.
+    """
+    rows = conn.execute(text("""
+        WITH RECURSIVE reader(oid, depth) AS (
+            SELECT r.ev_class, 1
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid AND d.classid = 'pg_rewrite'::regclass
+            WHERE d.refobjid = to_regclass(:t) AND r.ev_class <> d.refobjid
+              AND left(coalesce(obj_description(r.ev_class, 'pg_class'), ''), :n) <> :prefix
+          UNION
+            SELECT r.ev_class, v.depth + 1
+            FROM reader v
+            JOIN pg_depend d ON d.refobjid = v.oid
+            JOIN pg_rewrite r ON r.oid = d.objid AND d.classid = 'pg_rewrite'::regclass
+            WHERE r.ev_class <> d.refobjid
+        )
+        SELECT c.oid, c.relname, c.relkind, pg_get_viewdef(c.oid), coalesce(c.reloptions, '{}'),
+               c.relispopulated, obj_description(c.oid, 'pg_class')
+        FROM reader v JOIN pg_class c ON c.oid = v.oid
+        GROUP BY c.oid
+        ORDER BY max(v.depth), c.relname
+    """), {"t": f'"{table}"', "n": len(ROLLUP_COMMENT_PREFIX), "prefix": ROLLUP_COMMENT_PREFIX}).fetchall()
+    readers = []
+    for oid, name, relkind, definition, options, populated, comment in rows:
+        indexes = [row[0] for row in conn.execute(text(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = :oid ORDER BY indexrelid"),
+            {"oid": oid}).fetchall()]
+        grants = [tuple(row) for row in conn.execute(text("""
+            SELECT CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(a.grantee::regrole::text) END,
+                   a.privilege_type, a.is_grantable
+            FROM pg_class c, aclexplode(c.relacl) a
+            WHERE c.oid = :oid AND a.grantee <> c.relowner
+        """), {"oid": oid}).fetchall()]
+        readers.append(_Reader(name, "VIEW" if relkind == "v" else "MATERIALIZED VIEW", definition.rstrip().rstrip(";"),
+                               list(options), populated, comment, indexes, grants))
+    return readers
+
+
+def _recreate(conn, reader: _Reader) -> None:
+    options = f" WITH ({', '.join(reader.options)})" if reader.options else ""
+    data = "" if reader.kind == "VIEW" else (" WITH DATA" if reader.populated else " WITH NO DATA")
+    conn.execute(text(f'CREATE {reader.kind} "{reader.name}"{options} AS {reader.definition}{data}'))
+    for index in reader.indexes:
+        conn.execute(text(index))
+    if reader.comment is not None:
+        conn.execute(text(f'COMMENT ON {reader.kind} "{reader.name}" IS :c'), {"c": reader.comment})
+    for grantee, privilege, grantable in reader.grants:
+        conn.execute(text(f'GRANT {privilege} ON "{reader.name}" TO {grantee}'
+                          + (" WITH GRANT OPTION" if grantable else "")))
+
+
+def drop_retired(engine) -> List[str]:
+    """Drop every ``<table>__retired`` nothing reads any more; returns their names.
+
+    A retired table still read (by a rollup that failed to rebuild) is kept
+    and reported, with its readers.
+    """
+    dropped = []
+    with engine.begin() as conn:
+        keys_lock(conn)
+        rows = conn.execute(text("""
+            SELECT c.relname, c.relkind FROM pg_class c
+            WHERE c.relnamespace = current_schema()::regnamespace
+              AND c.relkind IN ('r', 'p', 'm')
+              AND right(c.relname, :n) = :suffix
+        """), {"n": len(RETIRED_SUFFIX), "suffix": RETIRED_SUFFIX}).fetchall()
+        for name, relkind in rows:
+            readers = _reader_names(conn, name)
+            if readers:
+                print(f"   ⚠️  {name} kept, still read by {', '.join(readers)}")
+                continue
+            conn.execute(text(f'DROP {_KINDS[relkind]} "{name}"'))
+            dropped.append(name)
+    return dropped
+
+
+def reads_retired(engine, view: str) -> bool:
+    """True when ``view`` still reads a table that a swap retired."""
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT 1
+            FROM pg_rewrite r
+            JOIN pg_depend d ON d.objid = r.oid AND d.classid = 'pg_rewrite'::regclass
+            JOIN pg_class t ON t.oid = d.refobjid
+            WHERE r.ev_class = to_regclass(:v) AND t.oid <> r.ev_class
+              AND right(t.relname, :n) = :suffix
+            LIMIT 1
+        """), {"v": f'"{view}"', "n": len(RETIRED_SUFFIX), "suffix": RETIRED_SUFFIX}).scalar() is not None
+
+
+def _kind(conn, name: str) -> Optional[str]:
+    """``TABLE`` or ``MATERIALIZED VIEW`` for an existing relation, else None."""
+    relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"),
+                           {"t": f'"{name}"'}).scalar()
+    return _KINDS.get(relkind)
+
+
+def _dependents(conn, table: str) -> bool:
+    """Whether views or materialized views read ``table``."""
+    return conn.execute(text("""
+        SELECT 1
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid AND d.classid = 'pg_rewrite'::regclass
+        WHERE d.refobjid = to_regclass(:t) AND r.ev_class <> d.refobjid
+        LIMIT 1
+    """), {"t": f'"{table}"'}).scalar() is not None
+
+
+def _reader_names(conn, table: str) -> List[str]:
+    return [row[0] for row in conn.execute(text("""
+        SELECT DISTINCT r.ev_class::regclass::text
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid AND d.classid = 'pg_rewrite'::regclass
+        WHERE d.refobjid = to_regclass(:t) AND r.ev_class <> d.refobjid
+        ORDER BY 1
+    """), {"t": f'"{table}"'}).fetchall()]
+
+
+def _index_names(conn, table: str) -> List[str]:
+    return [row[0] for row in conn.execute(text("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(:t)
+    """), {"t": f'"{table}"'}).fetchall()]
+
+
+def _renamed(name: str, old: str, new: str) -> str:
+    # Index names are schema-wide, so they carry their table's name
+    return new + name[len(old):] if name.startswith(old) else f"{new}_{name}"
+
+
+def _partitions(conn, table: str) -> List[str]:
+    return [row[0] for row in conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:t)
+    """), {"t": f'"{table}"'}).fetchall()]
+
+
+def _rename_children(conn, table: str, old: str, new: str) -> None:
+    """Rename ``table``'s indexes (and the keys they back) and partitions from ``old``'s names to ``new``'s."""
+    for name in _index_names(conn, table):
+        if name.startswith(old):
+            conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{_renamed(name, old, new)}"'))
+    for name in _partitions(conn, table):
+        if name.startswith(old):
+            conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{_renamed(name, old, new)}"'))
+            name = _renamed(name, old, new)
+        _rename_children(conn, name, old, new)
+
+
+def _copy_indexes(engine, table: str, shadow: str) -> None:
+    """Give ``shadow`` the indexes and primary/unique keys ``table`` has and it lacks.
+
+    Keys are left to ``apply_keys`` when only one of the two is partitioned
+    (or by other columns), as they must then cover different columns.
+    """
+    with engine.connect() as conn:
+        rows: List[Tuple] = conn.execute(text("""
+            SELECT c.relname, i.indisunique, con.contype, pg_get_constraintdef(con.oid),
+                   pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            LEFT JOIN pg_constraint con
+              ON con.conindid = i.indexrelid AND con.conrelid = i.indrelid AND con.contype IN ('p', 'u')
+            WHERE i.indrelid = to_regclass(:t)
+            ORDER BY con.contype NULLS LAST, c.relname
+        """), {"t": f'"{table}"'}).fetchall()
+        existing = set(_index_names(conn, shadow))
+        has_key = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(:t) AND contype = 'p'"),
+                               {"t": f'"{shadow}"'}).scalar() is not None
+        repartitioned = partition_key(conn, table) != partition_key(conn, shadow)
+    for name, unique, contype, condef, indexdef in rows:
+        target = _renamed(name, table, shadow)
+        if target in existing or (contype == "p" and has_key) or (unique and repartitioned):
+            continue
+        if contype:
+            statement = f'ALTER TABLE "{shadow}" ADD CONSTRAINT "{target}" {condef}'
+        else:
+            statement = (f'CREATE {"UNIQUE " if unique else ""}INDEX "{target}" ON "{shadow}" '
+                         f'USING {indexdef.split(" USING ", 1)[1]}')
+        _run(engine, statement, f"{table}'s index {name} not rebuilt")
@@ -0,0 +1,373 @@
+"""Vectorized row checks before the load; failing rows are quarantined in ``<table>_rejects``.
+
+A loader declares its checks per table and column, like its cleaning rules::
+
+    VALIDATION = {
+        'products': {
+            'product_id': [Required(), Parses('integer'), Unique()],
+            'price': [Parses('number'), Between(low=0)],
+        },
+    }
+
+and runs them on the frames it is about to COPY::
+
+    frames = validate_frames(engine, VALIDATION, frames, keys=KEYS)
+
+Each check looks at a whole column at once. Rows failing any check are left
+out of the load and written as text to ``<table>_rejects``, with their
+1-based CSV ``row`` and every ``reject_reason``, while the other rows load as
+usual, so one malformed record no longer fails the whole load. The table is
+replaced on each load and dropped when nothing was rejected.
+
+``keys`` adds what a :class:`pgtools.keys.KeySpec` needs to hold once it is
+applied: single-column primary keys present and unique, and foreign keys
+found among the referenced table's valid rows (a rejected client takes its
+loans with it) or, for a table outside the load, in the database.
+
+Loads that never hold the whole table (streamed chunks, parallel ranges)
+validate each piece with a :class:`ChunkValidator` instead::
+
+    load_csv_table(engine, path, 'funding', validation={'valuation': [Parses('number'), Between(low=0)]})
+"""
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .bulk import copy_dataframe
+from .keys import KeySpec, as_columns
+from .metrics import stage
+from .schema import TEXT, SqlType, create_table_sql
+from .streaming import guess_datetime_format
+from .swap import shadow_name, swap_in
+
+REJECTS_SUFFIX = "_rejects"
+REASON_COLUMN = "reject_reason"
+
+# (table, column, values) -> those of values (or more) a foreign key may take, None if unknown
+Lookup = Callable[[str, str, pd.Series], Optional[pd.Series]]
+
+_INTEGER_TYPES = ("smallint", "integer", "bigint")
+
+
+def _text(s: pd.Series) -> pd.Series:
+    return s.astype("string").str.strip()
+
+
+def _present(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(s):
+        return s.notna()
+    return s.notna() & (_text(s) != "").fillna(False)
+
+
+def _comparable(s: pd.Series) -> pd.Series:
+    """Numbers if every value parses as one (``'12'`` matches ``12`` and ``12.0``), else trimmed text."""
+    numbers = pd.to_numeric(s, errors="coerce") if not pd.api.types.is_numeric_dtype(s) else s
+    if numbers.notna().sum() == _present(s).sum():
+        return numbers.astype("float64")
+    return _text(s)
+
+
+class Required:
+    """NULLs and blank text fail."""
+
+    def __call__(self, df: pd.DataFrame, column: str, lookup: Lookup) -> pd.Series:
+        return ~_present(df[column])
+
+    def reason(self, column: str) -> str:
+        return f"{column} missing"
+
+
+class Parses:
+    """Present values must parse as ``'integer'`` (a whole number), ``'number'`` or ``'date'``."""
+
+    KINDS = ("integer", "number", "date")
+
+    def __init__(self, kind: str):
+        if kind not in self.KINDS:
+            raise ValueError(f"kind must be one of {self.KINDS}, not {kind!r}")
+        self.kind = kind
+
+    def __call__(self, df: pd.DataFrame, column: str, lookup: Lookup) -> pd.Series:
+        s = df[column]
+        present = _present(s)
+        if self.kind == "date":
+            if pd.api.types.is_datetime64_any_dtype(s):
+                return pd.Series(False, index=s.index)
+            values = _text(s).where(present)
+            sample = values.dropna()
+            fmt = guess_datetime_format(str(sample.iloc[0])) if len(sample) else None
+            return present & pd.to_datetime(values, format=fmt, errors="coerce").isna()
+        numbers = pd.to_numeric(s if pd.api.types.is_numeric_dtype(s) else _text(s), errors="coerce")
+        ok = numbers.notna() & np.isfinite(numbers.astype("float64"))
+        if self.kind == "integer":
+            ok &= numbers == numbers.round()
+        return present & ~ok.fillna(False).astype(bool)
+
+    def reason(self, column: str) -> str:
+        return f"{column} not {'an' if self.kind == 'integer' else 'a'} {self.kind}"
+
+
+class Between:
+    """Numbers must lie within ``[low, high]`` (either bound optional); values that don't parse are left to :class:`Parses`."""
+
+    def __init__(self, low: Optional[float] = None, high: Optional[float] = None):
+        self.low, self.high = low, high
+
+    def __call__(self, df: pd.DataFrame, column: str, lookup: Lookup) -> pd.Series:
+        s = df[column]
+        numbers = pd.to_numeric(s if pd.api.types.is_numeric_dtype(s) else _text(s), errors="coerce")
+        failed = pd.Series(False, index=s.index)
+        if self.low is not None:
+            failed |= (numbers < self.low).fillna(False)
+        if self.high is not None:
+            failed |= (numbers > self.high).fillna(False)
+        return failed
+
+    def reason(self, column: str) -> str:
+        if self.high is None:
+            return f"{column} < {self.low}"
+        if self.low is None:
+            return f"{column} > {self.high}"
+        return f"{column} outside [{self.low}, {self.high}]"
+
+
+class OneOf:
+    """Present values must be one of ``values`` (exact spelling; NULLs pass)."""
+
+    def __init__(self, values: Sequence[str]):
+        self.values = list(values)
+
+    def __call__(self, df: pd.DataFrame, column: str, lookup: Lookup) -> pd.Series:
+        s = df[column]
+        return s.notna() & ~s.astype("object").isin(self.values)
+
+    def reason(self, column: str) -> str:
+        return f"{column} not one of {', '.join(self.values)}"
+
+
+class Unique:
+    """Repeats of a value fail; its first row is kept."""
+
+    def __call__(self, df: pd.DataFrame, column: str, lookup: Lookup) -> pd.Series:
+        s = df[column]
+        return _present(s) & _comparable(s).duplicated(keep="first")
+
+    def reason(self, column: str) -> str:
+        return f"duplicate {column}"
+
+
+class _UniqueSoFar(Unique):
+    """:class:`Unique` across the chunks of one load: a value an earlier chunk had fails too.
+
+    Whether values compare as numbers is settled by the first chunk with any,
+    so ``'1'`` in one chunk and ``'1.0'`` or ``1`` in a later one still match;
+    later values that don't parse compare as their trimmed text.
+    """
+
+    def __init__(self):
+        self.seen: Set = set()
+        self.numeric: Optional[bool] = None
+
+    def __call__(self, df: pd.DataFrame, column: str, lookup: Lookup) -> pd.Series:
+        s = df[column]
+        present = _present(s)
+        if self.numeric is None and present.any():
+            self.numeric = pd.api.types.is_float_dtype(_comparable(s))
+        if self.numeric:
+            numbers = pd.to_numeric(s if pd.api.types.is_numeric_dtype(s) else _text(s), errors="coerce")
+            values = numbers.astype("float64").astype(object).where(numbers.notna(), _text(s).astype(object))
+        else:
+            values = _text(s).astype(object)
+        earlier = np.fromiter((v in self.seen for v in values), bool, len(values))
+        self.seen.update(values[present])
+        return present & (values.duplicated(keep="first") | earlier)
+
+
+class References:
+    """Present values must exist in ``table.column`` (a foreign key; NULLs pass, as in SQL)."""
+
+    def __init__(self, table: str, column: str):
+        self.table, self.column = table, column
+
+    def __call__(self, df: pd.DataFrame, column: str, lookup: Lookup) -> pd.Series:
+        s = df[column]
+        known = lookup(self.table, self.column, s[_present(s)])
+        if known is None:
+            return pd.Series(False, index=s.index)
+        return _present(s) & ~_comparable(s).isin(_comparable(known).dropna())
+
+    def reason(self, column: str) -> str:
+        return f"{column} not in {self.table}.{self.column}"
+
+
+Check = Union[Required, Parses, Between, OneOf, Unique, References]
+Validation = Mapping[str, Mapping[str, Union[Check, Sequence[Check]]]]
+
+
+def key_checks(keys: KeySpec) -> Dict[str, Dict[str, List[Check]]]:
+    """The checks that make ``keys`` hold: single-column primary keys present and unique, foreign keys found."""
+    checks: Dict[str, Dict[str, List[Check]]] = {}
+    for table, columns in keys.primary_keys.items():
+        if len(as_columns(columns)) == 1:
+            checks.setdefault(table, {}).setdefault(as_columns(columns)[0], []).extend([Required(), Unique()])
+    for fk in keys.foreign_keys:
+        columns, ref_columns = as_columns(fk.columns), as_columns(fk.ref_columns)
+        if len(columns) == 1:
+            checks.setdefault(fk.table, {}).setdefault(columns[0], []).append(References(fk.references, ref_columns[0]))
+    return checks
+
+
+def _merged(spec: Validation, keys: Optional[KeySpec]) -> Dict[str, Dict[str, List[Check]]]:
+    merged: Dict[str, Dict[str, List[Check]]] = {}
+    for table, columns in spec.items():
+        for column, checks in columns.items():
+            checks = list(checks) if isinstance(checks, (list, tuple)) else [checks]
+            merged.setdefault(table, {}).setdefault(column, []).extend(checks)
+    for table, columns in (key_checks(keys) if keys else {}).items():
+        for column, checks in columns.items():
+            merged.setdefault(table, {}).setdefault(column, []).extend(checks)
+    return merged
+
+
+def validate_frame(df: pd.DataFrame, checks: Mapping[str, Sequence[Check]],
+                   lookup: Lookup) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split ``df`` into its valid rows and its rejects (as text, with ``row`` and ``reject_reason``)."""
+    failures = []
+    for column, column_checks in checks.items():
+        if column not in df.columns:
+            print(f"   ⚠️  no column {column} to validate")
+            continue
+        for check in column_checks:
+            failed = check(df, column, lookup).fillna(False).to_numpy(bool)
+            if failed.any():
+                failures.append((failed, check.reason(column)))
+    if not failures:
+        return df, df.iloc[0:0]
+
+    bad = np.logical_or.reduce([failed for failed, _ in failures])
+    reasons = np.full(int(bad.sum()), "", dtype=object)
+    for failed, reason in failures:
+        hit = failed[bad]
+        reasons[hit] = reasons[hit] + np.where(reasons[hit] == "", "", "; ") + reason
+    rejects = df[bad].astype("string")
+    rejects.insert(0, "row", df.index[bad] + 1)
+    rejects[REASON_COLUMN] = reasons
+    return df[~bad], rejects
+
+
+def lookup_in_database(engine, table: str, column: str, values: pd.Series) -> Optional[pd.Series]:
+    """Those of ``values`` found in ``table.column``, asked with ``= ANY`` in the column's type; None if it's missing."""
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT format_type(a.atttypid, NULL), t.typcategory
+            FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid
+            WHERE a.attrelid = to_regclass(:t) AND a.attname = :c AND NOT a.attisdropped
+        """), {"t": f'"{table}"', "c": column}).fetchone()
+        if row is None:
+            return None
+        type_, category = row
+        if category == "N":
+            numbers = pd.to_numeric(values if pd.api.types.is_numeric_dtype(values) else _text(values),
+                                    errors="coerce").dropna()
+            if type_ in _INTEGER_TYPES:
+                # A fraction can't match, and the cast would round it onto one that does
+                numbers = numbers[numbers == numbers.round()].astype("int64")
+            params, match = numbers.drop_duplicates().tolist(), f'"{column}" = ANY(CAST(:v AS {type_}[]))'
+        else:
+            params = _text(values).dropna().drop_duplicates().tolist()
+            match = (f'"{column}" = ANY(CAST(:v AS text[]))' if category == "S"
+                     else f'"{column}"::text = ANY(CAST(:v AS text[]))')
+        if not params:
+            return pd.Series([], dtype=object)
+        return pd.Series([r[0] for r in conn.execute(text(f'SELECT DISTINCT "{column}" FROM "{table}" WHERE {match}'),
+                                                     {"v": params})])
+
+
+def write_rejects_table(engine, table: str, rejects: pd.DataFrame) -> None:
+    """Replace ``<table>_rejects`` with ``rejects``; with none, drop it (a stale one from an earlier load)."""
+    target = f"{table}{REJECTS_SUFFIX}"
+    if rejects.empty:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{target}"'))
+        return
+    schema = {c: SqlType("INTEGER") if c == "row" else TEXT for c in rejects.columns}
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'DROP TABLE IF EXISTS "{shadow_name(target)}"')
+            cur.execute(create_table_sql(shadow_name(target), schema))
+            copy_dataframe(cur, rejects, shadow_name(target))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    swap_in(engine, target)
+    counts = pd.Series(rejects[REASON_COLUMN].str.split("; ").explode()).value_counts()
+    print(f"   ⚠️  {len(rejects)} rows of {table} quarantined in {target} "
+          f"({', '.join(f'{reason}: {n}' for reason, n in counts.items())})")
+
+
+def validate_frames(engine, spec: Validation, frames: Mapping[str, pd.DataFrame],
+                    keys: Optional[KeySpec] = None) -> Dict[str, pd.DataFrame]:
+    """Check each of ``frames`` (in order) and quarantine its failing rows; returns the valid rows.
+
+    A foreign key is looked up among the valid rows of a frame checked
+    before it, else in the database table of that name.
+    """
+    checks = _merged(spec, keys)
+    valid: Dict[str, pd.DataFrame] = {}
+
+    def lookup(table: str, column: str, values: pd.Series) -> Optional[pd.Series]:
+        if table in valid:
+            return valid[table][column]
+        return lookup_in_database(engine, table, column, values)
+
+    for table, df in frames.items():
+        with stage("validate", table) as m:
+            valid[table], rejects = validate_frame(df, checks.get(table, {}), lookup)
+            write_rejects_table(engine, table, rejects)
+            m.rows = len(df)
+    return valid
+
+
+class ChunkValidator:
+    """:func:`validate_frame` as a transform, for loads that never hold the whole table.
+
+    Each call returns a chunk's valid rows and keeps its rejects, and
+    :meth:`write` then replaces ``<table>_rejects`` with all of them. A value
+    repeated in a later chunk fails :class:`Unique` as it would in one frame,
+    so chunks must come in file order. Foreign keys are looked up in the
+    database, for each chunk's own values.
+    """
+
+    def __init__(self, engine, table: str, checks: Mapping[str, Union[Check, Sequence[Check]]],
+                 keys: Optional[KeySpec] = None):
+        merged = _merged({table: checks}, keys).get(table, {})
+        self.checks = {column: [_UniqueSoFar() if isinstance(check, Unique) else check for check in column_checks]
+                       for column, column_checks in merged.items()}
+        self.engine, self.table = engine, table
+        self.rejects: List[pd.DataFrame] = []
+        self.rows = 0
+
+    def _lookup(self, table: str, column: str, values: pd.Series) -> Optional[pd.Series]:
+        return lookup_in_database(self.engine, table, column, values)
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        valid, rejects = validate_frame(df, self.checks, self._lookup)
+        if self.rows == 0:
+            # Reported once by validate_frame, not for every chunk
+            self.checks = {column: checks for column, checks in self.checks.items() if column in df.columns}
+        self.rows += len(df)
+        if len(rejects):
+            self.rejects.append(rejects)
+        return valid
+
+    def write(self) -> None:
+        with stage("validate", self.table) as m:
+            write_rejects_table(self.engine, self.table,
+                                pd.concat(self.rejects, ignore_index=True) if self.rejects else pd.DataFrame())
+            m.rows = self.rows
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# pgtools is imported from the repository root, as the loaders do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
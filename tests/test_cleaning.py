@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pgtools.cleaning import Choice, Fill, Impute, InRange, Number, Prefixes, Text, clean_frame, round_half_up
+
+
+def _values(s):
+    # Compare values, with every kind of missing value as None
+    s = pd.Series(s).astype(object)
+    return s.where(s.notna(), None).tolist()
+
+
+def test_round_half_up_matches_postgres():
+    s = pd.Series([0.5, 1.5, 2.5, -2.5, 2.345, 2.344])
+    assert round_half_up(s).tolist() == [1.0, 2.0, 3.0, -3.0, 2.0, 2.0]
+    assert round_half_up(s, 2).tolist() == [0.5, 1.5, 2.5, -2.5, 2.35, 2.34]
+
+
+def test_choice_maps_tokens_onto_labels():
+    df = pd.DataFrame({"kind": [" produce", "MEAT", "dairy ", "fish", None]})
+    out = Choice(["Produce", "Meat", "Dairy"])(df, "kind")
+
+    assert list(out) == ["Produce", "Meat", "Dairy", "Unknown", "Unknown"]
+    assert list(out.categories) == ["Produce", "Meat", "Dairy", "Unknown"]
+
+
+def test_choice_mapping_without_default():
+    df = pd.DataFrame({"ok": ["Y", "n", "maybe"]})
+    out = Choice({"y": "Yes", "n": "No"}, default=None)(df, "ok")
+    assert _values(out) == ["Yes", "No", None]
+
+
+def test_prefixes_first_match_wins():
+    df = pd.DataFrame({"plan": ["Unlimited plus", "un-metered", " basic", "Pro", None]})
+    rule = Prefixes([("unlimited", "Unlimited"), ("un", "Other un"), ("basic", "Basic")], default="None")
+    assert list(rule(df, "plan")) == ["Unlimited", "Other un", "None", "None", "None"]
+    # strip=True trims before matching
+    stripped = Prefixes([("basic", "Basic")], strip=True)(df, "plan")
+    assert _values(stripped) == [None, None, "Basic", None, None]
+
+
+def test_text_trims_and_replaces_placeholders():
+    df = pd.DataFrame({"brand": [" Acme ", "", "-", "MISSING", None, "b"]})
+    out = Text(missing=["", "-", "missing"])(df, "brand")
+    assert _values(out) == ["Acme", "Unknown", "Unknown", "Unknown", "Unknown", "b"]
+
+
+def test_number_extracts_fills_and_rounds():
+    df = pd.DataFrame({"weight": ["12 grams", "3.456g", None, "n/a", "7"]})
+    out = Number(fill="median", decimals=2, extract=True)(df, "weight")
+    assert out.tolist() == [12.0, 3.46, 7.0, 7.0, 7.0]
+
+    plain = Number(fill=0)(pd.DataFrame({"w": ["1.5", "x", None]}), "w")
+    assert plain.tolist() == [1.5, 0.0, 0.0]
+
+
+@pytest.mark.parametrize("values, expected", [
+    (["1", " 4 ", "5", "0", "-1", "2.5", "abc", None], [1, 4, 5, 3, 3, 3, 3, 3]),
+    ([1.0, 2.5, 3.5, 6.0, np.nan], [1, 3, 4, 3, 3]),
+])
+def test_in_range_rounds_values_in_bounds(values, expected):
+    out = InRange(1, 5, default=3)(pd.DataFrame({"rating": values}), "rating")
+    assert out.dtype == "int64"
+    assert out.tolist() == expected
+
+
+def test_fill_with_constant_or_other_columns():
+    df = pd.DataFrame({"price": [1.0, None, 3.0], "list_price": [10.0, 20.0, 30.0]})
+    assert Fill(0)(df, "price").tolist() == [1.0, 0.0, 3.0]
+    assert Fill(lambda d: d["list_price"] / 2)(df, "price").tolist() == [1.0, 10.0, 3.0]
+
+
+def test_impute_uses_first_matching_condition():
+    df = pd.DataFrame({
+        "size": ["?", "?", "?", "L", "-"],
+        "weight": [1, 10, 5, 1, 1],
+    })
+    rule = Impute(["?", "-"], [
+        (lambda d: d["weight"] < 2, "S"),
+        (lambda d: d["weight"] < 8, "M"),
+    ])
+    # The unmatched placeholder stays as it is, like CASE ... ELSE size END
+    assert rule(df, "size").tolist() == ["S", "?", "M", "L", "S"]
+
+
+def test_clean_frame_runs_rules_in_order(capsys):
+    df = pd.DataFrame({"kind": ["a", "b"], "price": [None, 2.0], "note": ["x", "y"]})
+    rules = {
+        "kind": Choice(["A"]),
+        "price": Fill(lambda d: d["kind"].astype(str).map({"A": 1.0, "Unknown": 0.0})),
+        "missing": Text(),
+    }
+    out = clean_frame(df, rules)
+
+    assert list(out["kind"]) == ["A", "Unknown"]
+    assert out["price"].tolist() == [1.0, 2.0]
+    assert out["note"].tolist() == ["x", "y"]
+    assert df["price"].isna().iloc[0]  # the input is left alone
+    assert "no column missing" in capsys.readouterr().out
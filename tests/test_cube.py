@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pgtools.cube import ROWS, CubeBuilder, build_cube, load_cube
+
+DIMS = ["line", "month", "client"]
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        "line": rng.choice(["Brakes", "Engine", "Frame"], 300),
+        "month": rng.choice([6, 7, 8], 300),
+        "client": pd.Categorical(rng.choice(["Retail", "Wholesale"], 300), categories=["Retail", "Wholesale", "Unused"]),
+        "total": rng.uniform(10, 500, 300).round(2),
+    })
+    df.loc[5, "line"] = None  # a label of its own
+    df.loc[9, "total"] = np.nan  # counts as 0, as SUM skips NULLs
+    return df
+
+
+@pytest.fixture
+def cube(sales):
+    return build_cube(sales, DIMS, {"total": sales["total"]})
+
+
+def _labels(s):
+    # Missing labels as None, whichever missing value the frame holds
+    s = s.astype(object)
+    return s.where(s.notna(), None).tolist()
+
+
+def _expected(df, by):
+    grouped = df.groupby(by, dropna=False, observed=True)
+    out = grouped.agg(rows=("total", "size"), total=("total", "sum")).reset_index()
+    return out.sort_values(by, na_position="last", ignore_index=True)
+
+
+@pytest.mark.parametrize("by", [["line"], ["month", "client"], ["line", "month", "client"]])
+def test_frame_matches_groupby(sales, cube, by):
+    result = cube.frame(by).sort_values(by, na_position="last", ignore_index=True)
+    expected = _expected(sales, by)
+
+    for d in by:
+        assert _labels(result[d]) == _labels(expected[d])
+    assert result[ROWS].tolist() == expected["rows"].tolist()
+    np.testing.assert_allclose(result["total"], expected["total"], rtol=1e-12)
+
+
+def test_filters_and_totals(sales, cube):
+    wholesale = sales[sales["client"] == "Wholesale"]
+    assert cube.value(ROWS) == len(sales)
+    assert cube.value(ROWS, client="Wholesale") == len(wholesale)
+    assert cube.value("total", client="Wholesale", month=7) == pytest.approx(
+        wholesale.loc[wholesale["month"] == 7, "total"].sum(), rel=1e-12)
+    # Filters given as text, as from the command line
+    assert cube.value(ROWS, month="7") == (sales["month"] == 7).sum()
+
+    by_line = cube.frame(["line"], ["total"], client="Wholesale")
+    assert list(by_line.columns) == ["line", "total"]
+    assert by_line["total"].sum() == pytest.approx(wholesale["total"].sum(), rel=1e-12)
+    assert cube.frame([]).to_dict("records") == [{ROWS: len(sales), "total": pytest.approx(sales["total"].sum())}]
+
+
+def test_unused_categories_and_unknown_names(cube):
+    assert cube.labels["client"] == ["Retail", "Wholesale"]
+    with pytest.raises(KeyError):
+        cube.value(ROWS, client="Unused")
+    with pytest.raises(KeyError):
+        cube.frame(["warehouse"])
+
+
+def test_save_and_load(tmp_path, cube):
+    path = str(tmp_path / ".cube" / "sales.npz")
+    cube.save(path, "abc")
+
+    assert load_cube(path, "other") is None
+    loaded = load_cube(path, "abc")
+    assert loaded.labels == cube.labels
+    pd.testing.assert_frame_equal(loaded.frame(["line", "month"]), cube.frame(["line", "month"]))
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 120, 300])
+def test_builder_over_chunks_matches_whole_frame(sales, cube, chunksize):
+    builder = CubeBuilder(DIMS, ["total"])
+    for start in range(0, len(sales), chunksize):
+        chunk = sales.iloc[start:start + chunksize]
+        builder.add(chunk, {"total": chunk["total"]})
+    chunked = builder.cube()
+
+    assert chunked.labels == cube.labels
+    np.testing.assert_array_equal(chunked.measures[ROWS], cube.measures[ROWS])
+    np.testing.assert_allclose(chunked.measures["total"], cube.measures["total"], rtol=1e-12)
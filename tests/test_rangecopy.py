@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from pgtools.rangecopy import _aligned, _Range, _reconcile, csv_ranges
+
+# Quoted commas and doubled quotes, but no line breaks inside values
+QUOTED = "id,name,score\n" + "".join(
+    f'{i},"Smith, ""J{i}""",{"" if i == 7 else i}\n' for i in range(1, 41))
+# Every name spans two lines
+MULTILINE = "id,name,score\n" + "".join(f'{i},"first line\nsecond {i}",{i}\n' for i in range(1, 41))
+
+
+def _write(tmp_path, content, name="data.csv"):
+    path = tmp_path / name
+    path.write_text(content)
+    return str(path)
+
+
+def _parse(path, parts):
+    ranges = csv_ranges(path, parts)
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    parsed = [_Range(path, start, end, columns) for start, end in ranges]
+    _aligned(path, ranges, parsed)
+    return pd.concat(_reconcile(path, ranges, parsed, columns), ignore_index=True)
+
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 7, 100])
+def test_ranges_cover_the_body_on_line_starts(tmp_path, parts):
+    path = _write(tmp_path, QUOTED)
+    data = QUOTED.encode()
+    ranges = csv_ranges(path, parts)
+
+    assert ranges[0][0] == data.index(b"\n") + 1
+    assert ranges[-1][1] == len(data)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert all(data[start - 1:start] == b"\n" for start, _ in ranges)
+    assert len(ranges) <= min(parts, 40)
+
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 7])
+def test_quoted_ranges_match_whole_file(tmp_path, parts):
+    path = _write(tmp_path, QUOTED)
+    whole = pd.read_csv(path)
+    # Row 7's blank score turns a range of integers into floats, as in the whole file
+    pd.testing.assert_frame_equal(_parse(path, parts), whole)
+
+
+def test_value_spanning_a_range_boundary_is_refused(tmp_path):
+    path = _write(tmp_path, MULTILINE)
+    whole = pd.read_csv(path)
+    refused = 0
+    for parts in range(2, 9):
+        try:
+            parsed = _parse(path, parts)
+        except ValueError as e:
+            assert "spans the line break" in str(e)
+            refused += 1
+        else:
+            pd.testing.assert_frame_equal(parsed, whole)
+    # Half the line starts are inside a quoted value, so some split must land there
+    assert refused
+
+
+def test_header_only_file_has_no_ranges(tmp_path):
+    assert csv_ranges(_write(tmp_path, "id,name\n"), 4) == []
@@ -0,0 +1,83 @@
+import io
+
+import pandas as pd
+import pytest
+
+from pgtools.schema import SchemaCoercer, SchemaProfiler, SqlType, describe_schema, infer_schema
+
+CSV = """id,views,price,day,seen_at,flag,zip,name
+1,3000000000,1.5,2021-01-02,2021-01-02 10:15:00,true,02134,a
+2,12,20.25,2021-01-03,2021-01-03 11:00:00,false,10001,b
+3,7,300,2021-01-04,2021-01-04 00:00:00,TRUE,00501,c
+4,,0.75,,,,,d
+"""
+
+
+@pytest.fixture
+def frame():
+    return pd.read_csv(io.StringIO(CSV), dtype={"zip": str})
+
+
+def test_inferred_types(frame):
+    schema = infer_schema(frame)
+
+    assert schema["id"] == SqlType("INTEGER", fits=SqlType("SMALLINT"))
+    assert schema["views"] == SqlType("BIGINT")
+    # Decimals stay unconstrained; the tight precision is only a hint
+    assert str(schema["price"]) == "NUMERIC"
+    assert schema["price"].fits == SqlType("NUMERIC", 5, 2)
+    assert schema["day"] == SqlType("DATE")
+    assert schema["seen_at"] == SqlType("TIMESTAMP")
+    assert schema["flag"] == SqlType("BOOLEAN")
+    assert schema["zip"] == SqlType("TEXT")
+    assert schema["name"] == SqlType("TEXT")
+    assert "id INTEGER (fits SMALLINT)" in describe_schema(schema)
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3])
+def test_chunked_profile_matches_whole_frame(frame, chunksize):
+    profiler = SchemaProfiler()
+    for start in range(0, len(frame), chunksize):
+        profiler.update(frame.iloc[start:start + chunksize])
+    assert profiler.schema() == infer_schema(frame)
+
+
+def test_overrides_pin_columns(frame):
+    schema = infer_schema(frame, {"zip": SqlType("INTEGER")})
+    assert schema["zip"] == SqlType("INTEGER")
+
+
+def test_coercer_nulls_and_reports_values_that_do_not_fit():
+    # One bad value in 20 is within MIN_PARSE_RATIO, so the column stays numeric
+    df = pd.DataFrame({
+        "qty": [str(i) for i in range(1, 19)] + ["n/a", "2.5"],
+        "day": ["2021-01-02"] * 19 + ["someday"],
+    })
+    profiler = SchemaProfiler().update(df)
+    schema = profiler.schema()
+    assert schema["qty"].name == "NUMERIC"
+    assert schema["day"] == SqlType("DATE")
+
+    schema["qty"] = SqlType("INTEGER")
+    coercer = SchemaCoercer(schema, profiler.date_formats())
+    out = coercer(df.copy())
+
+    assert out["qty"].dtype == "Int64"
+    assert out["qty"].iloc[:18].tolist() == list(range(1, 19))
+    assert out["qty"].iloc[18:].isna().all()
+    assert out["day"].iloc[0] == pd.Timestamp("2021-01-02")
+    assert pd.isna(out["day"].iloc[19])
+
+    report = coercer.report()
+    assert report.to_dict("records") == [
+        {"row": 19, "column": "qty", "value": "n/a", "expected": "INTEGER"},
+        {"row": 20, "column": "qty", "value": "2.5", "expected": "INTEGER"},
+        {"row": 20, "column": "day", "value": "someday", "expected": "DATE"},
+    ]
+
+
+def test_empty_report_has_columns():
+    coercer = SchemaCoercer({"a": SqlType("INTEGER")})
+    coercer(pd.DataFrame({"a": ["1", "2"]}))
+    assert coercer.report().empty
+    assert list(coercer.report().columns) == ["row", "column", "value", "expected"]
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pgtools.spc import ControlChart, SPCMonitor, control_limits
+
+CHART = ControlChart("parts", value="height", group="operator", order="item_no")
+
+
+@pytest.fixture
+def parts():
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        "item_no": np.arange(1, 201),
+        "operator": rng.choice(["Op-1", "Op-2", "Op-3"], 200),
+        "height": rng.normal(20.0, 0.5, 200).round(3),
+    })
+    df.loc[150, "height"] = 40.0  # a spike far above its neighbours
+    # Rows arrive out of order; the chart sorts them by item_no
+    return df.sample(frac=1, random_state=1)
+
+
+def _reference(df, chart):
+    # The notebook's window functions, as pandas rolling windows per group
+    df = df.sort_values(chart.order)
+    rolling = df.groupby(chart.group)[chart.value].rolling(chart.window)
+    out = df.assign(
+        row_number=df.groupby(chart.group).cumcount() + 1,
+        avg=rolling.mean().reset_index(level=0, drop=True),
+        stddev=rolling.std().reset_index(level=0, drop=True),
+    )
+    return out[out["row_number"] >= chart.window]
+
+
+def test_control_limits_match_rolling_windows(parts):
+    result = control_limits(parts, CHART)
+    expected = _reference(parts, CHART)
+
+    assert result["operator"].tolist() == expected["operator"].tolist()
+    assert result["row_number"].tolist() == expected["row_number"].tolist()
+    np.testing.assert_allclose(result["avg_height"], expected["avg"], rtol=1e-12)
+    np.testing.assert_allclose(result["stddev_height"], expected["stddev"], rtol=1e-9)
+    np.testing.assert_allclose(result["ucl"], expected["avg"] + 3 * expected["stddev"], rtol=1e-9)
+    np.testing.assert_allclose(result["lcl"], expected["avg"] - 3 * expected["stddev"], rtol=1e-9)
+
+
+def test_alerts_are_values_outside_the_limits(parts):
+    # The current value is in its own window, so with 5 rows no value can be
+    # more than 4/sqrt(5) standard deviations out; 1.5 sigmas lets the spike alert
+    chart = ControlChart("parts", value="height", group="operator", order="item_no", sigmas=1.5)
+    result = control_limits(parts, chart)
+    outside = (result["height"] > result["ucl"]) | (result["height"] < result["lcl"])
+    assert result["alert"].tolist() == outside.tolist()
+    assert result.loc[result["height"] == 40.0, "alert"].all()
+
+
+def test_monitor_resumes_from_saved_state(parts):
+    rows = parts.sort_values("item_no")
+    rows = list(zip(rows["operator"], rows["item_no"].tolist(), rows["height"]))
+
+    whole = SPCMonitor(CHART)
+    expected = [whole.update(*row) for row in rows]
+
+    first = SPCMonitor(CHART)
+    points = [first.update(*row) for row in rows[:120]]
+    # Stored as JSONB in spc_state
+    state = json.loads(json.dumps(first.state()))
+    resumed = SPCMonitor.from_state(CHART, state)
+    points += [resumed.update(*row) for row in rows[120:]]
+
+    assert points == expected
+    assert resumed.state() == whole.state()
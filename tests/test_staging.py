@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from pgtools.staging import read_staged
+
+
+@pytest.fixture
+def csv_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOAD_STAGING", "1")
+    path = tmp_path / "orders.csv"
+    pd.DataFrame({"Order ID": [1, 2], "Total": [3.5, 4.0]}).to_csv(path, index=False)
+    return str(path)
+
+
+def _upper(df):
+    return df.rename(columns=str.upper)
+
+
+def test_stage_is_reused_until_the_key_changes(csv_path, capsys):
+    first = read_staged(csv_path, _upper, key="1")
+    assert list(first.columns) == ["ORDER ID", "TOTAL"]
+    assert "Staged orders.csv" in capsys.readouterr().out
+
+    assert read_staged(csv_path, _upper, key="1").equals(first)
+    assert "Staged" not in capsys.readouterr().out
+
+    # A new key stands for a changed transform, so the CSV is read again
+    read_staged(csv_path, _upper, key="2")
+    assert "Staged orders.csv" in capsys.readouterr().out
+
+
+def test_changed_csv_is_staged_again(csv_path, capsys):
+    read_staged(csv_path)
+    pd.DataFrame({"Order ID": [7], "Total": [1.0]}).to_csv(csv_path, index=False)
+    assert read_staged(csv_path)["Order ID"].tolist() == [7]
+    assert capsys.readouterr().out.count("Staged orders.csv") == 2
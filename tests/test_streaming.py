@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from pgtools.streaming import DateCoercer, infer_csv_dtypes, read_csv_stream
+
+CSV = """flag,count,day,name
+True,1,2021-01-02,a
+False,2,2021-01-03,b
+True,3,2021-01-04,c
+,,,d
+False,5,2021-02-01,
+True,6,2021-02-02,f
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def _plain(df):
+    # Compare values, with every kind of missing value as None
+    return df.astype(object).where(df.notna(), None)
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 100])
+def test_streamed_chunks_match_whole_file(csv_path, chunksize):
+    whole = DateCoercer(["day"])(pd.read_csv(csv_path))
+    streamed = pd.concat(list(read_csv_stream(csv_path, chunksize, DateCoercer(["day"]))), ignore_index=True)
+
+    pd.testing.assert_frame_equal(_plain(streamed), _plain(whole))
+    assert streamed["count"].dtype == whole["count"].dtype == "float64"
+    assert streamed["day"].dtype == whole["day"].dtype
+
+
+def test_bool_column_with_blanks_stays_boolean(csv_path):
+    # The first chunk is all bools, the second has the blank
+    assert infer_csv_dtypes(csv_path, 3)["flag"] == "boolean"
+    for chunk in read_csv_stream(csv_path, 3):
+        assert chunk["flag"].dtype == "boolean"
+        assert set(chunk["flag"].dropna()) <= {True, False}
+
+
+def test_bool_column_without_blanks_stays_bool(tmp_path):
+    path = tmp_path / "flags.csv"
+    path.write_text("flag\nTrue\nFalse\nTrue\n")
+    assert infer_csv_dtypes(str(path), 2)["flag"] == "bool"
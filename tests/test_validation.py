@@ -0,0 +1,137 @@
+import pandas as pd
+import pytest
+
+from pgtools.keys import ForeignKey, KeySpec
+from pgtools.validation import (REASON_COLUMN, Between, ChunkValidator, OneOf, Parses, References, Required, Unique,
+                                key_checks, validate_frame)
+
+CLIENTS = pd.Series([1, 2, 3])
+
+
+def _lookup(table, column, values):
+    # Stands in for the database: only clients.client_id is known
+    return CLIENTS if (table, column) == ("clients", "client_id") else None
+
+
+def _failed(check, values):
+    df = pd.DataFrame({"c": values})
+    return check(df, "c", _lookup).fillna(False).astype(bool).tolist()
+
+
+def test_required():
+    assert _failed(Required(), ["a", "", "  ", None]) == [False, True, True, True]
+    assert _failed(Required(), [1.0, float("nan")]) == [False, True]
+
+
+@pytest.mark.parametrize("kind, values, failed", [
+    ("integer", ["1", " 2 ", "2.5", "x", None, ""], [False, False, True, True, False, False]),
+    ("number", ["1.5", "-3", "1e3", "inf", "abc", None], [False, False, False, True, True, False]),
+    ("date", ["2021-01-02", "2021-02-30", "soon", None], [False, True, True, False]),
+])
+def test_parses(kind, values, failed):
+    assert _failed(Parses(kind), values) == failed
+
+
+def test_parses_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        Parses("money")
+
+
+def test_between_leaves_unparsed_values_to_parses():
+    assert _failed(Between(low=0), ["-1", "0", "5", "x", None]) == [True, False, False, False, False]
+    assert _failed(Between(0, 10), [-1, 5, 11]) == [True, False, True]
+    assert Between(low=0).reason("price") == "price < 0"
+    assert Between(high=9).reason("price") == "price > 9"
+    assert Between(0, 9).reason("price") == "price outside [0, 9]"
+
+
+def test_one_of_is_exact_and_lets_nulls_pass():
+    assert _failed(OneOf(["M", "F"]), ["M", "f", "X", None]) == [False, True, True, False]
+
+
+def test_unique_keeps_the_first_row():
+    # '12' and 12.0 are the same key
+    assert _failed(Unique(), ["12", "7", "12.0", None, None, "7"]) == [False, False, True, False, False, True]
+
+
+def test_references_uses_the_lookup():
+    assert _failed(References("clients", "client_id"), ["1", "4", None, "3.0"]) == [False, True, False, False]
+    # An unknown table can't be checked, so nothing fails
+    assert _failed(References("branches", "id"), ["1", "4"]) == [False, False]
+
+
+def test_validate_frame_splits_rows_with_every_reason(capsys):
+    df = pd.DataFrame({
+        "loan_id": ["1", "2", "2", "", "5"],
+        "client_id": ["1", "9", "2", "3", "3"],
+        "amount": ["100", "-5", "x", "20", "30"],
+    })
+    checks = {
+        "loan_id": [Required(), Unique()],
+        "client_id": [References("clients", "client_id")],
+        "amount": [Parses("number"), Between(low=0)],
+        "status": [Required()],
+    }
+    valid, rejects = validate_frame(df, checks, _lookup)
+
+    assert valid.index.tolist() == [0, 4]
+    assert rejects["row"].tolist() == [2, 3, 4]
+    assert rejects[REASON_COLUMN].tolist() == [
+        "client_id not in clients.client_id; amount < 0",
+        "duplicate loan_id; amount not a number",
+        "loan_id missing",
+    ]
+    assert rejects["amount"].tolist() == ["-5", "x", "20"]
+    assert "no column status" in capsys.readouterr().out
+
+
+def test_validate_frame_without_failures_returns_the_frame():
+    df = pd.DataFrame({"a": ["1", "2"]})
+    valid, rejects = validate_frame(df, {"a": [Required()]}, _lookup)
+    assert valid is df
+    assert rejects.empty
+
+
+def test_key_checks():
+    keys = KeySpec(primary_keys={"clients": "client_id", "pairs": ["a", "b"]},
+                   foreign_keys=[ForeignKey("loans", "client_id", "clients", "client_id")])
+    checks = key_checks(keys)
+
+    assert [type(c) for c in checks["clients"]["client_id"]] == [Required, Unique]
+    assert "pairs" not in checks  # composite keys are left to the database
+    ref = checks["loans"]["client_id"][0]
+    assert (ref.table, ref.column) == ("clients", "client_id")
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3])
+def test_chunk_validator_matches_whole_frame(chunksize):
+    df = pd.DataFrame({
+        "id": ["1", "2", "1", "3", "2", "4", ""],
+        "score": ["5", "11", "3", "x", "7", "8", "1"],
+    })
+    checks = {"id": [Required(), Unique()], "score": [Parses("integer"), Between(0, 10)]}
+    whole_valid, whole_rejects = validate_frame(df, checks, _lookup)
+
+    validator = ChunkValidator(None, "scores", checks)
+    # Chunks keep their place in the file, as read_csv_stream's do
+    valid = pd.concat([validator(df.iloc[i:i + chunksize]) for i in range(0, len(df), chunksize)])
+    rejects = pd.concat(validator.rejects, ignore_index=True)
+
+    pd.testing.assert_frame_equal(valid, whole_valid)
+    pd.testing.assert_frame_equal(rejects, whole_rejects.reset_index(drop=True))
+    assert validator.rows == len(df)
+
+
+@pytest.mark.parametrize("chunks, failed", [
+    # Numbers from the first chunk on: '1', 1.0 and ' 1 ' are one key, 'x' is text
+    ([["1", "2"], ["x", "1"], ["1.0", " 2 "], [None, "x"]],
+     [[False, False], [False, True], [True, True], [False, True]]),
+    # Text from the first chunk on, as on the whole column: '1' and '1.0' differ
+    ([["a", "1"], ["1.0", "a "]], [[False, False], [False, True]]),
+])
+def test_unique_across_chunks_of_text_and_numbers(chunks, failed):
+    validator = ChunkValidator(None, "ids", {"id": [Unique()]})
+    rows = [len(validator(pd.DataFrame({"id": chunk}))) for chunk in chunks]
+    assert rows == [flags.count(False) for flags in failed]
+    rejected = pd.concat(validator.rejects, ignore_index=True)["id"].tolist()
+    assert rejected == [v for chunk, flags in zip(chunks, failed) for v, f in zip(chunk, flags) if f]